@@ -20,6 +20,7 @@
 import asyncio
 import logging
 import random
+import time
 import uuid
 from dataclasses import dataclass
 from typing import Any, Awaitable, Callable, Optional
@@ -30,9 +31,10 @@ from nucliadb_protos.writer_pb2_grpc import WriterStub
 from nucliadb.common.maindb.driver import Transaction
 from nucliadb.common.maindb.utils import get_driver
 from nucliadb_protos import noderesources_pb2, nodewriter_pb2, utils_pb2, writer_pb2
-from nucliadb_telemetry import errors
+from nucliadb_telemetry import errors, metrics
+from nucliadb_utils.cache import KB_SHARDS_CACHE
 from nucliadb_utils.keys import KB_SHARDS
-from nucliadb_utils.utilities import get_indexing, get_storage
+from nucliadb_utils.utilities import get_cache, get_indexing, get_storage
 
 from .abc import AbstractIndexNode
 from .exceptions import (
@@ -44,11 +46,16 @@ from .exceptions import (
 )
 from .index_node import IndexNode
 from .settings import settings
+from .stats import explore, get_node_stats, mean_latency, remove_node_stats
 
 logger = logging.getLogger(__name__)
 
 INDEX_NODES: dict[str, AbstractIndexNode] = {}
 
+KB_SHARDS_CACHE_OPS = metrics.Counter(
+    "nucliadb_kb_shards_cache_ops", labels={"type": ""}
+)
+
 
 def get_index_nodes() -> list[AbstractIndexNode]:
     return list(INDEX_NODES.values())
@@ -64,22 +71,85 @@ def add_index_node(node: AbstractIndexNode) -> None:
 
 def remove_index_node(node_id: str) -> None:
     INDEX_NODES.pop(node_id, None)
+    remove_node_stats(node_id)
+
+
+class KBShardsCacheEntry:
+    """
+    Parsed shards of a KB as stored on the cache utility. Entries without
+    shards are fill tokens: they're set before reading maindb so we can tell
+    whether an invalidation arrived meanwhile, in which case what we read may
+    be stale and is not cached.
+    """
+
+    def __init__(self, shards: Optional[writer_pb2.Shards] = None):
+        self.shards = shards
+        self.created = time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() - self.created > settings.kb_shards_cache_ttl
+
+
+async def invalidate_kb_shards_cache(kbid: str) -> None:
+    """
+    Let all processes know the shards of a KB changed. Must be called once the
+    change has been committed.
+    """
+    cache = await get_cache()
+    if cache is not None:
+        await cache.delete(KB_SHARDS_CACHE.format(kbid=kbid), invalidate=True)
 
 
 class KBShardManager:
     async def get_shards_by_kbid_inner(self, kbid: str) -> writer_pb2.Shards:
+        """
+        Returned shards may be shared with other callers, so they must not be
+        modified.
+        """
+        pb = await self._get_kb_shards(kbid)
+        if pb is None:
+            # could be None because /shards doesn't exist, or beacause the whole KB does not exist.
+            # In any case, this should not happen
+            raise ShardsNotFound(kbid)
+        return pb
+
+    async def _get_kb_shards(
+        self, kbid: str, txn: Optional[Transaction] = None
+    ) -> Optional[writer_pb2.Shards]:
+        """
+        Get the KB shards from the cache or maindb. Shards read with a caller
+        transaction are not cached, as they may not be committed yet.
+        """
+        cache = await get_cache()
+        cache_key = KB_SHARDS_CACHE.format(kbid=kbid)
+        token = None
+        if cache is not None:
+            entry: Optional[KBShardsCacheEntry] = await cache.get(cache_key)
+            if entry is not None and entry.shards is not None and not entry.expired:
+                KB_SHARDS_CACHE_OPS.inc({"type": "hit"})
+                return entry.shards
+            KB_SHARDS_CACHE_OPS.inc({"type": "miss"})
+            if txn is None:
+                token = KBShardsCacheEntry()
+                await cache.set(cache_key, token)
+
         key = KB_SHARDS.format(kbid=kbid)
-        driver = get_driver()
-        async with driver.transaction() as txn:
+        if txn is not None:
             payload = await txn.get(key)
-            if payload is None:
-                # could be None because /shards doesn't exist, or beacause the whole KB does not exist.
-                # In any case, this should not happen
-                raise ShardsNotFound(kbid)
+        else:
+            driver = get_driver()
+            async with driver.transaction() as txn:
+                payload = await txn.get(key)
+        if payload is None:
+            return None
 
-            pb = writer_pb2.Shards()
-            pb.ParseFromString(payload)
-            return pb
+        pb = writer_pb2.Shards()
+        pb.ParseFromString(payload)
+        if cache is not None and token is not None:
+            if await cache.get(cache_key) is token:
+                await cache.set(cache_key, KBShardsCacheEntry(pb), size=pb.ByteSize())
+        return pb
 
     async def get_shards_by_kbid(self, kbid: str) -> list[writer_pb2.ShardObject]:
         shards = await self.get_shards_by_kbid_inner(kbid)
@@ -127,11 +197,8 @@ class KBShardManager:
     async def get_current_active_shard(
         self, txn: Transaction, kbid: str
     ) -> Optional[writer_pb2.ShardObject]:
-        key = KB_SHARDS.format(kbid=kbid)
-        kb_shards_bytes: Optional[bytes] = await txn.get(key)
-        if kb_shards_bytes is not None:
-            kb_shards = writer_pb2.Shards()
-            kb_shards.ParseFromString(kb_shards_bytes)
+        kb_shards = await self._get_kb_shards(kbid, txn)
+        if kb_shards is not None:
             shard: writer_pb2.ShardObject = kb_shards.shards[kb_shards.actual]
             return shard
         else:
@@ -333,32 +400,65 @@ def setup_standalone_cluster():
 
 
 def choose_node(
-    shard: writer_pb2.ShardObject, shard_replicas: Optional[list[str]] = None
+    shard: writer_pb2.ShardObject,
+    shard_replicas: Optional[list[str]] = None,
+    request_type: str = "search",
 ) -> tuple[AbstractIndexNode, str, str]:
     """
-    Choose an arbitrary node storing `shard`. If passed, choose only between
-    nodes containing any of `shard_replicas`.
+    Choose the best node storing `shard` for a `request_type` request. If
+    passed, choose only between nodes containing any of `shard_replicas`.
     """
-    shard_replicas = shard_replicas or []
-    nodes = [x for x in range(len(shard.replicas))]
-    random.shuffle(nodes)
-    node_obj = None
-    shard_id = None
-    for node in nodes:
-        node_id = shard.replicas[node].node
-        node_obj = get_index_node(node_id)
-        if node_obj is not None:
-            shard_id = shard.replicas[node].shard.id
-            if len(shard_replicas) > 0 and shard_id not in shard_replicas:
-                node_obj = None
-                shard_id = None
-            else:
-                break
-
-    if node_obj is None or node_id is None or shard_id is None:
+    candidates = choose_nodes(shard, shard_replicas, request_type)
+    if len(candidates) == 0:
         raise KeyError("Could not find a node to query")
+    return candidates[0]
+
+
+def choose_nodes(
+    shard: writer_pb2.ShardObject,
+    shard_replicas: Optional[list[str]] = None,
+    request_type: str = "search",
+) -> list[tuple[AbstractIndexNode, str, str]]:
+    """
+    List the available nodes storing `shard`, best first. Healthy nodes go
+    before unhealthy ones and then by their expected latency for
+    `request_type`, given their moving average latency and in-flight
+    requests. The average of a node not getting traffic decays towards the
+    average of its peers, and a small share of requests go to a random healthy
+    replica first, so a node that was slow once is not avoided forever. Ties
+    are broken randomly so load spreads among nodes we know nothing about.
+
+    If passed, choose only between nodes containing any of `shard_replicas`.
+    """
+    shard_replicas = shard_replicas or []
+    candidates = []
+    for replica in shard.replicas:
+        node_obj = get_index_node(replica.node)
+        if node_obj is None:
+            continue
+        if len(shard_replicas) > 0 and replica.shard.id not in shard_replicas:
+            continue
+        candidates.append((node_obj, replica.shard.id, replica.node))
+
+    random.shuffle(candidates)
+    mean = mean_latency(
+        [get_node_stats(node_id) for _, _, node_id in candidates], request_type
+    )
 
-    return node_obj, shard_id, node_id
+    def rank(candidate: tuple[AbstractIndexNode, str, str]) -> tuple[bool, float]:
+        stats = get_node_stats(candidate[2])
+        return (not stats.healthy, stats.score(request_type, mean))
+
+    candidates.sort(key=rank)
+    if len(candidates) > 1 and explore():
+        others = [
+            index
+            for index, candidate in enumerate(candidates[1:], 1)
+            if get_node_stats(candidate[2]).healthy
+        ]
+        if len(others) > 0:
+            candidates.insert(0, candidates.pop(random.choice(others)))
+    return candidates
 
 
 @dataclass
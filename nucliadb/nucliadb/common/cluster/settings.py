@@ -53,6 +53,10 @@ class Settings(BaseSettings):
         description="Maximum number of shard replicas a single node will manage",
     )
 
+    # Safety net for the in-memory cache of KB shards, which is invalidated
+    # through pubsub every time they change
+    kb_shards_cache_ttl: float = 60
+
     local_reader_threads: int = 5
     local_writer_threads: int = 5
 
@@ -23,7 +23,7 @@ import asyncio
 import logging
 import threading
 from concurrent.futures import ThreadPoolExecutor
-from typing import AsyncIterator
+from typing import Any, AsyncIterator, Callable, List, Type, TypeVar, Union
 
 from nucliadb_protos.nodereader_pb2 import (
     DocumentItem,
@@ -57,6 +57,14 @@ from nucliadb_protos.nodewriter_pb2 import OpStatus, SetGraph
 from ..settings import settings
 
 logger = logging.getLogger(__name__)
+
+# Streamed items handed to the event loop at once, and chunks of them that
+# can be waiting to be consumed
+STREAM_CHUNK_SIZE = 100
+STREAM_QUEUED_CHUNKS = 2
+
+T = TypeVar("T")
+
 try:
     from nucliadb_node_binding import NodeReader  # type: ignore
     from nucliadb_node_binding import NodeWriter  # type: ignore
@@ -98,6 +106,40 @@ class StandaloneReaderWrapper:
             else:
                 raise
 
+    async def SearchMany(
+        self, shard_ids: List[str], request: SearchRequest, retry: bool = False
+    ) -> List[Union[SearchResponse, Exception]]:
+        """
+        Run the same search on several shards with a single call to the
+        binding, which queries them in parallel. Results come in the same
+        order as `shard_ids`: the response of each shard or its error.
+        """
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(
+            self.executor,
+            self.reader.search_many,
+            shard_ids,
+            request.SerializeToString(),
+        )
+        responses: List[Union[SearchResponse, Exception]] = []
+        for result in results:
+            if isinstance(result, Exception):
+                responses.append(result)
+                continue
+            pb = SearchResponse()
+            pb.ParseFromString(bytes(result))
+            responses.append(pb)
+
+        if not retry and any(
+            isinstance(response, TypeError) and "IO error" in str(response)
+            for response in responses
+        ):
+            # try some mitigations...
+            logger.error(f"TypeError in SearchMany: {request}")
+            self.reader = NodeReader.new()
+            return await self.SearchMany(shard_ids, request, retry=True)
+        return responses
+
     async def ParagraphSearch(
         self, request: ParagraphSearchRequest
     ) -> ParagraphSearchResponse:
@@ -145,65 +187,54 @@ class StandaloneReaderWrapper:
     async def Documents(
         self, stream_request: StreamRequest
     ) -> AsyncIterator[DocumentItem]:  # pragma: no cover
+        async for item in self._stream(
+            self.reader.documents, stream_request, DocumentItem
+        ):
+            yield item
+
+    async def Paragraphs(
+        self, stream_request: StreamRequest
+    ) -> AsyncIterator[ParagraphItem]:
+        async for item in self._stream(
+            self.reader.paragraphs, stream_request, ParagraphItem
+        ):
+            yield item
+
+    async def _stream(
+        self,
+        producer: Callable[[bytes], Any],
+        stream_request: StreamRequest,
+        item_klass: Type[T],
+    ) -> AsyncIterator[T]:
         """
         This is a workaround for the fact that the node binding does not support async generators.
 
+        Items are read on a thread and handed to the event loop in chunks, so
+        we don't wait for the loop on every one of them.
+
         Very difficult to write tests for
         """
         loop = asyncio.get_running_loop()
-        q: asyncio.Queue[DocumentItem] = asyncio.Queue(1)
+        q: asyncio.Queue[Any] = asyncio.Queue(STREAM_QUEUED_CHUNKS)
         exception = None
         _END = object()
 
-        def thread_generator():
-            nonlocal exception
-            generator = self.reader.documents(stream_request.SerializeToString())
-            try:
-                element = generator.next()
-                while element is not None:
-                    pb_bytes = bytes(element)
-                    pb = DocumentItem()
-                    pb.ParseFromString(pb_bytes)
-                    asyncio.run_coroutine_threadsafe(q.put(pb), loop).result()
-                    element = generator.next()
-            except TypeError:
-                # this is the end
-                pass
-            except Exception as e:
-                exception = e
-            finally:
-                asyncio.run_coroutine_threadsafe(q.put(_END), loop).result()
-
-        t1 = threading.Thread(target=thread_generator)
-        t1.start()
-
-        while True:
-            next_item = await q.get()
-            if next_item is _END:
-                break
-            yield next_item
-        if exception is not None:
-            raise exception
-        await loop.run_in_executor(self.executor, t1.join)
-
-    async def Paragraphs(
-        self, stream_request: StreamRequest
-    ) -> AsyncIterator[ParagraphItem]:
-        loop = asyncio.get_running_loop()
-        q: asyncio.Queue[ParagraphItem] = asyncio.Queue(1)
-        exception = None
-        _END = object()
+        def put(item):
+            asyncio.run_coroutine_threadsafe(q.put(item), loop).result()
 
         def thread_generator():
             nonlocal exception
-            generator = self.reader.paragraphs(stream_request.SerializeToString())
+            generator = producer(stream_request.SerializeToString())
+            chunk: list[T] = []
             try:
                 element = generator.next()
                 while element is not None:
-                    pb_bytes = bytes(element)
-                    pb = ParagraphItem()
-                    pb.ParseFromString(pb_bytes)
-                    asyncio.run_coroutine_threadsafe(q.put(pb), loop).result()
+                    pb = item_klass()
+                    pb.ParseFromString(bytes(element))
+                    chunk.append(pb)
+                    if len(chunk) >= STREAM_CHUNK_SIZE:
+                        put(chunk)
+                        chunk = []
                     element = generator.next()
             except TypeError:
                 # this is the end
@@ -211,15 +242,18 @@ class StandaloneReaderWrapper:
             except Exception as e:
                 exception = e
             finally:
-                asyncio.run_coroutine_threadsafe(q.put(_END), loop).result()
+                if chunk:
+                    put(chunk)
+                put(_END)
 
         t1 = threading.Thread(target=thread_generator)
         t1.start()
         while True:
-            next_item = await q.get()
-            if next_item is _END:
+            next_chunk = await q.get()
+            if next_chunk is _END:
                 break
-            yield next_item
+            for item in next_chunk:
+                yield item
         if exception is not None:
             raise exception
         await loop.run_in_executor(self.executor, t1.join)
@@ -0,0 +1,179 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+import asyncio
+import math
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterable, Iterator, Optional
+
+# Weight of the last observed latency on the moving average
+EWMA_ALPHA = 0.3
+# Latencies kept per node and request type to compute percentiles
+LATENCY_SAMPLES = 100
+# Minimum samples needed before trusting a node percentile
+MIN_PERCENTILE_SAMPLES = 10
+# Seconds for the moving average of a node getting no traffic to get 1/e
+# closer to the average of its peers, so a slow spell is eventually forgotten
+LATENCY_DECAY_TIME = 30.0
+# Share of requests sent to a random healthy replica other than the best one,
+# so the stats of all of them stay current
+EXPLORATION_RATIO = 0.05
+# A node failing this many requests in a row is considered unhealthy...
+UNHEALTHY_ERRORS = 3
+# ...until this many seconds have passed since its last error
+UNHEALTHY_COOLDOWN = 10.0
+
+
+class LatencyStats:
+    """
+    Latencies of a node for a request type: search, suggest... take very
+    different times, so they are not mixed.
+    """
+
+    def __init__(self):
+        self.latency: Optional[float] = None
+        self.samples: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.updated = 0.0
+
+    def observe(self, latency: float) -> None:
+        self.samples.append(latency)
+        self.updated = time.monotonic()
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.latency
+
+    def decayed(self, mean: float) -> Optional[float]:
+        """
+        Moving average moved towards `mean` the longer the node has not been
+        observed
+        """
+        if self.latency is None:
+            return None
+        weight = math.exp(-(time.monotonic() - self.updated) / LATENCY_DECAY_TIME)
+        return mean + (self.latency - mean) * weight
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        if len(self.samples) < MIN_PERCENTILE_SAMPLES:
+            return None
+        samples = sorted(self.samples)
+        index = min(int(len(samples) * percentile / 100), len(samples) - 1)
+        return samples[index]
+
+
+class NodeStats:
+    def __init__(self):
+        self.latencies: Dict[str, LatencyStats] = {}
+        self.inflight = 0
+        self.errors = 0
+        self.last_error = 0.0
+
+    def observe(self, latency: float, error: bool, request_type: str) -> None:
+        if error:
+            self.errors += 1
+            self.last_error = time.monotonic()
+            return
+        self.errors = 0
+        stats = self.latencies.get(request_type)
+        if stats is None:
+            stats = self.latencies[request_type] = LatencyStats()
+        stats.observe(latency)
+
+    @property
+    def healthy(self) -> bool:
+        return (
+            self.errors < UNHEALTHY_ERRORS
+            or time.monotonic() - self.last_error > UNHEALTHY_COOLDOWN
+        )
+
+    def score(self, request_type: str, mean: Optional[float] = None) -> float:
+        """
+        Expected time for a new request on the node: lower is better. Nodes we
+        know nothing about score 0 so they get traffic and stats. `mean` is the
+        latency of its peers, the one an idle node is assumed to converge to.
+        """
+        stats = self.latencies.get(request_type)
+        if stats is None or stats.latency is None:
+            return 0.0
+        latency = stats.latency if mean is None else stats.decayed(mean)
+        return latency * (self.inflight + 1)  # type: ignore
+
+    def percentile(self, percentile: float, request_type: str) -> Optional[float]:
+        stats = self.latencies.get(request_type)
+        if stats is None:
+            return None
+        return stats.percentile(percentile)
+
+
+NODES_STATS: Dict[str, NodeStats] = {}
+
+
+def get_node_stats(node_id: str) -> NodeStats:
+    stats = NODES_STATS.get(node_id)
+    if stats is None:
+        stats = NODES_STATS[node_id] = NodeStats()
+    return stats
+
+
+def remove_node_stats(node_id: str) -> None:
+    NODES_STATS.pop(node_id, None)
+
+
+def mean_latency(
+    nodes_stats: Iterable[NodeStats], request_type: str
+) -> Optional[float]:
+    latencies = [
+        stats.latencies[request_type].latency
+        for stats in nodes_stats
+        if request_type in stats.latencies
+    ]
+    if len(latencies) == 0:
+        return None
+    return sum(latencies) / len(latencies)  # type: ignore
+
+
+def explore() -> bool:
+    return random.random() < EXPLORATION_RATIO
+
+
+@contextmanager
+def track_node_request(node_id: str, request_type: str) -> Iterator[None]:
+    """
+    Account a request to an index node on its stats: in-flight requests while
+    it runs and then its latency or error. Cancelled requests (i.e. losers of
+    a hedged request) are not accounted as errors.
+    """
+    stats = get_node_stats(node_id)
+    stats.inflight += 1
+    start = time.monotonic()
+    try:
+        yield
+    except asyncio.CancelledError:
+        stats.inflight -= 1
+        raise
+    except Exception:
+        stats.inflight -= 1
+        stats.observe(time.monotonic() - start, error=True, request_type=request_type)
+        raise
+    else:
+        stats.inflight -= 1
+        stats.observe(time.monotonic() - start, error=False, request_type=request_type)
@@ -36,7 +36,12 @@ class Transaction:
     async def commit(self):
         raise NotImplementedError()
 
-    async def batch_get(self, keys: List[str]):
+    async def batch_get(self, keys: List[str]) -> List[Optional[bytes]]:
+        """
+        Get the values of many keys in as few round trips as possible.
+        Results are positionally aligned with `keys` and missing keys are
+        returned as None.
+        """
         raise NotImplementedError()
 
     async def get(self, key: str) -> Optional[bytes]:
@@ -105,25 +105,13 @@ class LocalTransaction(Transaction):
         self.clean()
         self.open = False
 
-    async def batch_get(self, keys: List[str]):
-        results = []
+    async def batch_get(self, keys: List[str]) -> List[Optional[bytes]]:
+        results: List[Optional[bytes]] = []
         for key in keys:
             if key in self.deleted_keys:
-                raise KeyError(f"Not found {key}")
-
-            if key in self.modified_keys:
-                results.append(self.modified_keys[key])
-                keys.remove(key)
-
-            if key in self.visited_keys:
-                results.append(self.visited_keys[key])
-                keys.remove(key)
-
-        if len(keys) > 0:
-            for key in keys:
-                obj = await self.get(key)
-                if obj:
-                    results.append(obj)
+                results.append(None)
+            else:
+                results.append(await self.get(key))
         return results
 
     async def get(self, key: str) -> Optional[bytes]:
@@ -20,7 +20,7 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Any, AsyncGenerator, List, Optional
+from typing import Any, AsyncGenerator, Dict, List, Optional, Set
 
 import asyncpg
 
@@ -33,6 +33,31 @@ CREATE TABLE IF NOT EXISTS resources (
 );
 """
 
+# Bytewise ordered index for prefix scans, as the primary key index follows
+# the database collation and can't be used for them unless it's "C". Built
+# concurrently so writes to an existing table are not blocked meanwhile, which
+# can't be done inside a transaction: it must be executed on its own.
+CREATE_KEY_INDEX = """
+CREATE INDEX CONCURRENTLY IF NOT EXISTS resources_key_c_idx
+ON resources (key COLLATE "C");
+"""
+
+
+def _prefix_upper(prefix: str) -> Optional[str]:
+    """
+    Smallest string greater than all the strings starting with prefix, on
+    bytewise (C collation) order. None if there's no such string.
+    """
+    while prefix:
+        last = ord(prefix[-1])
+        if last == 0xD7FF:
+            # surrogates are not valid characters, skip them
+            return prefix[:-1] + chr(0xE000)
+        if last < 0x10FFFF:
+            return prefix[:-1] + chr(last + 1)
+        prefix = prefix[:-1]
+    return None
+
 
 class DataLayer:
     def __init__(self, connection: asyncpg.Connection):
@@ -44,21 +69,27 @@ class DataLayer:
         )
 
     async def set(self, key: str, value: bytes) -> None:
+        await self.batch_set({key: value})
+
+    async def delete(self, key: str) -> None:
+        await self.batch_delete([key])
+
+    async def batch_set(self, values: Dict[str, bytes]) -> None:
         await self.connection.execute(
             """
 INSERT INTO resources (key, value)
-VALUES ($1, $2)
+SELECT * FROM unnest($1::TEXT[], $2::BYTEA[])
 ON CONFLICT (key)
 DO UPDATE SET value = EXCLUDED.value
 """,
-            key,
-            value,
+            list(values.keys()),
+            list(values.values()),
         )
 
-    async def delete(self, key: str) -> None:
-        await self.connection.execute("DELETE FROM resources WHERE key = $1", key)
+    async def batch_delete(self, keys: List[str]) -> None:
+        await self.connection.execute("DELETE FROM resources WHERE key = ANY($1)", keys)
 
-    async def batch_get(self, keys: List[str]) -> List[bytes]:
+    async def batch_get(self, keys: List[str]) -> List[Optional[bytes]]:
         records = {
             record["key"]: record["value"]
             for record in await self.connection.fetch(
@@ -66,7 +97,7 @@ DO UPDATE SET value = EXCLUDED.value
             )
         }
         # get sorted by keys
-        return [records[key] for key in keys]
+        return [records.get(key) for key in keys]
 
     async def scan_keys(
         self,
@@ -74,11 +105,16 @@ DO UPDATE SET value = EXCLUDED.value
         limit: int = DEFAULT_SCAN_LIMIT,
         include_start: bool = True,
     ) -> AsyncGenerator[str, None]:
-        query = "SELECT key FROM resources WHERE key LIKE $1"
-        args: list[Any] = [prefix + "%"]
+        query = 'SELECT key FROM resources WHERE key COLLATE "C" >= $1'
+        args: list[Any] = [prefix]
+        upper = _prefix_upper(prefix)
+        if upper is not None:
+            args.append(upper)
+            query += f' AND key COLLATE "C" < ${len(args)}'
+        query += ' ORDER BY key COLLATE "C"'
         if limit > 0:
-            query += " LIMIT $2"
             args.append(limit)
+            query += f" LIMIT ${len(args)}"
         async for record in self.connection.cursor(query, *args):
             if not include_start and record["key"] == prefix:
                 continue
@@ -86,7 +122,18 @@ DO UPDATE SET value = EXCLUDED.value
 
 
 class PGTransaction(Transaction):
+    """
+    Writes are buffered and flushed in bulk at commit, or before scanning keys
+    so the scan sees them.
+
+    A transaction may be shared by concurrent tasks (i.e. the search request
+    transaction) but its connection can only run a query at a time, so they
+    are serialized with a lock.
+    """
+
     driver: PGDriver
+    modified_keys: Dict[str, bytes]
+    deleted_keys: Set[str]
 
     def __init__(self, connection: asyncpg.Connection, txn: Any, driver: PGDriver):
         self.connection = connection
@@ -94,6 +141,8 @@ class PGTransaction(Transaction):
         self.txn = txn
         self.driver = driver
         self.open = True
+        self.modified_keys = {}
+        self.deleted_keys = set()
         self._lock = asyncio.Lock()
 
     async def abort(self):
@@ -103,38 +152,81 @@ class PGTransaction(Transaction):
                     await self.txn.rollback()
                 finally:
                     self.open = False
-                    await self.connection.close()
+                    await self.driver.pool.release(self.connection)
 
     async def commit(self):
         async with self._lock:
             try:
+                await self._flush()
                 await self.txn.commit()
             except Exception:
                 await self.txn.rollback()
                 raise
             finally:
                 self.open = False
-                await self.connection.close()
+                await self.driver.pool.release(self.connection)
 
-    async def batch_get(self, keys: List[str]):
-        return await self.data_layer.batch_get(keys)
+    async def _flush(self):
+        if self.deleted_keys:
+            await self.data_layer.batch_delete(list(self.deleted_keys))
+            self.deleted_keys.clear()
+        if self.modified_keys:
+            await self.data_layer.batch_set(self.modified_keys)
+            self.modified_keys.clear()
+
+    async def batch_get(self, keys: List[str]) -> List[Optional[bytes]]:
+        missing = [
+            key
+            for key in keys
+            if key not in self.modified_keys and key not in self.deleted_keys
+        ]
+        values: Dict[str, Optional[bytes]] = {}
+        if missing:
+            async with self._lock:
+                values = dict(zip(missing, await self.data_layer.batch_get(missing)))
+        return [
+            self.modified_keys[key] if key in self.modified_keys else values.get(key)
+            for key in keys
+        ]
 
     async def get(self, key: str) -> Optional[bytes]:
-        return await self.data_layer.get(key)
+        if key in self.deleted_keys:
+            return None
+        if key in self.modified_keys:
+            return self.modified_keys[key]
+        async with self._lock:
+            return await self.data_layer.get(key)
 
     async def set(self, key: str, value: bytes):
-        await self.data_layer.set(key, value)
+        self.deleted_keys.discard(key)
+        self.modified_keys[key] = value
 
     async def delete(self, key: str):
-        await self.data_layer.delete(key)
+        self.modified_keys.pop(key, None)
+        self.deleted_keys.add(key)
 
-    def keys(
+    async def keys(
         self,
         match: str,
         count: int = DEFAULT_SCAN_LIMIT,
         include_start: bool = True,
     ):
-        return self.data_layer.scan_keys(match, count, include_start=include_start)
+        async with self._lock:
+            await self._flush()
+        scan = self.data_layer.scan_keys(match, count, include_start=include_start)
+        try:
+            while True:
+                # the lock can't be held while the caller consumes the keys, as
+                # it could query the transaction too
+                async with self._lock:
+                    try:
+                        key = await scan.__anext__()
+                    except StopAsyncIteration:
+                        break
+                yield key
+        finally:
+            async with self._lock:
+                await scan.aclose()
 
 
 class PGDriver(Driver):
@@ -152,6 +244,7 @@ class PGDriver(Driver):
                 # check if table exists
                 async with self.pool.acquire() as conn:
                     await conn.execute(CREATE_TABLE)
+                    await conn.execute(CREATE_KEY_INDEX)
 
             self.initialized = True
 
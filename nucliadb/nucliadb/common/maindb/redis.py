@@ -17,7 +17,9 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
-from typing import Any, Dict, List, Optional
+import asyncio
+import logging
+from typing import Any, AsyncGenerator, Dict, List, Optional, Set
 
 from nucliadb.common.maindb.driver import (
     DEFAULT_BATCH_SCAN_LIMIT,
@@ -33,18 +35,88 @@ try:
 except ImportError:  # pragma: no cover
     REDIS = False
 
+logger = logging.getLogger(__name__)
+
+# Sorted set with all the keys, scored 0 so they're sorted lexicographically
+# and prefix scans are range queries instead of walking the whole keyspace
+KEYS_INDEX = b"maindb:keys"
+# Set once the index has been built from the existing keys
+KEYS_INDEX_READY = b"maindb:keys:ready"
+# Index the keys (KEYS[2:]) that still exist, atomically, so a key deleted
+# while the index is being built is not added back to it
+INDEX_EXISTING_KEYS = """
+for i = 2, #KEYS do
+    if redis.call('EXISTS', KEYS[i]) == 1 then
+        redis.call('ZADD', KEYS[1], 0, KEYS[i])
+    end
+end
+"""
+
+
+def _prefix_range(prefix: bytes, after: Optional[bytes] = None):
+    # Keys are utf-8 so they never contain a 0xff byte
+    start = b"(" + after if after is not None else b"[" + prefix
+    return start, b"(" + prefix + b"\xff"
+
+
+class ReadPipeline:
+    """
+    Groups independent reads issued close in time (by default, in the same
+    loop iteration) into a single MGET. Concurrent reads of the same key share
+    the same request.
+    """
+
+    def __init__(self, redis: Any, window: float = 0):
+        self.redis = redis
+        self.window = window
+        self.pending: Dict[str, asyncio.Future] = {}
+        self.flush_task: Optional[asyncio.Task] = None
+
+    def _enqueue(self, key: str) -> asyncio.Future:
+        future = self.pending.get(key)
+        if future is None:
+            future = self.pending[key] = asyncio.get_running_loop().create_future()
+            if self.flush_task is None:
+                self.flush_task = asyncio.create_task(self._flush())
+        return future
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await asyncio.shield(self._enqueue(key))
+
+    async def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        futures = [self._enqueue(key) for key in keys]
+        return await asyncio.shield(asyncio.gather(*futures))
+
+    async def _flush(self):
+        await asyncio.sleep(self.window)
+        pending, self.pending = self.pending, {}
+        self.flush_task = None
+        keys = list(pending.keys())
+        try:
+            values = await self.redis.mget([key.encode() for key in keys])
+        except Exception as exc:
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(exc)
+        else:
+            for key, value in zip(keys, values):
+                future = pending[key]
+                if not future.done():
+                    future.set_result(value)
+
 
 class RedisTransaction(Transaction):
     modified_keys: Dict[str, bytes]
-    visited_keys: Dict[str, bytes]
-    deleted_keys: List[str]
+    visited_keys: Dict[str, Optional[bytes]]
+    deleted_keys: Set[str]
+    driver: "RedisDriver"
 
-    def __init__(self, redis: Any, driver: Driver):
+    def __init__(self, redis: Any, driver: "RedisDriver"):
         self.redis = redis
         self.driver = driver
         self.modified_keys = {}
         self.visited_keys = {}
-        self.deleted_keys = []
+        self.deleted_keys = set()
         self.open = True
 
     def clean(self):
@@ -59,45 +131,48 @@ class RedisTransaction(Transaction):
     async def commit(self):
         if len(self.modified_keys) == 0 and len(self.deleted_keys) == 0:
             self.clean()
+            self.open = False
             return
 
-        not_to_check = []
         async with self.redis.pipeline(transaction=True) as pipe:
-            count = 0
             for key, value in self.modified_keys.items():
                 pipe = pipe.set(key.encode(), value)
-                count += 1
-            for key in self.deleted_keys:
-                pipe = pipe.delete(key.encode())
-                not_to_check.append(count)
-                count += 1
+            if self.modified_keys:
+                pipe = pipe.zadd(
+                    KEYS_INDEX, {key.encode(): 0 for key in self.modified_keys}
+                )
+            if self.deleted_keys:
+                # We do no check deleted if its already deleted
+                pipe = pipe.delete(*[key.encode() for key in self.deleted_keys])
+                pipe = pipe.zrem(
+                    KEYS_INDEX, *[key.encode() for key in self.deleted_keys]
+                )
             oks = await pipe.execute()
 
-        for index, ok in enumerate(oks):
-            # We do no check deleted if its already deleted
-            if index not in not_to_check:
-                assert ok
+        for ok in oks[: len(self.modified_keys)]:
+            assert ok
         self.clean()
         self.open = False
 
-    async def batch_get(self, keys: List[str]):
-        results = []
-        for key in keys:
+    async def batch_get(self, keys: List[str]) -> List[Optional[bytes]]:
+        results: List[Optional[bytes]] = []
+        missing: List[int] = []
+        for index, key in enumerate(keys):
             if key in self.deleted_keys:
-                raise KeyError(f"Not found {key}")
-
-            if key in self.modified_keys:
+                results.append(None)
+            elif key in self.modified_keys:
                 results.append(self.modified_keys[key])
-                keys.remove(key)
-
-            if key in self.visited_keys:
+            elif key in self.visited_keys:
                 results.append(self.visited_keys[key])
-                keys.remove(key)
-
-        if len(keys) > 0:
-            bytes_keys: List[bytes] = [x.encode() for x in keys]
-            objs = await self.redis.mget(bytes_keys)
-            results.extend(objs)
+            else:
+                results.append(None)
+                missing.append(index)
+
+        if len(missing) > 0:
+            objs = await self.driver.reads.get_many([keys[index] for index in missing])
+            for index, obj in zip(missing, objs):
+                self.visited_keys[keys[index]] = obj
+                results[index] = obj
         return results
 
     async def get(self, key: str) -> Optional[bytes]:
@@ -111,13 +186,12 @@ class RedisTransaction(Transaction):
             return self.visited_keys[key]
 
         else:
-            obj = await self.redis.get(key.encode())
+            obj = await self.driver.reads.get(key)
             self.visited_keys[key] = obj
             return obj
 
     async def set(self, key: str, value: bytes):
-        if key in self.deleted_keys:
-            self.deleted_keys.remove(key)
+        self.deleted_keys.discard(key)
 
         if key in self.visited_keys:
             del self.visited_keys[key]
@@ -125,8 +199,7 @@ class RedisTransaction(Transaction):
         self.modified_keys[key] = value
 
     async def delete(self, key: str):
-        if key not in self.deleted_keys:
-            self.deleted_keys.append(key)
+        self.deleted_keys.add(key)
 
         if key in self.visited_keys:
             del self.visited_keys[key]
@@ -137,45 +210,59 @@ class RedisTransaction(Transaction):
     async def keys(
         self, match: str, count: int = DEFAULT_SCAN_LIMIT, include_start: bool = True
     ):
-        prev_key = None
-
-        get_all_keys = count == -1
-        _count = DEFAULT_BATCH_SCAN_LIMIT if get_all_keys else count
-
-        async with self.redis.client() as conn:
-            async for key in conn.scan_iter(match=match.encode() + b"*", count=_count):
-                str_key = key.decode()
-                if str_key in self.deleted_keys:
-                    continue
-                for new_key in self.modified_keys.keys():
-                    if (
-                        match in new_key
-                        and prev_key is not None
-                        and prev_key < new_key
-                        and new_key < str_key
-                    ):
-                        yield new_key
-
-                yield str_key
-                prev_key = str_key
-        if prev_key is None:
-            for new_key in self.modified_keys.keys():
-                if match in new_key:
-                    yield new_key
+        """
+        Committed keys starting with `match` merged with the ones modified on
+        the transaction, in order. Use -1 as count to get all of them.
+        """
+        yielded = 0
+        async for key in self._merged_keys(match, include_start):
+            if count != -1 and yielded >= count:
+                return
+            yield key
+            yielded += 1
+
+    async def _merged_keys(self, match: str, include_start: bool):
+        new_keys = sorted(
+            key
+            for key in self.modified_keys
+            if key.startswith(match) and (include_start or key != match)
+        )
+        async for key in self.driver.keys(match, count=-1, include_start=include_start):
+            while new_keys and new_keys[0] < key:
+                yield new_keys.pop(0)
+            if new_keys and new_keys[0] == key:
+                new_keys.pop(0)
+            elif key in self.deleted_keys:
+                continue
+            yield key
+        for new_key in new_keys:
+            yield new_key
 
 
 class RedisDriver(Driver):
     redis = None
     url = None
+    reads: ReadPipeline
 
-    def __init__(self, url: str):
+    def __init__(
+        self,
+        url: str,
+        max_connections: Optional[int] = None,
+        read_window: float = 0,
+    ):
         if REDIS is False:
             raise ImportError("Redis is not installed")
         self.url = url
+        self.max_connections = max_connections
+        self.read_window = read_window
 
     async def initialize(self):
         if self.initialized is False and self.redis is None:
-            self.redis = aioredis.from_url(self.url)
+            self.redis = aioredis.from_url(
+                self.url, max_connections=self.max_connections
+            )
+            self.reads = ReadPipeline(self.redis, window=self.read_window)
+            await self.build_keys_index()
         self.initialized = True
 
     async def finalize(self):
@@ -183,14 +270,56 @@ class RedisDriver(Driver):
             await self.redis.close()
             self.initialized = False
 
+    async def build_keys_index(self):
+        """
+        Index keys written before the keys index existed. Only needs to scan
+        the keyspace once per database.
+        """
+        if await self.redis.exists(KEYS_INDEX_READY):
+            return
+        logger.info("Building maindb keys index")
+        batch = []
+        async for key in self.redis.scan_iter(count=DEFAULT_BATCH_SCAN_LIMIT):
+            if key.startswith(b"/"):
+                batch.append(key)
+            if len(batch) >= DEFAULT_BATCH_SCAN_LIMIT:
+                await self._index_existing_keys(batch)
+                batch = []
+        if batch:
+            await self._index_existing_keys(batch)
+        await self.redis.set(KEYS_INDEX_READY, b"1")
+
+    async def _index_existing_keys(self, keys: List[bytes]):
+        await self.redis.eval(INDEX_EXISTING_KEYS, len(keys) + 1, KEYS_INDEX, *keys)
+
     async def begin(self) -> RedisTransaction:
         return RedisTransaction(self.redis, driver=self)
 
     async def keys(
         self, match: str, count: int = DEFAULT_SCAN_LIMIT, include_start: bool = True
-    ):
+    ) -> AsyncGenerator[str, None]:
+        """
+        Get keys starting with `match` in lexicographic order, up to `count`.
+        Use -1 as count to get all of them, in batches.
+        """
         if self.redis is None:
             raise AttributeError()
-        async with self.redis.client() as conn:
-            async for key in conn.scan_iter(match=match.encode() + b"*", count=count):
+
+        get_all_keys = count == -1
+        limit = DEFAULT_BATCH_SCAN_LIMIT if get_all_keys else count
+        prefix = match.encode()
+        after = None
+        yielded = 0
+        while True:
+            start, end = _prefix_range(prefix, after)
+            keys = await self.redis.zrangebylex(KEYS_INDEX, start, end, 0, limit)
+            for key in keys:
+                if not get_all_keys and yielded >= count:
+                    return
+                if not include_start and key == prefix:
+                    continue
                 yield key.decode()
+                yielded += 1
+            if len(keys) < limit:
+                return
+            after = keys[-1]
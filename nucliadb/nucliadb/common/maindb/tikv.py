@@ -60,10 +60,13 @@ class TiKVTransaction(Transaction):
             await self.txn.commit()
         self.open = False
 
-    async def batch_get(self, keys: List[str]):
+    async def batch_get(self, keys: List[str]) -> List[Optional[bytes]]:
         bytes_keys: List[bytes] = [x.encode() for x in keys]
         with tikv_observer({"type": "batch_get"}):
-            return await self.txn.batch_get(bytes_keys)
+            pairs = await self.txn.batch_get(bytes_keys)
+        # tikv only returns the key-value pairs found
+        values = dict(pairs)
+        return [values.get(key) for key in bytes_keys]
 
     async def get(self, key: str) -> Optional[bytes]:
         with tikv_observer({"type": "get"}):
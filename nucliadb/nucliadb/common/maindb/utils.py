@@ -67,7 +67,11 @@ async def setup_driver() -> Driver:
         if settings.driver_redis_url is None:
             raise ConfigurationError("No DRIVER_REDIS_URL env var defined.")
 
-        redis_driver = RedisDriver(settings.driver_redis_url)
+        redis_driver = RedisDriver(
+            settings.driver_redis_url,
+            max_connections=settings.driver_redis_max_connections,
+            read_window=settings.driver_redis_read_window,
+        )
         MAIN[_DRIVER_UTIL_NAME] = redis_driver
     elif settings.driver == "tikv":
         if not TIKV:
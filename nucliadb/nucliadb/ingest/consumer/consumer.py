@@ -20,6 +20,7 @@
 import asyncio
 import logging
 import time
+from functools import partial
 from typing import Optional
 
 import nats
@@ -32,13 +33,16 @@ from nucliadb.common.maindb.driver import Driver
 from nucliadb.ingest import logger
 from nucliadb.ingest.orm.exceptions import DeadletteredError, SequenceOrderViolation
 from nucliadb.ingest.orm.processor import Processor, sequence_manager
+from nucliadb.ingest.settings import settings
 from nucliadb_telemetry import context, errors, metrics
 from nucliadb_utils import const
 from nucliadb_utils.cache import KB_COUNTER_CACHE
 from nucliadb_utils.cache.utility import Cache
-from nucliadb_utils.nats import NatsConnectionManager
+from nucliadb_utils.nats import NatsConnectionManager, SeqidTracker
 from nucliadb_utils.storages.storage import Storage
 
+from .utils import group_batch
+
 consumer_observer = metrics.Observer(
     "message_processor",
     labels={"source": ""},
@@ -78,10 +82,26 @@ class IngestConsumer:
         self.nats_connection_manager = nats_connection_manager
         self.ack_wait = 10 * 60
         self.initialized = False
+        self.max_concurrency = settings.ingest_consumer_max_concurrency
 
         self.lock = asyncio.Lock()
         self.processor = Processor(driver, storage, cache, partition)
 
+        # State of the pipelined processing
+        self.resource_tasks: dict[str, asyncio.Task] = {}
+        self.resource_failures: dict[str, int] = {}
+        self.seqids = SeqidTracker()
+        self.saved_seqid = 0
+        self.seqid_lock = asyncio.Lock()
+
+    @property
+    def pipelined(self) -> bool:
+        """
+        Process messages of different resources concurrently. Messages of the
+        same resource are still processed in order.
+        """
+        return self.max_concurrency > 1
+
     async def initialize(self):
         await self.setup_nats_subscription()
         self.initialized = True
@@ -90,6 +110,8 @@ class IngestConsumer:
         last_seqid = await sequence_manager.get_last_seqid(self.driver, self.partition)
         if last_seqid is None:
             last_seqid = 1
+        self.seqids = SeqidTracker(last_seqid)
+        self.saved_seqid = last_seqid
         subject = const.Streams.INGEST.subject.format(partition=self.partition)
         await self.nats_connection_manager.subscribe(
             subject=subject,
@@ -104,7 +126,9 @@ class IngestConsumer:
                 ack_policy=nats.js.api.AckPolicy.EXPLICIT,
                 # Read about message ordering:
                 #   https://docs.nats.io/nats-concepts/subject_mapping#when-is-deterministic-partitioning-needed
-                max_ack_pending=1,  # required for strict message ordering
+                # 1 is required for strict message ordering. With more, messages
+                # of the same resource are still processed in order
+                max_ack_pending=self.max_concurrency,
                 max_deliver=10000,
                 ack_wait=self.ack_wait,
                 idle_heartbeat=5.0,
@@ -114,105 +138,185 @@ class IngestConsumer:
             f"Subscribed to {subject} on stream {const.Streams.INGEST.name} from {last_seqid}"
         )
 
-    async def _process(self, pb: BrokerMessage, seqid: int):
-        await self.processor.process(pb, seqid, self.partition)
+    async def _process(self, pb: BrokerMessage, seqid: int, skip_index: bool = False):
+        if not self.pipelined:
+            await self.processor.process(
+                pb, seqid, self.partition, skip_index=skip_index
+            )
+            return
+
+        # The partition seqid is tracked by the consumer as messages
+        # finish out of order
+        if seqid <= self.seqids.last_seqid:
+            raise SequenceOrderViolation(self.seqids.last_seqid)
+        await self.processor.process(
+            pb, seqid, self.partition, transaction_check=False, skip_index=skip_index
+        )
 
     async def subscription_worker(self, msg: Msg):
+        seqid = int(msg.reply.split(".")[5])
+        if not self.pipelined:
+            async with self.lock:
+                await self.handle_message(msg, seqid)
+            return
+
+        pb = BrokerMessage()
+        pb.ParseFromString(msg.data)
+        key = f"{pb.kbid}/{pb.uuid or pb.slug}"
+        self.seqids.start(seqid)
+        # Messages are delivered in order, chain them by resource. The
+        # concurrency is bounded by max_ack_pending.
+        previous = self.resource_tasks.get(key)
+        task = asyncio.create_task(self.pipelined_worker(msg, seqid, key, previous, pb))
+        self.resource_tasks[key] = task
+        task.add_done_callback(partial(self.resource_task_done, key))
+
+    def resource_task_done(self, key: str, task: asyncio.Task):
+        if self.resource_tasks.get(key) is task:
+            del self.resource_tasks[key]
+
+    async def pipelined_worker(
+        self,
+        msg: Msg,
+        seqid: int,
+        key: str,
+        previous: Optional[asyncio.Task],
+        pb: BrokerMessage,
+    ):
+        if previous is not None:
+            await asyncio.wait([previous])
+
+        failed_seqid = self.resource_failures.get(key)
+        if failed_seqid is not None and failed_seqid < seqid:
+            # An older message of the resource is pending to be retried. Do not
+            # ack so this one is retried after it.
+            logger.warning(
+                f"Postponing message for {key} seq {seqid} partition {self.partition}, "
+                f"waiting for seq {failed_seqid} to be retried"
+            )
+            return
+
+        try:
+            await self.handle_message(msg, seqid, pb)
+        except Exception:
+            if failed_seqid is None or seqid < failed_seqid:
+                self.resource_failures[key] = seqid
+            return
+
+        if failed_seqid == seqid:
+            self.resource_failures.pop(key)
+        self.seqids.finish(seqid)
+        await self.save_last_seqid()
+
+    async def save_last_seqid(self):
+        async with self.seqid_lock:
+            last_seqid = self.seqids.last_seqid
+            if last_seqid <= self.saved_seqid:
+                return
+            async with self.driver.transaction() as txn:
+                await sequence_manager.set_last_seqid(txn, self.partition, last_seqid)
+                await txn.commit()
+            self.saved_seqid = last_seqid
+
+    async def handle_message(
+        self,
+        msg: Msg,
+        seqid: int,
+        pb: Optional[BrokerMessage] = None,
+        skip_index: bool = False,
+    ):
         subject = msg.subject
         reply = msg.reply
-        seqid = int(reply.split(".")[5])
         logger.info(
             f"Message received: subject:{subject}, seqid: {seqid}, reply: {reply}"
         )
         message_source = "<msg source not set>"
         start = time.monotonic()
 
-        async with self.lock:
-            try:
+        try:
+            if pb is None:
                 pb = BrokerMessage()
                 pb.ParseFromString(msg.data)
-                if pb.source == pb.MessageSource.PROCESSOR:
-                    message_source = "processing"
-                elif pb.source == pb.MessageSource.WRITER:
-                    message_source = "writer"
-                if pb.HasField("audit"):
-                    audit_time = pb.audit.when.ToDatetime().isoformat()
-                else:
-                    audit_time = ""
-
-                logger.debug(
-                    f"Received from {message_source} on {pb.kbid}/{pb.uuid} seq {seqid} partition {self.partition} at {time}"  # noqa
-                )
-                context.add_context({"kbid": pb.kbid, "rid": pb.uuid})
+            if pb.source == pb.MessageSource.PROCESSOR:
+                message_source = "processing"
+            elif pb.source == pb.MessageSource.WRITER:
+                message_source = "writer"
+            if pb.HasField("audit"):
+                audit_time = pb.audit.when.ToDatetime().isoformat()
+            else:
+                audit_time = ""
 
-                try:
-                    with consumer_observer(
-                        {
-                            "source": "writer"
-                            if pb.source == pb.MessageSource.WRITER
-                            else "processor"
-                        }
-                    ):
-                        await self._process(pb, seqid)
-                except SequenceOrderViolation as err:
-                    log_func = logger.error
-                    if seqid == err.last_seqid:  # pragma: no cover
-                        # Occasional retries of the last processed message may happen
-                        log_func = logger.warning
-                    log_func(
-                        f"Old txn: DISCARD (nucliadb seqid: {seqid}, partition: {self.partition}). Current seqid: {err.last_seqid}"  # noqa
-                    )
-                else:
-                    message_type_name = pb.MessageType.Name(pb.type)
-                    time_to_process = time.monotonic() - start
-                    log_level = (
-                        logging.INFO if time_to_process < 10 else logging.WARNING
-                    )
-                    logger.log(
-                        log_level,
-                        f"Successfully processed {message_type_name} message from \
-                            {message_source}. kb: {pb.kbid}, resource: {pb.uuid}, \
-                                nucliadb seqid: {seqid}, partition: {self.partition} as {audit_time}, \
-                                    total time: {time_to_process:.2f}s",
-                    )
-                    if self.cache is not None:
-                        await self.cache.delete(
-                            KB_COUNTER_CACHE.format(kbid=pb.kbid), invalidate=True
-                        )
-            except DeadletteredError as e:
-                # Messages that have been sent to deadletter at some point
-                # We don't want to process it again so it's ack'd
-                errors.capture_exception(e)
-                logger.info(
-                    f"An error happend while processing a message from {message_source}. "
-                    f"A copy of the message has been stored on {self.processor.storage.deadletter_bucket}. "
-                    f"Check sentry for more details: {str(e)}"
-                )
-                await msg.ack()
-            except (ShardsNotFound,) as e:
-                # Any messages that for some unexpected inconsistency have failed and won't be tried again
-                # as we cannot do anything about it
-                # - ShardsNotFound: /kb/{id}/shards key or the whole /kb/{kbid} is missing
-                errors.capture_exception(e)
-                logger.info(
-                    f"An error happend while processing a message from {message_source}. "
-                    f"This message has been dropped and won't be retried again"
-                    f"Check sentry for more details: {str(e)}"
-                )
-                await msg.ack()
-            except Exception as e:
-                # Unhandled exceptions that need to be retried after a small delay
-                errors.capture_exception(e)
-                logger.info(
-                    f"An error happend while processing a message from {message_source}. "
-                    "Message has not been ACKd and will be retried. "
-                    f"Check sentry for more details: {str(e)}"
+            logger.debug(
+                f"Received from {message_source} on {pb.kbid}/{pb.uuid} seq {seqid} partition {self.partition} at {time}"  # noqa
+            )
+            context.add_context({"kbid": pb.kbid, "rid": pb.uuid})
+
+            try:
+                with consumer_observer(
+                    {
+                        "source": "writer"
+                        if pb.source == pb.MessageSource.WRITER
+                        else "processor"
+                    }
+                ):
+                    await self._process(pb, seqid, skip_index=skip_index)
+            except SequenceOrderViolation as err:
+                log_func = logger.error
+                if seqid == err.last_seqid:  # pragma: no cover
+                    # Occasional retries of the last processed message may happen
+                    log_func = logger.warning
+                log_func(
+                    f"Old txn: DISCARD (nucliadb seqid: {seqid}, partition: {self.partition}). Current seqid: {err.last_seqid}"  # noqa
                 )
-                await asyncio.sleep(2)
-                raise e
             else:
-                # Successful processing
-                await msg.ack()
+                message_type_name = pb.MessageType.Name(pb.type)
+                time_to_process = time.monotonic() - start
+                log_level = logging.INFO if time_to_process < 10 else logging.WARNING
+                logger.log(
+                    log_level,
+                    f"Successfully processed {message_type_name} message from \
+                        {message_source}. kb: {pb.kbid}, resource: {pb.uuid}, \
+                            nucliadb seqid: {seqid}, partition: {self.partition} as {audit_time}, \
+                                total time: {time_to_process:.2f}s",
+                )
+                if self.cache is not None:
+                    await self.cache.delete(
+                        KB_COUNTER_CACHE.format(kbid=pb.kbid), invalidate=True
+                    )
+        except DeadletteredError as e:
+            # Messages that have been sent to deadletter at some point
+            # We don't want to process it again so it's ack'd
+            errors.capture_exception(e)
+            logger.info(
+                f"An error happend while processing a message from {message_source}. "
+                f"A copy of the message has been stored on {self.processor.storage.deadletter_bucket}. "
+                f"Check sentry for more details: {str(e)}"
+            )
+            await msg.ack()
+        except (ShardsNotFound,) as e:
+            # Any messages that for some unexpected inconsistency have failed and won't be tried again
+            # as we cannot do anything about it
+            # - ShardsNotFound: /kb/{id}/shards key or the whole /kb/{kbid} is missing
+            errors.capture_exception(e)
+            logger.info(
+                f"An error happend while processing a message from {message_source}. "
+                f"This message has been dropped and won't be retried again"
+                f"Check sentry for more details: {str(e)}"
+            )
+            await msg.ack()
+        except Exception as e:
+            # Unhandled exceptions that need to be retried after a small delay
+            errors.capture_exception(e)
+            logger.info(
+                f"An error happend while processing a message from {message_source}. "
+                "Message has not been ACKd and will be retried. "
+                f"Check sentry for more details: {str(e)}"
+            )
+            await asyncio.sleep(2)
+            raise e
+        else:
+            # Successful processing
+            await msg.ack()
 
 
 class IngestProcessedConsumer(IngestConsumer):
@@ -226,6 +330,19 @@ class IngestProcessedConsumer(IngestConsumer):
     other writes are going to be coming from user actions and we don't want to slow them down.
     """
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batch_size = settings.ingest_processed_batch_size
+        self.batch_wait = settings.ingest_processed_batch_wait
+        self.batch: list[Msg] = []
+        self.batch_timer: Optional[asyncio.TimerHandle] = None
+        self.batch_tasks: set[asyncio.Task] = set()
+
+    @property
+    def pipelined(self) -> bool:
+        # Processed messages are not ordered by a partition seqid
+        return False
+
     async def setup_nats_subscription(self):
         subject = const.Streams.INGEST_PROCESSED.subject
         await self.nats_connection_manager.subscribe(
@@ -237,7 +354,7 @@ class IngestProcessedConsumer(IngestConsumer):
             subscription_lost_cb=self.setup_nats_subscription,
             config=nats.js.api.ConsumerConfig(
                 ack_policy=nats.js.api.AckPolicy.EXPLICIT,
-                max_ack_pending=10,
+                max_ack_pending=max(10, self.batch_size),
                 max_deliver=10000,
                 ack_wait=self.ack_wait,
                 idle_heartbeat=5.0,
@@ -247,9 +364,102 @@ class IngestProcessedConsumer(IngestConsumer):
             f"Subscribed to {subject} on stream {const.Streams.INGEST_PROCESSED.name}"
         )
 
-    async def _process(self, pb: BrokerMessage, seqid: int):
+    async def _process(self, pb: BrokerMessage, seqid: int, skip_index: bool = False):
         """
         We are setting `transaction_check` to False here because we can not mix
         transaction ids from regular ingest writes and writes coming from processor.
         """
-        await self.processor.process(pb, seqid, self.partition, transaction_check=False)
+        await self.processor.process(
+            pb, seqid, self.partition, transaction_check=False, skip_index=skip_index
+        )
+
+    async def subscription_worker(self, msg: Msg):
+        if self.batch_size <= 1:
+            await super().subscription_worker(msg)
+            return
+
+        # Messages are acked once their batch is processed
+        self.batch.append(msg)
+        if len(self.batch) >= self.batch_size:
+            self.flush_batch()
+        elif self.batch_timer is None:
+            loop = asyncio.get_running_loop()
+            self.batch_timer = loop.call_later(self.batch_wait, self.flush_batch)
+
+    async def finalize(self):
+        """
+        Process the messages waiting for their batch to fill up and wait for
+        the batches being processed
+        """
+        if len(self.batch) > 0:
+            self.flush_batch()
+        if len(self.batch_tasks) > 0:
+            await asyncio.gather(*self.batch_tasks, return_exceptions=True)
+
+    def flush_batch(self):
+        if self.batch_timer is not None:
+            self.batch_timer.cancel()
+            self.batch_timer = None
+        batch, self.batch = self.batch, []
+        task = asyncio.create_task(self.process_batch(batch))
+        self.batch_tasks.add(task)
+        task.add_done_callback(self.batch_tasks.discard)
+
+    async def process_batch(self, batch: list[Msg]):
+        async with self.lock:
+            pbs = []
+            for msg in batch:
+                pb = BrokerMessage()
+                pb.ParseFromString(msg.data)
+                pbs.append(pb)
+            seqids = [int(msg.reply.split(".")[5]) for msg in batch]
+
+            for group in group_batch(pbs):
+                if len(group) == 1:
+                    await self.handle_batched_message(
+                        batch[group[0]], seqids[group[0]], pbs[group[0]]
+                    )
+                    continue
+
+                kbid = pbs[group[0]].kbid
+                indexed: set[int] = set()
+                try:
+                    with consumer_observer({"source": "processor"}):
+                        await self.processor.txn_batch(
+                            [(pbs[index], seqids[index]) for index in group],
+                            self.partition,
+                            indexed=indexed,
+                        )
+                except Exception as exc:
+                    # Apply them one by one so only the failing ones are deadlettered
+                    logger.warning(
+                        f"Error processing a batch of {len(group)} messages for kb {kbid}, "
+                        f"processing them one by one: {exc}"
+                    )
+                    for index in group:
+                        await self.handle_batched_message(
+                            batch[index],
+                            seqids[index],
+                            pbs[index],
+                            skip_index=seqids[index] in indexed,
+                        )
+                    continue
+
+                logger.info(
+                    f"Successfully processed a batch of {len(group)} messages for kb {kbid}"
+                )
+                if self.cache is not None:
+                    await self.cache.delete(
+                        KB_COUNTER_CACHE.format(kbid=kbid), invalidate=True
+                    )
+                for index in group:
+                    await batch[index].ack()
+
+    async def handle_batched_message(
+        self, msg: Msg, seqid: int, pb: BrokerMessage, skip_index: bool = False
+    ):
+        try:
+            await self.handle_message(msg, seqid, pb, skip_index=skip_index)
+        except Exception:
+            # Already logged and not acked, it will be retried
+            pass
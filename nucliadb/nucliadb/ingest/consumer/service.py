@@ -149,7 +149,11 @@ async def start_ingest_processed_consumer(
     )
     await consumer.initialize()
 
-    return nats_connection_manager.finalize
+    async def finalize():
+        await consumer.finalize()
+        await nats_connection_manager.finalize()
+
+    return finalize
 
 
 async def start_auditor() -> Callable[[], Awaitable[None]]:
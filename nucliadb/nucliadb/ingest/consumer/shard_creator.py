@@ -22,7 +22,7 @@ import logging
 import uuid
 from functools import partial
 
-from nucliadb.common.cluster.manager import choose_node
+from nucliadb.common.cluster.manager import choose_node, invalidate_kb_shards_cache
 from nucliadb.common.cluster.settings import settings
 from nucliadb.common.cluster.utils import get_shard_manager
 from nucliadb.common.maindb.driver import Driver
@@ -111,3 +111,4 @@ class ShardCreatorHandler:
                     txn, kbid, similarity=similarity
                 )
                 await txn.commit()
+            await invalidate_kb_shards_cache(kbid)
@@ -20,6 +20,8 @@
 import asyncio
 from typing import Callable, Coroutine
 
+from nucliadb_protos.writer_pb2 import BrokerMessage
+
 
 class DelayedTaskHandler:
     """
@@ -73,3 +75,28 @@ class DelayedTaskHandler:
                     self.outstanding_tasks.pop(key)
 
         self.outstanding_tasks[key] = self.loop.create_task(outer_task())
+
+
+def group_batch(messages: list[BrokerMessage]) -> list[list[int]]:
+    """
+    Split a batch of messages, by index, in groups of autocommit messages of
+    the same KB that can be applied together. A resource is only once in a
+    group and groups are sorted so messages of a resource keep their order.
+    Any other message type goes on its own group.
+    """
+    groups: list[list[int]] = []
+    open_groups: dict[str, tuple[list[int], set[str]]] = {}
+    for index, message in enumerate(messages):
+        if message.type != BrokerMessage.MessageType.AUTOCOMMIT:
+            groups.append([index])
+            # don't let later messages of the resource jump over this one
+            open_groups.pop(message.kbid, None)
+            continue
+        group, resources = open_groups.get(message.kbid, (None, set()))
+        if group is None or message.uuid in resources:
+            group, resources = [], set()
+            groups.append(group)
+            open_groups[message.kbid] = (group, resources)
+        group.append(index)
+        resources.add(message.uuid)
+    return groups
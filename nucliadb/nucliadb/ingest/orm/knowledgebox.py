@@ -31,7 +31,11 @@ from nucliadb_protos.utils_pb2 import VectorSimilarity
 
 from nucliadb.common.cluster.abc import AbstractIndexNode
 from nucliadb.common.cluster.exceptions import ShardNotFound, ShardsNotFound
-from nucliadb.common.cluster.manager import get_index_node, load_active_nodes
+from nucliadb.common.cluster.manager import (
+    get_index_node,
+    invalidate_kb_shards_cache,
+    load_active_nodes,
+)
 from nucliadb.common.cluster.settings import settings as cluster_settings
 from nucliadb.common.cluster.utils import get_shard_manager
 from nucliadb.common.maindb.driver import Driver, Transaction
@@ -398,6 +402,7 @@ class KnowledgeBox:
 
         await txn.commit()
         await cls.delete_all_kb_keys(driver, kbid)
+        await invalidate_kb_shards_cache(kbid)
 
     @classmethod
     async def delete_all_kb_keys(
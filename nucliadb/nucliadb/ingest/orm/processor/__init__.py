@@ -19,7 +19,7 @@
 #
 import asyncio
 import logging
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 
 import aiohttp.client_exceptions
 
@@ -38,6 +38,7 @@ from nucliadb.ingest.orm.resource import Resource
 from nucliadb_protos import knowledgebox_pb2, utils_pb2, writer_pb2
 from nucliadb_telemetry import errors
 from nucliadb_utils import const
+from nucliadb_utils.cache import KB_RESOURCE_CACHE
 from nucliadb_utils.cache.utility import Cache
 from nucliadb_utils.storages.storage import Storage
 from nucliadb_utils.utilities import get_storage
@@ -80,7 +81,12 @@ class Processor:
         seqid: int,
         partition: Optional[str] = None,
         transaction_check: bool = True,
+        skip_index: bool = False,
     ) -> None:
+        """
+        Apply a message. With `skip_index`, the index message of the resource is
+        not sent, as it's known to be already sent with the same contents.
+        """
         partition = partition if self.partition is None else self.partition
         if partition is None:
             raise AttributeError("Can't process message from unknown partition")
@@ -96,7 +102,9 @@ class Processor:
         if message.type == writer_pb2.BrokerMessage.MessageType.DELETE:
             await self.delete_resource(message, seqid, partition, transaction_check)
         elif message.type == writer_pb2.BrokerMessage.MessageType.AUTOCOMMIT:
-            await self.txn([message], seqid, partition, transaction_check)
+            await self.txn(
+                [message], seqid, partition, transaction_check, skip_index=skip_index
+            )
         elif message.type == writer_pb2.BrokerMessage.MessageType.MULTI:
             # XXX Not supported right now
             # MULTI, COMMIT and ROLLBACK are all not supported in transactional mode right now
@@ -157,6 +165,7 @@ class Processor:
             if transaction_check:
                 await sequence_manager.set_last_seqid(txn, partition, seqid)
             await txn.commit()
+        await self.invalidate_resource_cache(message.kbid, uuid)
         await self.notify_commit(
             partition=partition,
             seqid=seqid,
@@ -185,6 +194,7 @@ class Processor:
         seqid: int,
         partition: str,
         transaction_check: bool = True,
+        skip_index: bool = False,
     ) -> None:
         if len(messages) == 0:
             return None
@@ -221,23 +231,27 @@ class Processor:
                 await resource.compute_global_text()
                 await resource.compute_global_tags(resource.indexer)
                 if message.reindex:
-                    # when reindexing, let's just generate full new index message
-                    resource.replace_indexer(await resource.generate_index_message())
+                    await resource.reindex()
 
             if resource and resource.modified:
-                await self.index_resource(  # noqa
-                    resource=resource,
-                    txn=txn,
-                    uuid=uuid,
-                    kbid=kbid,
-                    seqid=seqid,
-                    partition=partition,
-                    kb=kb,
-                )
+                if skip_index:
+                    # still assign its shard if the resource is new
+                    await self.get_resource_shard_for_index(txn, kb, uuid)
+                else:
+                    await self.index_resource(  # noqa
+                        resource=resource,
+                        txn=txn,
+                        uuid=uuid,
+                        kbid=kbid,
+                        seqid=seqid,
+                        partition=partition,
+                        kb=kb,
+                    )
 
                 if transaction_check:
                     await sequence_manager.set_last_seqid(txn, partition, seqid)
                 await txn.commit()
+                await self.invalidate_resource_cache(kbid, uuid)
 
                 if created or resource.slug_modified:
                     await self.commit_slug(resource)
@@ -293,6 +307,96 @@ class Processor:
 
         return None
 
+    @processor_observer.wrap({"type": "txn_batch"})
+    async def txn_batch(
+        self,
+        messages: List[Tuple[writer_pb2.BrokerMessage, int]],
+        partition: str,
+        indexed: Optional[Set[int]] = None,
+    ) -> None:
+        """
+        Apply autocommit messages of different resources of the same KB, with
+        their seqids, on a single transaction and send their index messages
+        at once.
+
+        It's all or nothing: on errors nothing is committed nor deadlettered,
+        so the caller can retry the messages one by one to find the failing
+        ones. The seqids of the messages whose index message was sent are
+        added to `indexed`, so the retries don't send them again.
+        """
+        if indexed is None:
+            indexed = set()
+
+        async def index(shard, resource, seqid):
+            await self.shard_manager.add_resource(
+                shard, resource.indexer.brain, seqid, partition=partition, kb=kbid
+            )
+            indexed.add(seqid)  # type: ignore
+
+        kbid = messages[0][0].kbid
+        resources: List[Resource] = []
+        async with self.driver.transaction() as txn:
+            if not await KnowledgeBox.exist_kb(txn, kbid):
+                logger.warning(f"KB {kbid} is deleted: skiping txn")
+                return None
+
+            kb = KnowledgeBox(txn, self.storage, kbid)
+            modified = []
+            not_modified = []
+            try:
+                for message, seqid in messages:
+                    result = await self.apply_resource(message, kb)
+                    if result is None:
+                        continue
+                    resource, created = result
+                    resources.append(resource)
+                    await resource.compute_global_text()
+                    await resource.compute_global_tags(resource.indexer)
+                    if message.reindex:
+                        await resource.reindex()
+                    if resource.modified:
+                        shard = await self.get_resource_shard_for_index(
+                            txn, kb, resource.uuid
+                        )
+                        modified.append((message, seqid, resource, created, shard))
+                    else:
+                        not_modified.append((message, seqid))
+
+                await asyncio.gather(
+                    *(
+                        index(shard, resource, seqid)
+                        for _, seqid, resource, _, shard in modified
+                    )
+                )
+                await txn.commit()
+
+                for message, seqid, resource, created, _ in modified:
+                    await self.invalidate_resource_cache(kbid, resource.uuid)
+                    if created or resource.slug_modified:
+                        await self.commit_slug(resource)
+                    await self.notify_commit(
+                        partition=partition,
+                        seqid=seqid,
+                        multi=message.multiid,
+                        message=message,
+                        write_type=writer_pb2.Notification.WriteType.CREATED
+                        if created
+                        else writer_pb2.Notification.WriteType.MODIFIED,
+                    )
+            finally:
+                for resource in resources:
+                    resource.clean()
+
+        for message, seqid in not_modified:
+            await self.notify_abort(
+                partition=partition,
+                seqid=seqid,
+                multi=message.multiid,
+                kbid=kbid,
+                rid=message.uuid,
+            )
+        return None
+
     @processor_observer.wrap({"type": "index_resource"})
     async def index_resource(
         self,
@@ -304,6 +408,14 @@ class Processor:
         partition: str,
         kb: KnowledgeBox,
     ) -> None:
+        shard = await self.get_resource_shard_for_index(txn, kb, uuid)
+        await self.shard_manager.add_resource(
+            shard, resource.indexer.brain, seqid, partition=partition, kb=kbid
+        )
+
+    async def get_resource_shard_for_index(
+        self, txn: Transaction, kb: KnowledgeBox, uuid: str
+    ) -> writer_pb2.ShardObject:
         shard_id = await kb.get_resource_shard_id(uuid)
 
         shard = None
@@ -313,21 +425,18 @@ class Processor:
         if shard is None:
             # It's a new resource, get current active shard to place
             # new resource on
-            shard = await self.shard_manager.get_current_active_shard(txn, kbid)
+            shard = await self.shard_manager.get_current_active_shard(txn, kb.kbid)
             if shard is None:
                 # no shard available, create a new one
                 similarity = await kb.get_similarity()
                 shard = await self.shard_manager.create_shard_by_kbid(
-                    txn, kbid, similarity=similarity
+                    txn, kb.kbid, similarity=similarity
                 )
             await kb.set_resource_shard_id(uuid, shard.shard)
 
-        if shard is not None:
-            await self.shard_manager.add_resource(
-                shard, resource.indexer.brain, seqid, partition=partition, kb=kbid
-            )
-        else:
+        if shard is None:
             raise AttributeError("Shard is not available")
+        return shard
 
     async def multi(self, message: writer_pb2.BrokerMessage, seqid: int) -> None:
         self.messages.setdefault(message.multiid, []).append(message)
@@ -460,6 +569,13 @@ class Processor:
             message.SerializeToString(),
         )
 
+    async def invalidate_resource_cache(self, kbid: str, uuid: str) -> None:
+        # Let readers know that their cached copies of the resource are stale
+        if self.cache is not None:
+            await self.cache.delete(
+                KB_RESOURCE_CACHE.format(kbid=kbid, uuid=uuid), invalidate=True
+            )
+
     async def notify(self, channel, payload: bytes):
         if self.cache is not None and self.cache.pubsub is not None:
             await self.cache.pubsub.publish(channel, payload)
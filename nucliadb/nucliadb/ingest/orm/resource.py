@@ -23,7 +23,16 @@ import asyncio
 import logging
 from concurrent.futures import ThreadPoolExecutor
 from functools import partial
-from typing import TYPE_CHECKING, Any, AsyncIterator, Optional, Tuple, Type
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Optional,
+    Tuple,
+    Type,
+)
 
 from nucliadb_protos.resources_pb2 import AllFieldIDs as PBAllFieldIDs
 from nucliadb_protos.resources_pb2 import Basic
@@ -35,12 +44,14 @@ from nucliadb_protos.resources_pb2 import (
     ExtractedTextWrapper,
     ExtractedVectorsWrapper,
     FieldClassifications,
+    FieldComputedMetadata,
     FieldComputedMetadataWrapper,
     FieldID,
     FieldMetadata,
     FieldText,
     FieldType,
     FileExtractedData,
+    LargeComputedMetadata,
     LargeComputedMetadataWrapper,
     LinkExtractedData,
 )
@@ -49,7 +60,7 @@ from nucliadb_protos.resources_pb2 import Metadata as PBMetadata
 from nucliadb_protos.resources_pb2 import Origin as PBOrigin
 from nucliadb_protos.resources_pb2 import ParagraphAnnotation
 from nucliadb_protos.resources_pb2 import Relations as PBRelations
-from nucliadb_protos.resources_pb2 import UserVectorsWrapper
+from nucliadb_protos.resources_pb2 import UserMetadata, UserVectorsWrapper
 from nucliadb_protos.train_pb2 import EnabledMetadata
 from nucliadb_protos.train_pb2 import Position as TrainPosition
 from nucliadb_protos.train_pb2 import (
@@ -59,7 +70,9 @@ from nucliadb_protos.train_pb2 import (
     TrainResource,
     TrainSentence,
 )
+from nucliadb_protos.utils_pb2 import ExtractedText
 from nucliadb_protos.utils_pb2 import Relation as PBRelation
+from nucliadb_protos.utils_pb2 import UserVectorSet, VectorObject
 from nucliadb_protos.writer_pb2 import BrokerMessage
 
 from nucliadb.common.maindb.driver import Transaction
@@ -75,6 +88,7 @@ from nucliadb.ingest.fields.text import Text
 from nucliadb.ingest.orm.brain import FilePagePositions, ResourceBrain
 from nucliadb.ingest.orm.metrics import processor_observer
 from nucliadb.ingest.orm.utils import get_basic, set_basic
+from nucliadb.ingest.settings import settings as ingest_settings
 from nucliadb_models.common import CloudLink
 from nucliadb_models.writer import GENERIC_MIME_TYPE
 from nucliadb_utils.storages.storage import Storage
@@ -150,6 +164,11 @@ class Resource:
         self.slug_modified: bool = False
         self._indexer: Optional[ResourceBrain] = None
         self._modified_extracted_text: list[FieldID] = []
+        # What the current index message has for each field, by field key
+        self._indexed_fields: set[str] = set()
+        self._indexed_vectors: set[str] = set()
+        self._indexed_user_vectors: set[str] = set()
+        self._previous_usermetadata: Optional[UserMetadata] = None
 
         self.txn = txn
         self.storage = storage
@@ -217,6 +236,9 @@ class Resource:
         Some basic fields are computed off field metadata. This means we need to recompute upon field deletions.
         """
         await self.get_basic()
+        if self.basic is not None and self._previous_usermetadata is None:
+            self._previous_usermetadata = UserMetadata()
+            self._previous_usermetadata.CopyFrom(self.basic.usermetadata)
         if self.basic is not None and self.basic != payload:
             self.basic.MergeFrom(payload)
 
@@ -266,6 +288,7 @@ class Resource:
                             extracted_text=await field_obj.get_extracted_text(),
                             basic_user_field_metadata=user_field_metadata,
                         )
+                        self._indexed_fields.add(field_id)
 
         else:
             self.basic = payload
@@ -353,57 +376,132 @@ class Resource:
         if basic is not None:
             brain.set_global_tags(basic, self.uuid, origin)
         fields = await self.get_fields(force=True)
-        for (type_id, field_id), field in fields.items():
+        loaders = index_field_loaders(
+            vectors=self.disable_vectors is False,
+            user_vectors=self.disable_vectors is False,
+        )
+        async for (type_id, field_id), data in load_fields(
+            [(key, field, loaders) for key, field in fields.items()]
+        ):
             fieldid = FieldID(field_type=type_id, field=field_id)  # type: ignore
-            await self.compute_global_text_field(fieldid, brain)
+            extracted_text = data["extracted_text"]
+            if extracted_text is not None:
+                brain.apply_field_text(
+                    self.generate_field_id(fieldid), get_field_text(extracted_text)
+                )
+            await self.index_field_metadata(brain, basic, fieldid, data)
+            self.index_field_vectors(brain, fieldid, data)
+        return brain
+
+    @processor_observer.wrap({"type": "reindex"})
+    async def reindex(self, full: bool = False):
+        """
+        Add the fields not modified by the current message to the index
+        message.
+
+        Resource labels are copied on the paragraphs and vectors of every
+        field, so they're only sent again if the labels changed, skipping
+        what this message already indexed. With `full`, the index message is
+        generated again from scratch instead.
+        """
+        if full:
+            self.replace_indexer(await self.generate_index_message())
+            return
 
-            field_metadata = await field.get_field_metadata()
+        if not self.labels_modified:
+            return
+
+        basic = await self.get_basic()
+        fields = await self.get_fields(force=True)
+        to_load = []
+        for (type_id, field_id), field in fields.items():
+            fieldid = FieldID(field_type=type_id, field=field_id)  # type: ignore
             field_key = self.generate_field_id(fieldid)
-            if field_metadata is not None:
-                page_positions: Optional[FilePagePositions] = None
-                if type_id == FieldType.FILE and isinstance(field, File):
-                    page_positions = await get_file_page_positions(field)
-
-                user_field_metadata = None
-                if basic is not None:
-                    user_field_metadata = next(
-                        (
-                            fm
-                            for fm in basic.fieldmetadata
-                            if fm.field.field == field_id
-                            and fm.field.field_type == type_id
-                        ),
-                        None,
-                    )
-                brain.apply_field_metadata(
-                    field_key,
-                    field_metadata,
-                    replace_field=[],
-                    replace_splits={},
-                    page_positions=page_positions,
-                    extracted_text=await field.get_extracted_text(),
-                    basic_user_field_metadata=user_field_metadata,
-                )
+            loaders = index_field_loaders(
+                metadata=field_key not in self._indexed_fields,
+                vectors=(
+                    self.disable_vectors is False
+                    and field_key not in self._indexed_vectors
+                ),
+                user_vectors=(
+                    self.disable_vectors is False
+                    and field_key not in self._indexed_user_vectors
+                ),
+            )
+            if loaders:
+                to_load.append(((type_id, field_id), field, loaders))
 
-            if self.disable_vectors is False:
-                vo = await field.get_vectors()
-                if vo is not None:
-                    brain.apply_field_vectors(field_key, vo, False, [])
+        async for (type_id, field_id), data in load_fields(to_load):
+            fieldid = FieldID(field_type=type_id, field=field_id)  # type: ignore
+            await self.index_field_metadata(self.indexer, basic, fieldid, data)
+            self.index_field_vectors(self.indexer, fieldid, data)
 
-                vu = await field.get_user_vectors()
-                if vu is not None:
-                    vectors_to_delete = {}  # type: ignore
-                    brain.apply_user_vectors(field_key, vu, vectors_to_delete)  # type: ignore
-        return brain
+    @property
+    def labels_modified(self) -> bool:
+        return (
+            self._previous_usermetadata is not None
+            and self.basic is not None
+            and self._previous_usermetadata != self.basic.usermetadata
+        )
+
+    async def index_field_metadata(
+        self,
+        brain: ResourceBrain,
+        basic: Optional[PBBasic],
+        fieldid: FieldID,
+        data: dict[str, Any],
+    ):
+        field_metadata = data.get("metadata")
+        if field_metadata is None:
+            return
+
+        user_field_metadata = None
+        if basic is not None:
+            user_field_metadata = next(
+                (
+                    fm
+                    for fm in basic.fieldmetadata
+                    if fm.field.field == fieldid.field
+                    and fm.field.field_type == fieldid.field_type
+                ),
+                None,
+            )
+        apply_field_metadata = partial(
+            brain.apply_field_metadata,
+            self.generate_field_id(fieldid),
+            field_metadata,
+            replace_field=[],
+            replace_splits={},
+            page_positions=data.get("page_positions"),
+            extracted_text=data.get("extracted_text"),
+            basic_user_field_metadata=user_field_metadata,
+        )
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(_executor, apply_field_metadata)
+
+    def index_field_vectors(
+        self,
+        brain: ResourceBrain,
+        fieldid: FieldID,
+        data: dict[str, Any],
+    ):
+        field_key = self.generate_field_id(fieldid)
+        vo = data.get("vectors")
+        if vo is not None:
+            brain.apply_field_vectors(field_key, vo, False, [])
+
+        vu = data.get("user_vectors")
+        if vu is not None:
+            vectors_to_delete = {}  # type: ignore
+            brain.apply_user_vectors(field_key, vu, vectors_to_delete)  # type: ignore
 
-    async def generate_field_vectors(
+    def generate_field_vectors(
         self,
         bm: BrokerMessage,
         type_id: FieldType.ValueType,
         field_id: str,
-        field: Field,
+        vo: Optional[VectorObject],
     ):
-        vo = await field.get_vectors()
         if vo is None:
             return
         evw = ExtractedVectorsWrapper()
@@ -412,14 +510,13 @@ class Resource:
         evw.vectors.CopyFrom(vo)
         bm.field_vectors.append(evw)
 
-    async def generate_user_vectors(
+    def generate_user_vectors(
         self,
         bm: BrokerMessage,
         type_id: FieldType.ValueType,
         field_id: str,
-        field: Field,
+        uv: Optional[UserVectorSet],
     ):
-        uv = await field.get_user_vectors()
         if uv is None:
             return
         uvw = UserVectorsWrapper()
@@ -428,14 +525,13 @@ class Resource:
         uvw.vectors.CopyFrom(uv)
         bm.user_vectors.append(uvw)
 
-    async def generate_field_large_computed_metadata(
+    def generate_field_large_computed_metadata(
         self,
         bm: BrokerMessage,
         type_id: FieldType.ValueType,
         field_id: str,
-        field: Field,
+        lcm: Optional[LargeComputedMetadata],
     ):
-        lcm = await field.get_large_field_metadata()
         if lcm is None:
             return
         lcmw = LargeComputedMetadataWrapper()
@@ -444,18 +540,17 @@ class Resource:
         lcmw.real.CopyFrom(lcm)
         bm.field_large_metadata.append(lcmw)
 
-    async def generate_field_computed_metadata(
+    def generate_field_computed_metadata(
         self,
         bm: BrokerMessage,
         type_id: FieldType.ValueType,
         field_id: str,
-        field: Field,
+        field_metadata: Optional[FieldComputedMetadata],
     ):
         fcmw = FieldComputedMetadataWrapper()
         fcmw.field.field = field_id
         fcmw.field.field_type = type_id  # type: ignore
 
-        field_metadata = await field.get_field_metadata()
         if field_metadata is not None:
             fcmw.metadata.CopyFrom(field_metadata)
             fcmw.field.field = field_id
@@ -463,17 +558,16 @@ class Resource:
             bm.field_metadata.append(fcmw)
             # Make sure cloud files are removed for exporting
 
-    async def generate_extracted_text(
+    def generate_extracted_text(
         self,
         bm: BrokerMessage,
         type_id: FieldType.ValueType,
         field_id: str,
-        field: Field,
+        extracted_text: Optional[ExtractedText],
     ):
         etw = ExtractedTextWrapper()
         etw.field.field = field_id
         etw.field.field_type = type_id  # type: ignore
-        extracted_text = await field.get_extracted_text()
         if extracted_text is not None:
             etw.body.CopyFrom(extracted_text)
             bm.extracted_text.append(etw)
@@ -528,35 +622,48 @@ class Resource:
                 bm.relations.append(relation)
 
         fields = await self.get_fields(force=True)
+        # Storage downloads of all the fields are issued up front, while field
+        # values are read one by one as they go through the transaction.
+        loaded = {
+            key: data
+            async for key, data in load_fields(
+                [
+                    (key, field, broker_message_field_loaders(key[0]))
+                    for key, field in fields.items()
+                ]
+            )
+        }
         for (type_id, field_id), field in fields.items():
+            data = loaded[(type_id, field_id)]
+
             # Value
             await self.generate_field(bm, type_id, field_id, field)
 
             # Extracted text
-            await self.generate_extracted_text(bm, type_id, field_id, field)
+            self.generate_extracted_text(bm, type_id, field_id, data["extracted_text"])
 
             # Field Computed Metadata
-            await self.generate_field_computed_metadata(bm, type_id, field_id, field)
+            self.generate_field_computed_metadata(
+                bm, type_id, field_id, data["metadata"]
+            )
 
-            if type_id == FieldType.FILE and isinstance(field, File):
-                field_extracted_data = await field.get_file_extracted_data()
-                if field_extracted_data is not None:
-                    bm.file_extracted_data.append(field_extracted_data)
+            field_extracted_data = data.get("file_extracted_data")
+            if field_extracted_data is not None:
+                bm.file_extracted_data.append(field_extracted_data)
 
-            elif type_id == FieldType.LINK and isinstance(field, Link):
-                link_extracted_data = await field.get_link_extracted_data()
-                if link_extracted_data is not None:
-                    bm.link_extracted_data.append(link_extracted_data)
+            link_extracted_data = data.get("link_extracted_data")
+            if link_extracted_data is not None:
+                bm.link_extracted_data.append(link_extracted_data)
 
             # Field vectors
-            await self.generate_field_vectors(bm, type_id, field_id, field)
+            self.generate_field_vectors(bm, type_id, field_id, data["vectors"])
 
             # User vectors
-            await self.generate_user_vectors(bm, type_id, field_id, field)
+            self.generate_user_vectors(bm, type_id, field_id, data["user_vectors"])
 
             # Large metadata
-            await self.generate_field_large_computed_metadata(
-                bm, type_id, field_id, field
+            self.generate_field_large_computed_metadata(
+                bm, type_id, field_id, data["large_metadata"]
             )
 
         return bm
@@ -599,14 +706,22 @@ class Resource:
         # We make sure that title and summary are set to be added
         basic = await self.get_basic()
         if basic is not None:
-            for generic in VALID_GENERIC_FIELDS:
-                append = True
-                if generic == "title" and basic.title == "":
-                    append = False
-                elif generic == "summary" and basic.summary == "":
-                    append = False
-                if append:
-                    result.append((FieldType.GENERIC, generic))
+            result.extend(self.get_generic_fields_ids(basic))
+        return result
+
+    @staticmethod
+    def get_generic_fields_ids(
+        basic: PBBasic,
+    ) -> list[Tuple[FieldType.ValueType, str]]:
+        result = []
+        for generic in VALID_GENERIC_FIELDS:
+            append = True
+            if generic == "title" and basic.title == "":
+                append = False
+            elif generic == "summary" and basic.summary == "":
+                append = False
+            if append:
+                result.append((FieldType.GENERIC, generic))
         return result
 
     async def get_fields_ids(
@@ -894,6 +1009,7 @@ class Resource:
         )
         loop = asyncio.get_running_loop()
         await loop.run_in_executor(_executor, apply_field_metadata)
+        self._indexed_fields.add(field_key)
 
         maybe_update_basic_thumbnail(
             self.basic, field_metadata.metadata.metadata.thumbnail
@@ -932,6 +1048,7 @@ class Resource:
             )
             loop = asyncio.get_running_loop()
             await loop.run_in_executor(_executor, apply_field_vectors)
+            self._indexed_vectors.add(field_key)
         else:
             raise AttributeError("VO not found on set")
 
@@ -953,6 +1070,7 @@ class Resource:
             self.indexer.apply_user_vectors(
                 field_key, uv, user_vectors.vectors_to_delete
             )
+            self._indexed_user_vectors.add(field_key)
         else:
             raise AttributeError("User Vectors not found on set")
 
@@ -1015,13 +1133,13 @@ class Resource:
         extracted_text = await fieldobj.get_extracted_text()
         if extracted_text is None:
             return
-        field_text = extracted_text.text
-        for _, split in extracted_text.split_text.items():
-            field_text += f" {split} "
-        brain.apply_field_text(fieldkey, field_text)
+        brain.apply_field_text(fieldkey, get_field_text(extracted_text))
 
     def clean(self):
         self._indexer = None
+        self._indexed_fields.clear()
+        self._indexed_vectors.clear()
+        self._indexed_user_vectors.clear()
 
     async def iterate_sentences(
         self, enabled_metadata: EnabledMetadata
@@ -1335,6 +1453,94 @@ async def get_file_page_positions(field: File) -> FilePagePositions:
     return positions
 
 
+def get_field_text(extracted_text: ExtractedText) -> str:
+    field_text = extracted_text.text
+    for _, split in extracted_text.split_text.items():
+        field_text += f" {split} "
+    return field_text
+
+
+FieldKey = Tuple[FieldType.ValueType, str]
+FieldLoader = Callable[[Field], Awaitable[Any]]
+
+
+async def load_page_positions(field: Field) -> Optional[FilePagePositions]:
+    if isinstance(field, File):
+        return await get_file_page_positions(field)
+    return None
+
+
+def index_field_loaders(
+    metadata: bool = True, vectors: bool = True, user_vectors: bool = True
+) -> dict[str, FieldLoader]:
+    loaders: dict[str, FieldLoader] = {}
+    if metadata:
+        loaders["extracted_text"] = lambda field: field.get_extracted_text()
+        loaders["metadata"] = lambda field: field.get_field_metadata()
+        loaders["page_positions"] = load_page_positions
+    if vectors:
+        loaders["vectors"] = lambda field: field.get_vectors()
+    if user_vectors:
+        loaders["user_vectors"] = lambda field: field.get_user_vectors()
+    return loaders
+
+
+def broker_message_field_loaders(
+    type_id: FieldType.ValueType,
+) -> dict[str, FieldLoader]:
+    loaders: dict[str, FieldLoader] = {
+        "extracted_text": lambda field: field.get_extracted_text(),
+        "metadata": lambda field: field.get_field_metadata(),
+        "vectors": lambda field: field.get_vectors(),
+        "user_vectors": lambda field: field.get_user_vectors(),
+        "large_metadata": lambda field: field.get_large_field_metadata(),
+    }
+    if type_id == FieldType.FILE:
+        loaders["file_extracted_data"] = lambda field: field.get_file_extracted_data()
+    elif type_id == FieldType.LINK:
+        loaders["link_extracted_data"] = lambda field: field.get_link_extracted_data()
+    return loaders
+
+
+async def load_fields(
+    fields: list[Tuple[FieldKey, Field, dict[str, FieldLoader]]],
+    max_concurrency: Optional[int] = None,
+) -> AsyncIterator[Tuple[FieldKey, dict[str, Any]]]:
+    """
+    Run the loaders of all the fields at the same time, with at most
+    `max_concurrency` of them downloading from the storage, and yield the
+    data of every field as soon as all its loaders are done.
+
+    Loaders must not read from the transaction: it can't be used
+    concurrently.
+    """
+    if max_concurrency is None:
+        max_concurrency = ingest_settings.ingest_resource_load_concurrency
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def load(loader: FieldLoader, field: Field) -> Any:
+        async with semaphore:
+            return await loader(field)
+
+    async def load_field(
+        key: FieldKey, field: Field, loaders: dict[str, FieldLoader]
+    ) -> Tuple[FieldKey, dict[str, Any]]:
+        names = list(loaders)
+        values = await asyncio.gather(*(load(loaders[name], field) for name in names))
+        return key, dict(zip(names, values))
+
+    tasks = [
+        asyncio.create_task(load_field(key, field, loaders))
+        for key, field, loaders in fields
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
 def remove_field_classifications(basic: PBBasic, deleted_fields: list[FieldID]):
     """
     Clean classifications of fields that have been deleted
@@ -39,25 +39,19 @@ KB_RESOURCE_BASIC_FS = "/kbs/{kbid}/r/{uuid}/basic"  # Only used on FS driver
 KB_RESOURCE_BASIC = "/kbs/{kbid}/r/{uuid}"
 
 
-async def set_basic(txn: Transaction, kbid: str, uuid: str, basic: Basic):
+def get_basic_key(kbid: str, uuid: str) -> str:
     if ingest_settings.driver == "local":
-        await txn.set(
-            KB_RESOURCE_BASIC_FS.format(kbid=kbid, uuid=uuid),
-            basic.SerializeToString(),
-        )
+        return KB_RESOURCE_BASIC_FS.format(kbid=kbid, uuid=uuid)
     else:
-        await txn.set(
-            KB_RESOURCE_BASIC.format(kbid=kbid, uuid=uuid),
-            basic.SerializeToString(),
-        )
+        return KB_RESOURCE_BASIC.format(kbid=kbid, uuid=uuid)
+
+
+async def set_basic(txn: Transaction, kbid: str, uuid: str, basic: Basic):
+    await txn.set(get_basic_key(kbid, uuid), basic.SerializeToString())
 
 
 async def get_basic(txn: Transaction, kbid: str, uuid: str) -> Optional[bytes]:
-    if ingest_settings.driver == "local":
-        raw_basic = await txn.get(KB_RESOURCE_BASIC_FS.format(kbid=kbid, uuid=uuid))
-    else:
-        raw_basic = await txn.get(KB_RESOURCE_BASIC.format(kbid=kbid, uuid=uuid))
-    return raw_basic
+    return await txn.get(get_basic_key(kbid, uuid))
 
 
 def set_title(writer: BrokerMessage, toprocess: PushPayload, title: str):
@@ -36,6 +36,9 @@ from nucliadb_telemetry.logs import setup_logging
 from nucliadb_utils.storages.storage import Storage
 from nucliadb_utils.utilities import get_storage
 
+# KB storages purged at the same time
+PURGE_STORAGE_CONCURRENCY = 5
+
 
 async def purge_kb(driver: Driver):
     logger.info("START PURGING KB")
@@ -90,47 +93,58 @@ async def purge_kb_storage(driver: Driver, storage: Storage):
     # Last iteration deleted all kbs, and set their storages marked to be deleted also in tikv
     # Here we'll delete those storage buckets
     logger.info("START PURGING KB STORAGE")
-    async for key in driver.keys(match=KB_TO_DELETE_STORAGE_BASE, count=-1):
-        logger.info(f"Purging storage {key}")
-        try:
-            kbid = key.split("/")[2]
-        except Exception:
-            logger.info(
-                f"  X Skipping purge {key}, wrong key format, expected {KB_TO_DELETE_STORAGE_BASE}"
-            )
-            continue
+    keys = [key async for key in driver.keys(match=KB_TO_DELETE_STORAGE_BASE, count=-1)]
+    semaphore = asyncio.Semaphore(PURGE_STORAGE_CONCURRENCY)
 
-        deleted, conflict = await storage.delete_kb(kbid)
-
-        delete_marker = False
-        if conflict:
-            logger.info(
-                f"  . Nothing was deleted for {key}, (Bucket not yet empty), will try next time"
-            )
-        elif not deleted:
-            logger.info(
-                f"  ! Expected bucket for {key} was not found, will delete marker"
-            )
-            delete_marker = True
-        elif deleted:
-            logger.info(f"  √ Bucket successfully deleted")
-            delete_marker = True
-
-        if delete_marker:
-            try:
-                txn = await driver.begin()
-                await txn.delete(key)
-                logger.info(f"  √ Deleted storage deletion marker {key}")
-            except Exception as exc:
-                errors.capture_exception(exc)
-                logger.info(f"  X Error while deleting key {key}")
-                await txn.abort()
-            else:
-                await txn.commit()
+    async def purge(key: str):
+        async with semaphore:
+            await purge_kb_storage_key(driver, storage, key)
 
+    await asyncio.gather(*[purge(key) for key in keys])
     logger.info("FINISH PURGING KB STORAGE")
 
 
+async def purge_kb_storage_key(driver: Driver, storage: Storage, key: str):
+    logger.info(f"Purging storage {key}")
+    try:
+        kbid = key.split("/")[2]
+    except Exception:
+        logger.info(
+            f"  X Skipping purge {key}, wrong key format, expected {KB_TO_DELETE_STORAGE_BASE}"
+        )
+        return
+
+    deleted, conflict = await storage.delete_kb(kbid)
+    if conflict:
+        # Bucket not empty yet: empty it with bulk deletions and try again
+        await storage.delete_prefix(storage.get_bucket_name(kbid), "")
+        deleted, conflict = await storage.delete_kb(kbid)
+
+    delete_marker = False
+    if conflict:
+        logger.info(
+            f"  . Nothing was deleted for {key}, (Bucket not yet empty), will try next time"
+        )
+    elif not deleted:
+        logger.info(f"  ! Expected bucket for {key} was not found, will delete marker")
+        delete_marker = True
+    elif deleted:
+        logger.info(f"  √ Bucket successfully deleted")
+        delete_marker = True
+
+    if delete_marker:
+        try:
+            txn = await driver.begin()
+            await txn.delete(key)
+            logger.info(f"  √ Deleted storage deletion marker {key}")
+        except Exception as exc:
+            errors.capture_exception(exc)
+            logger.info(f"  X Error while deleting key {key}")
+            await txn.abort()
+        else:
+            await txn.commit()
+
+
 async def main():
     # Clean up all kb marked to delete
     driver = await setup_driver()
@@ -139,6 +139,19 @@ async def serialize(
         await txn.abort()
         return None
 
+    resource = await serialize_orm_resource(
+        orm_resource, show, field_type_filter=field_type_filter, extracted=extracted
+    )
+    await txn.abort()
+    return resource
+
+
+async def serialize_orm_resource(
+    orm_resource: ORMResource,
+    show: List[ResourceProperties],
+    field_type_filter: List[FieldTypeName],
+    extracted: List[ExtractedDataTypeName],
+) -> Resource:
     resource = Resource(id=orm_resource.uuid)
 
     include_values = ResourceProperties.VALUES in show
@@ -426,7 +439,6 @@ async def serialize(
                             text=resource.data.generics[field.id].value
                         )
                     )
-    await txn.abort()
     return resource
 
 
@@ -88,7 +88,11 @@ from nucliadb_protos.writer_pb2 import (
 )
 
 from nucliadb.common.cluster.exceptions import AlreadyExists, EntitiesGroupNotFound
-from nucliadb.common.cluster.manager import clean_and_upgrade, get_index_nodes
+from nucliadb.common.cluster.manager import (
+    clean_and_upgrade,
+    get_index_nodes,
+    invalidate_kb_shards_cache,
+)
 from nucliadb.common.cluster.utils import get_shard_manager
 from nucliadb.common.maindb.driver import Transaction
 from nucliadb.common.maindb.utils import setup_driver
@@ -155,7 +159,8 @@ class WriterServicer(writer_pb2_grpc.WriterServicer):
                 key = KB_SHARDS.format(kbid=request.uuid)
                 await txn.set(key, updated_shards.SerializeToString())
                 await txn.commit()
-                return CleanedKnowledgeBoxResponse()
+            await invalidate_kb_shards_cache(request.uuid)
+            return CleanedKnowledgeBoxResponse()
         except Exception as e:
             errors.capture_exception(e)
             logger.error("Error in ingest gRPC servicer", exc_info=True)
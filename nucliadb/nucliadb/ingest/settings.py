@@ -43,6 +43,14 @@ class DriverConfig(str, Enum):
 class DriverSettings(BaseSettings):
     driver: DriverConfig = Field(DriverConfig.NOT_SET, description="K/V storage driver")
     driver_redis_url: Optional[str] = Field(None, description="Redis URL")
+    driver_redis_max_connections: Optional[int] = Field(
+        None, description="Max connections of the Redis pool. Unlimited if not set"
+    )
+    driver_redis_read_window: float = Field(
+        0,
+        description="Seconds to wait for more reads to pipeline them on a single "
+        "Redis request. With 0, reads issued on the same loop iteration are grouped",
+    )
     driver_tikv_url: Optional[List[str]] = Field([], description="TiKV PD URL")
     driver_local_url: Optional[str] = Field(
         None, description="Local path to store data on file system."
@@ -65,6 +73,19 @@ class Settings(DriverSettings):
 
     max_receive_message_length: int = 4
 
+    # Messages of a partition processed at the same time by the ingest
+    # consumer. Messages of the same resource are always processed in order.
+    ingest_consumer_max_concurrency: int = 1
+
+    # Processed messages applied on the same transaction by the processed
+    # consumer, and seconds to wait to fill a batch. 1 disables batching.
+    ingest_processed_batch_size: int = 1
+    ingest_processed_batch_wait: float = 0.1
+
+    # Storage downloads issued at the same time when loading the fields of a
+    # resource to generate its index or broker message
+    ingest_resource_load_concurrency: int = 10
+
     # Search query timeouts
     relation_search_timeout: float = 10.0
     relation_types_timeout: float = 10.0
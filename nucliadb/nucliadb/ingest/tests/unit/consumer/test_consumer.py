@@ -0,0 +1,171 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from nucliadb_protos.writer_pb2 import BrokerMessage
+
+from nucliadb.ingest.consumer import consumer
+from nucliadb_utils.nats import SeqidTracker
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture()
+def driver():
+    txn = AsyncMock()
+    driver = MagicMock()
+    driver.transaction.return_value.__aenter__.return_value = txn
+    yield driver
+
+
+@pytest.fixture()
+def ingest_consumer(driver):
+    with patch.object(consumer, "Processor"):
+        ingest_consumer = consumer.IngestConsumer(
+            driver=driver,
+            partition="1",
+            storage=AsyncMock(),
+            nats_connection_manager=AsyncMock(),
+        )
+    ingest_consumer.max_concurrency = 10
+    ingest_consumer.seqids = SeqidTracker(0)
+    yield ingest_consumer
+
+
+def message(seqid: int, uuid: str) -> MagicMock:
+    pb = BrokerMessage(kbid="kbid", uuid=uuid)
+    return MagicMock(
+        data=pb.SerializeToString(),
+        reply=f"$JS.ACK.ingest.group.1.{seqid}.{seqid}.0.0",
+        ack=AsyncMock(),
+    )
+
+
+async def wait_all(ingest_consumer):
+    while ingest_consumer.resource_tasks:
+        await asyncio.wait(list(ingest_consumer.resource_tasks.values()))
+
+
+async def test_pipelined_keeps_order_per_resource(ingest_consumer, driver):
+    processed = []
+
+    async def process(pb, seqid, partition, transaction_check=True, skip_index=False):
+        assert transaction_check is False
+        if pb.uuid == "slow":
+            await asyncio.sleep(0.05)
+        processed.append(seqid)
+
+    ingest_consumer.processor.process = AsyncMock(side_effect=process)
+
+    await ingest_consumer.subscription_worker(message(1, "slow"))
+    await ingest_consumer.subscription_worker(message(2, "fast"))
+    await ingest_consumer.subscription_worker(message(3, "slow"))
+    await wait_all(ingest_consumer)
+
+    # different resources don't wait for each other...
+    assert processed == [2, 1, 3]
+    # ...and the partition seqid is only stored once all previous are done
+    txn = driver.transaction.return_value.__aenter__.return_value
+    assert txn.commit.await_count == 2
+    assert ingest_consumer.saved_seqid == 3
+
+
+async def test_pipelined_postpones_messages_after_failure(ingest_consumer):
+    async def process(pb, seqid, partition, transaction_check=True, skip_index=False):
+        if seqid == 1:
+            raise ValueError()
+
+    ingest_consumer.processor.process = AsyncMock(side_effect=process)
+
+    first = message(1, "uuid")
+    second = message(2, "uuid")
+    with patch.object(consumer.asyncio, "sleep", AsyncMock()):
+        await ingest_consumer.subscription_worker(first)
+        await ingest_consumer.subscription_worker(second)
+        await wait_all(ingest_consumer)
+
+        first.ack.assert_not_awaited()
+        second.ack.assert_not_awaited()
+        assert ingest_consumer.seqids.last_seqid == 0
+
+        # redeliveries are processed in order
+        ingest_consumer.processor.process = AsyncMock()
+        await ingest_consumer.subscription_worker(second)
+        await wait_all(ingest_consumer)
+        second.ack.assert_not_awaited()
+
+        await ingest_consumer.subscription_worker(first)
+        await ingest_consumer.subscription_worker(second)
+        await wait_all(ingest_consumer)
+    first.ack.assert_awaited_once()
+    second.ack.assert_awaited_once()
+    assert ingest_consumer.seqids.last_seqid == 2
+
+
+@pytest.fixture()
+def processed_consumer(driver):
+    with patch.object(consumer, "Processor"):
+        processed_consumer = consumer.IngestProcessedConsumer(
+            driver=driver,
+            partition="-1",
+            storage=AsyncMock(),
+            nats_connection_manager=AsyncMock(),
+        )
+    processed_consumer.batch_size = 10
+    processed_consumer.batch_wait = 60
+    yield processed_consumer
+
+
+async def test_processed_consumer_finalize_processes_pending_batch(
+    processed_consumer,
+):
+    processed_consumer.processor.txn_batch = AsyncMock()
+    first = message(1, "uuid1")
+    second = message(2, "uuid2")
+    await processed_consumer.subscription_worker(first)
+    await processed_consumer.subscription_worker(second)
+    assert processed_consumer.batch_timer is not None
+
+    await processed_consumer.finalize()
+
+    assert processed_consumer.batch_timer is None
+    processed_consumer.processor.txn_batch.assert_awaited_once()
+    first.ack.assert_awaited_once()
+    second.ack.assert_awaited_once()
+
+
+async def test_processed_consumer_does_not_index_twice_on_batch_errors(
+    processed_consumer,
+):
+    async def txn_batch(messages, partition, indexed):
+        indexed.add(1)
+        raise ValueError()
+
+    processed_consumer.processor.txn_batch = AsyncMock(side_effect=txn_batch)
+    processed_consumer.processor.process = AsyncMock()
+    await processed_consumer.process_batch([message(1, "uuid1"), message(2, "uuid2")])
+
+    skipped = {
+        call.args[1]: call.kwargs["skip_index"]
+        for call in processed_consumer.processor.process.await_args_list
+    }
+    assert skipped == {1: True, 2: False}
@@ -54,6 +54,9 @@ def shard_manager(sidecar):
     ), patch(
         "nucliadb.ingest.consumer.shard_creator.choose_node",
         return_value=(node, "shard_id", None),
+    ), patch(
+        "nucliadb.ingest.consumer.shard_creator.invalidate_kb_shards_cache",
+        new=AsyncMock(),
     ):
         yield nm
 
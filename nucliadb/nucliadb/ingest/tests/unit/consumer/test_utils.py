@@ -21,6 +21,7 @@
 import asyncio
 
 import pytest
+from nucliadb_protos.writer_pb2 import BrokerMessage
 
 from nucliadb.ingest.consumer import utils
 
@@ -65,3 +66,19 @@ async def test_delay_task_handler():
     await dth.finalize()
 
     assert counter == 7
+
+
+async def test_group_batch():
+    def message(kbid, uuid, type=BrokerMessage.MessageType.AUTOCOMMIT):
+        return BrokerMessage(kbid=kbid, uuid=uuid, type=type)
+
+    messages = [
+        message("kb1", "r1"),
+        message("kb2", "r2"),
+        message("kb1", "r3"),
+        message("kb1", "r1"),
+        message("kb1", "r4"),
+        message("kb2", "r2", BrokerMessage.MessageType.DELETE),
+        message("kb2", "r5"),
+    ]
+    assert utils.group_batch(messages) == [[0, 2], [1], [3, 4], [5], [6]]
@@ -17,9 +17,10 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
-from unittest.mock import AsyncMock, MagicMock, Mock
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
 
 import pytest
+from nucliadb_protos.writer_pb2 import BrokerMessage
 
 from nucliadb.ingest.orm.processor import Processor
 
@@ -61,3 +62,77 @@ async def test_commit_slug(processor: Processor, txn, resource):
     resource.set_slug.assert_awaited_once()
     txn.commit.assert_awaited_once()
     assert resource.txn is another_txn
+
+
+async def test_invalidate_resource_cache(driver):
+    cache = AsyncMock()
+    processor = Processor(driver, None, cache=cache)
+
+    await processor.invalidate_resource_cache("kbid", "rid")
+
+    cache.delete.assert_awaited_once_with("kb_kbid_resource_rid", invalidate=True)
+
+
+async def test_txn_batch(processor: Processor, txn):
+    resources = [
+        MagicMock(uuid=f"rid{i}", modified=i > 0, slug_modified=False) for i in range(3)
+    ]
+    for resource in resources:
+        resource.compute_global_text = AsyncMock()
+        resource.compute_global_tags = AsyncMock()
+    processor.apply_resource = AsyncMock(  # type: ignore
+        side_effect=[(resource, False) for resource in resources]
+    )
+    processor.get_resource_shard_for_index = AsyncMock()  # type: ignore
+    processor.shard_manager = AsyncMock()
+    processor.notify_commit = AsyncMock()  # type: ignore
+    processor.notify_abort = AsyncMock()  # type: ignore
+    messages = [
+        (BrokerMessage(kbid="kbid", uuid=f"rid{i}"), seqid)
+        for i, seqid in enumerate((10, 11, 12))
+    ]
+
+    with patch("nucliadb.ingest.orm.processor.KnowledgeBox") as kb:
+        kb.exist_kb = AsyncMock(return_value=True)
+        await processor.txn_batch(messages, "1")
+
+    # a single transaction with the modified resources indexed
+    txn.commit.assert_awaited_once()
+    assert processor.shard_manager.add_resource.await_count == 2
+    assert processor.notify_commit.await_count == 2
+    processor.notify_abort.assert_awaited_once()
+    for resource in resources:
+        resource.clean.assert_called_once()
+
+
+async def test_txn_batch_does_not_commit_on_errors(processor: Processor, txn):
+    processor.apply_resource = AsyncMock(side_effect=ValueError())  # type: ignore
+    processor.deadletter = AsyncMock()  # type: ignore
+
+    with patch("nucliadb.ingest.orm.processor.KnowledgeBox") as kb:
+        kb.exist_kb = AsyncMock(return_value=True)
+        with pytest.raises(ValueError):
+            await processor.txn_batch([(BrokerMessage(kbid="kbid"), 1)], "1")
+
+    txn.commit.assert_not_awaited()
+    processor.deadletter.assert_not_awaited()
+
+
+async def test_txn_batch_reports_indexed_messages(processor: Processor, txn):
+    resource = MagicMock(uuid="rid", modified=True, slug_modified=False)
+    resource.compute_global_text = AsyncMock()
+    resource.compute_global_tags = AsyncMock()
+    processor.apply_resource = AsyncMock(return_value=(resource, False))  # type: ignore
+    processor.get_resource_shard_for_index = AsyncMock()  # type: ignore
+    processor.shard_manager = AsyncMock()
+    txn.commit.side_effect = ValueError()
+
+    indexed: set[int] = set()
+    with patch("nucliadb.ingest.orm.processor.KnowledgeBox") as kb:
+        kb.exist_kb = AsyncMock(return_value=True)
+        with pytest.raises(ValueError):
+            await processor.txn_batch(
+                [(BrokerMessage(kbid="kbid", uuid="rid"), 10)], "1", indexed=indexed
+            )
+
+    assert indexed == {10}
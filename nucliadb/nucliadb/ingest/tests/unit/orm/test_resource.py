@@ -17,6 +17,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
+import asyncio
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
@@ -36,6 +37,7 @@ from nucliadb.ingest.orm.resource import (
     Resource,
     get_file_page_positions,
     get_text_field_mimetype,
+    load_fields,
     maybe_update_basic_icon,
     maybe_update_basic_summary,
     maybe_update_basic_thumbnail,
@@ -240,3 +242,82 @@ async def test_apply_fields_calls_update_all_field_ids(txn, storage, kb):
     resource.update_all_field_ids.call_args[1]["deleted"] == [
         FieldID(field_type=FieldType.LAYOUT, field="to_delete"),
     ]
+
+
+async def test_reindex_only_sends_fields_again_if_labels_changed(txn, storage, kb):
+    resource = Resource(txn, storage, kb, "rid", disable_vectors=False)
+    resource.basic = Basic()
+    resource.basic.usermetadata.classifications.add(labelset="ls", label="l1")
+    resource.fields = {
+        (FieldType.TEXT, "text1"): AsyncMock(),
+        (FieldType.TEXT, "text2"): AsyncMock(),
+    }
+    resource.get_fields_ids = AsyncMock(return_value=list(resource.fields))  # type: ignore
+    resource.index_field_metadata = AsyncMock()  # type: ignore
+    resource.index_field_vectors = MagicMock()  # type: ignore
+
+    # same labels
+    await resource.set_basic(Basic(usermetadata=resource.basic.usermetadata))
+    await resource.reindex()
+    resource.index_field_metadata.assert_not_awaited()
+    resource.index_field_vectors.assert_not_called()
+
+    # new labels, text1 is already on the index message
+    resource._indexed_fields.add("t/text1")
+    resource._indexed_vectors.add("t/text1")
+    payload = Basic()
+    payload.usermetadata.classifications.add(labelset="ls", label="l2")
+    await resource.set_basic(payload)
+    await resource.reindex()
+
+    resource.index_field_metadata.assert_awaited_once()
+    assert resource.index_field_metadata.call_args.args[2].field == "text2"
+    loaded = {
+        call.args[1].field: set(call.args[2])
+        for call in resource.index_field_vectors.call_args_list
+    }
+    assert loaded == {
+        "text1": {"user_vectors"},
+        "text2": {
+            "extracted_text",
+            "metadata",
+            "page_positions",
+            "vectors",
+            "user_vectors",
+        },
+    }
+
+
+async def test_reindex_full(txn, storage, kb):
+    resource = Resource(txn, storage, kb, "rid")
+    brain = MagicMock()
+    resource.generate_index_message = AsyncMock(return_value=brain)  # type: ignore
+
+    await resource.reindex(full=True)
+
+    assert resource.indexer is brain
+
+
+async def test_load_fields_runs_loaders_concurrently():
+    running = 0
+    max_running = 0
+
+    async def loader(field):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return field
+
+    fields = [
+        ((FieldType.TEXT, f"text{i}"), f"field{i}", {"a": loader, "b": loader})
+        for i in range(5)
+    ]
+    loaded = {key: data async for key, data in load_fields(fields, max_concurrency=3)}
+
+    assert max_running == 3
+    assert loaded == {
+        (FieldType.TEXT, f"text{i}"): {"a": f"field{i}", "b": f"field{i}"}
+        for i in range(5)
+    }
@@ -17,7 +17,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
 
@@ -98,6 +98,18 @@ async def test_purge_kb_storage(keys, driver, storage):
     driver.begin.return_value.commit.assert_called_once()
 
 
+async def test_purge_kb_storage_empties_not_empty_buckets(keys, driver, storage):
+    keys.append("/pathto/kbid")
+    storage.get_bucket_name = Mock(return_value="bucket")
+    storage.delete_kb.side_effect = [(False, True), (True, False)]
+
+    await purge.purge_kb_storage(driver, storage)
+
+    storage.delete_prefix.assert_called_once_with("bucket", "")
+    assert storage.delete_kb.call_count == 2
+    driver.begin.return_value.commit.assert_called_once()
+
+
 async def test_purge_kb_storage_handle_errors(keys, driver, storage):
     keys.append("/failed")
     keys.append("/pathto/failed")
@@ -17,16 +17,18 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
+import os
 import urllib.parse
+import uuid
 from enum import Enum
-from typing import Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from fastapi import HTTPException
 from fastapi.requests import Request
 from fastapi.responses import Response
 from fastapi_versioning import version
 from starlette.datastructures import Headers
-from starlette.responses import StreamingResponse
+from starlette.responses import FileResponse, StreamingResponse
 
 from nucliadb.ingest.orm.resource import KB_REVERSE_REVERSE
 from nucliadb.ingest.serialize import get_resource_uuid_by_slug
@@ -40,6 +42,9 @@ from nucliadb_utils.utilities import get_storage
 
 from .router import KB_PREFIX, RESOURCE_PREFIX, RSLUG_PREFIX, api
 
+# Block size of reads when serving ranges of local files
+LOCAL_READ_SIZE = 1024 * 1024
+
 
 class DownloadType(Enum):
     EXTRACTED = "extracted"
@@ -180,6 +185,10 @@ async def download_api(sf: StorageField, headers: Headers, inline: bool = False)
     if metadata is None:
         raise HTTPException(status_code=404, detail="Specified file doesn't exist")
 
+    etag = get_etag(metadata)
+    if etag is not None and etag_matches(headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
     file_size = int(metadata.get("SIZE", -1))
     content_type = metadata.get("CONTENT_TYPE", "application/octet-stream")
     filename = metadata.get("FILENAME", "file")
@@ -193,28 +202,164 @@ async def download_api(sf: StorageField, headers: Headers, inline: bool = False)
         "Content-Type": content_type,
         "Content-Disposition": content_disposition,
     }
+    if etag is not None:
+        extra_headers["ETag"] = etag
+
+    local_path = sf.local_path()
+    if local_path is not None:
+        return local_file_response(local_path, headers, extra_headers, content_type)
+
     download_headers = {}
     if "range" in headers and file_size > -1:
         range_request = headers["range"]
-        try:
-            start, end, range_size = parse_media_range(range_request, file_size)
-        except NotImplementedError:
-            raise HTTPException(
-                detail={
-                    "reason": "rangeNotSupported",
-                    "range": range_request,
-                    "message": "Multipart ranges are not supported yet",
-                },
-                headers={"Content-Range": f"bytes */{file_size}"},
-                status_code=416,
-            )
-        except (IndexError, ValueError):
-            # range errors fallback to full download
-            raise HTTPException(
-                detail={"reason": "rangeNotParsable", "range": range_request},
-                headers={"Content-Range": f"bytes */{file_size}"},
-                status_code=416,
-            )
+        [(start, end, range_size)] = get_ranges(range_request, file_size)
+        status_code = 206
+        logger.debug(f"Range request: {range_request}")
+        extra_headers["Content-Length"] = f"{range_size}"
+        extra_headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+        download_headers["Range"] = range_request
+
+    return StreamingResponse(
+        sf.storage.download(sf.bucket, sf.key, headers=download_headers),  # type: ignore
+        status_code=status_code,
+        media_type=content_type,
+        headers=extra_headers,
+    )
+
+
+def local_file_response(
+    path: str, headers: Headers, extra_headers: Dict[str, str], content_type: str
+) -> Response:
+    """
+    Serve a file kept on the local filesystem: whole files go through
+    FileResponse and ranges, multipart ones included, are read straight from
+    the file without the storage layer in between.
+    """
+    stat_result = os.stat(path)
+    file_size = stat_result.st_size
+    if "ETag" not in extra_headers:
+        # files stored without md5 get a validator from their modification time
+        etag = f'"{stat_result.st_mtime}-{file_size}"'
+        if etag_matches(headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        extra_headers["ETag"] = etag
+
+    if "range" not in headers:
+        return FileResponse(
+            path,
+            stat_result=stat_result,
+            media_type=content_type,
+            headers=extra_headers,
+        )
+
+    range_request = headers["range"]
+    ranges = get_ranges(range_request, file_size, multipart=True)
+    logger.debug(f"Range request: {range_request}")
+    if len(ranges) == 1:
+        [(start, end, range_size)] = ranges
+        extra_headers["Content-Length"] = f"{range_size}"
+        extra_headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+        return StreamingResponse(
+            iter_file_range(path, start, end),
+            status_code=206,
+            media_type=content_type,
+            headers=extra_headers,
+        )
+
+    boundary = uuid.uuid4().hex
+    parts = [
+        (
+            (
+                f"--{boundary}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Range: bytes {start}-{end}/{file_size}\r\n\r\n"
+            ).encode(),
+            start,
+            end,
+        )
+        for start, end, _ in ranges
+    ]
+    closing = f"--{boundary}--\r\n".encode()
+    content_length = len(closing) + sum(
+        len(part_headers) + end - start + 1 + 2 for part_headers, start, end in parts
+    )
+    multipart_type = f"multipart/byteranges; boundary={boundary}"
+    extra_headers["Content-Type"] = multipart_type
+    extra_headers["Content-Length"] = f"{content_length}"
+    return StreamingResponse(
+        iter_file_multipart(path, parts, closing),
+        status_code=206,
+        media_type=multipart_type,
+        headers=extra_headers,
+    )
+
+
+def iter_file_range(path: str, start: int, end: int) -> Iterator[bytes]:
+    # sync iterator: starlette runs it on its threadpool
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            data = f.read(min(LOCAL_READ_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+
+def iter_file_multipart(
+    path: str, parts: List[Tuple[bytes, int, int]], closing: bytes
+) -> Iterator[bytes]:
+    for part_headers, start, end in parts:
+        yield part_headers
+        yield from iter_file_range(path, start, end)
+        yield b"\r\n"
+    yield closing
+
+
+def get_etag(metadata: Dict[str, str]) -> Optional[str]:
+    md5 = metadata.get("MD5")
+    if not md5:
+        return None
+    return f'"{md5}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag.removeprefix("W/") in candidates
+
+
+def get_ranges(
+    range_request: str, file_size: int, multipart: bool = False
+) -> List[Tuple[int, int, int]]:
+    try:
+        if multipart:
+            ranges = parse_media_ranges(range_request, file_size)
+        else:
+            ranges = [parse_media_range(range_request, file_size)]
+    except NotImplementedError:
+        raise HTTPException(
+            detail={
+                "reason": "rangeNotSupported",
+                "range": range_request,
+                "message": "Multipart ranges are not supported yet",
+            },
+            headers={"Content-Range": f"bytes */{file_size}"},
+            status_code=416,
+        )
+    except (IndexError, ValueError):
+        # range errors fallback to full download
+        raise HTTPException(
+            detail={"reason": "rangeNotParsable", "range": range_request},
+            headers={"Content-Range": f"bytes */{file_size}"},
+            status_code=416,
+        )
+    for start, end, _ in ranges:
         if start > end or start < 0:
             raise HTTPException(
                 detail={
@@ -235,18 +380,7 @@ async def download_api(sf: StorageField, headers: Headers, inline: bool = False)
                 headers={"Content-Range": f"bytes */{file_size}"},
                 status_code=416,
             )
-        status_code = 206
-        logger.debug(f"Range request: {range_request}")
-        extra_headers["Content-Length"] = f"{range_size}"
-        extra_headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
-        download_headers["Range"] = range_request
-
-    return StreamingResponse(
-        sf.storage.download(sf.bucket, sf.key, headers=download_headers),  # type: ignore
-        status_code=status_code,
-        media_type=content_type,
-        headers=extra_headers,
-    )
+    return ranges
 
 
 async def _get_resource_uuid_from_params(
@@ -269,7 +403,18 @@ def parse_media_range(range_request: str, file_size: int) -> Tuple[int, int, int
     ranges = range_request.split("bytes=")[-1].split(", ")
     if len(ranges) > 1:
         raise NotImplementedError()
-    start_str, _, end_str = ranges[0].partition("-")
+    return parse_byte_range(ranges[0], file_size)
+
+
+def parse_media_ranges(
+    range_request: str, file_size: int
+) -> List[Tuple[int, int, int]]:
+    ranges = range_request.split("bytes=")[-1].split(",")
+    return [parse_byte_range(range_str.strip(), file_size) for range_str in ranges]
+
+
+def parse_byte_range(range_str: str, file_size: int) -> Tuple[int, int, int]:
+    start_str, _, end_str = range_str.partition("-")
     start = int(start_str)
     max_range_size = file_size - 1
     if len(end_str) == 0:
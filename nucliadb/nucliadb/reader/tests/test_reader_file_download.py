@@ -19,15 +19,24 @@
 #
 import os
 from typing import Callable
+from unittest.mock import AsyncMock, Mock
 
 import pytest
 from httpx import AsyncClient
 from nucliadb_protos.resources_pb2 import FieldType
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
 
 import nucliadb.ingest.tests.fixtures
 from nucliadb.ingest.orm.resource import Resource
 from nucliadb.ingest.tests.fixtures import TEST_CLOUDFILE, THUMBNAIL
-from nucliadb.reader.api.v1.download import parse_media_range, safe_http_header_encode
+from nucliadb.reader.api.v1.download import (
+    download_api,
+    etag_matches,
+    parse_media_range,
+    parse_media_ranges,
+    safe_http_header_encode,
+)
 from nucliadb.reader.api.v1.router import KB_PREFIX, RESOURCE_PREFIX, RSLUG_PREFIX
 from nucliadb_models.resource import NucliaDBRoles
 
@@ -244,6 +253,76 @@ def test_parse_media_range(range_request, filesize, start, end, range_size, exce
             parse_media_range(range_request, filesize)
 
 
+@pytest.mark.parametrize(
+    "range_request,filesize,ranges",
+    [
+        ("bytes=0-", 10, [(0, 9, 10)]),
+        ("bytes=0-1, 8-", 10, [(0, 1, 2), (8, 9, 2)]),
+        ("bytes=0-1,4-5,8-20", 10, [(0, 1, 2), (4, 5, 2), (8, 9, 2)]),
+    ],
+)
+def test_parse_media_ranges(range_request, filesize, ranges):
+    assert parse_media_ranges(range_request, filesize) == ranges
+
+
+@pytest.mark.parametrize(
+    "if_none_match,etag,matches",
+    [
+        (None, '"md5"', False),
+        ('"md5"', '"md5"', True),
+        ('W/"md5"', '"md5"', True),
+        ('"other", "md5"', '"md5"', True),
+        ('"other"', '"md5"', False),
+        ("*", '"md5"', True),
+    ],
+)
+def test_etag_matches(if_none_match, etag, matches):
+    assert etag_matches(if_none_match, etag) is matches
+
+
+@pytest.mark.asyncio
+async def test_download_api_not_modified():
+    sf = Mock()
+    sf.exists = AsyncMock(return_value={"SIZE": "10", "MD5": "md5"})
+
+    resp = await download_api(sf, Headers({"if-none-match": '"md5"'}))
+
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == '"md5"'
+    sf.local_path.assert_not_called()
+    sf.storage.download.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_download_api_local_file(tmp_path):
+    path = tmp_path / "file"
+    path.write_bytes(b"0123456789")
+    sf = Mock()
+    sf.exists = AsyncMock(return_value={"SIZE": "10", "CONTENT_TYPE": "text/plain"})
+    sf.local_path.return_value = str(path)
+
+    resp = await download_api(sf, Headers({}))
+    assert isinstance(resp, FileResponse)
+    etag = resp.headers["ETag"]
+
+    resp = await download_api(sf, Headers({"if-none-match": etag}))
+    assert resp.status_code == 304
+
+    resp = await download_api(sf, Headers({"range": "bytes=2-4"}))
+    assert resp.status_code == 206
+    assert resp.headers["Content-Range"] == "bytes 2-4/10"
+    assert b"".join([chunk async for chunk in resp.body_iterator]) == b"234"
+
+    resp = await download_api(sf, Headers({"range": "bytes=0-1, 8-"}))
+    assert resp.status_code == 206
+    assert resp.headers["Content-Type"].startswith("multipart/byteranges")
+    body = b"".join([chunk async for chunk in resp.body_iterator])
+    assert int(resp.headers["Content-Length"]) == len(body)
+    assert b"Content-Range: bytes 0-1/10\r\n\r\n01\r\n" in body
+    assert b"Content-Range: bytes 8-9/10\r\n\r\n89\r\n" in body
+    sf.storage.download.assert_not_called()
+
+
 @pytest.mark.asyncio
 async def test_resource_download_field_file_content_disposition(
     reader_api: Callable[..., AsyncClient], test_resource: Resource
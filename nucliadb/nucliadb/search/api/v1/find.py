@@ -204,7 +204,7 @@ async def find(
 
     # We need to query all nodes
     processed_query = pre_process_query(item.query)
-    pb_query, incomplete_results, autofilters = await global_query_to_pb(
+    pb_query, query_incomplete_results, autofilters = await global_query_to_pb(
         kbid,
         features=item.features,
         query=processed_query,
@@ -229,6 +229,7 @@ async def find(
     results, incomplete_results, queried_nodes, queried_shards = await node_query(
         kbid, Method.SEARCH, pb_query, item.shards
     )
+    incomplete_results = incomplete_results or query_incomplete_results
 
     # We need to merge
     search_results = await find_merge_results(
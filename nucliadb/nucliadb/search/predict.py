@@ -17,21 +17,32 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
+import asyncio
+import hashlib
 import json
 import os
-from typing import AsyncIterator, Dict, List, Optional, Tuple
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 
 import aiohttp
 from nucliadb_protos.utils_pb2 import RelationNode
+from redis import asyncio as aioredis
+from redis.asyncio.client import Redis
 
 from nucliadb.ingest.tests.vectors import Q, Qm2023
 from nucliadb.search import logger
+from nucliadb.search.settings import settings
 from nucliadb_models.search import ChatModel, FeedbackRequest, RephraseModel
 from nucliadb_telemetry import metrics
 from nucliadb_utils.exceptions import LimitsExceededError
 from nucliadb_utils.settings import nuclia_settings
 from nucliadb_utils.utilities import Utility, set_utility
 
+try:
+    from memorylru import LRU  # type: ignore
+except ImportError:  # pragma: no cover
+    from lru import LRU  # type: ignore
+
 
 class SendToPredictError(Exception):
     pass
@@ -76,12 +87,16 @@ async def start_predict_engine():
     if nuclia_settings.dummy_predict:
         predict_util = DummyPredictEngine()
     else:
+        query_cache = None
+        if settings.search_cache_predict_ttl > 0:
+            query_cache = PredictQueryCache()
         predict_util = PredictEngine(
             nuclia_settings.nuclia_inner_predict_url,
             nuclia_settings.nuclia_public_url,
             nuclia_settings.nuclia_service_account,
             nuclia_settings.nuclia_zone,
             nuclia_settings.onprem,
+            query_cache=query_cache,
         )
     await predict_util.initialize()
     set_utility(Utility.PREDICT, predict_util)
@@ -98,6 +113,139 @@ def convert_relations(data: Dict[str, List[Dict[str, str]]]) -> List[RelationNod
     return result
 
 
+def dump_relations(relations: List[RelationNode]) -> bytes:
+    return json.dumps(
+        [[node.value, node.ntype, node.subtype] for node in relations]
+    ).encode()
+
+
+def load_relations(data: bytes) -> List[RelationNode]:
+    return [
+        RelationNode(value=value, ntype=ntype, subtype=subtype)
+        for value, ntype, subtype in json.loads(data)
+    ]
+
+
+def dump_vector(vector: List[float]) -> bytes:
+    return json.dumps(vector).encode()
+
+
+def load_vector(data: bytes) -> List[float]:
+    return json.loads(data)
+
+
+class PredictQueryCache:
+    """
+    Cache of predict results for queries (sentence vectors and detected
+    entities).
+
+    Results are kept on an in-process LRU bounded by size and, if a redis is
+    configured, on a redis shared by all search processes. Entries are keyed
+    by kbid, the kind of predict call and the query with whitespace
+    normalized; the model used to compute them is decided by predict for
+    each KB so it's implicit on the kbid. Concurrent lookups of the same
+    missing key share a single predict call.
+
+    Errors and empty results are never cached.
+    """
+
+    redis: Optional[Redis] = None
+
+    def __init__(
+        self,
+        memory_size: Optional[int] = None,
+        ttl: Optional[int] = None,
+    ):
+        self.memory = LRU(memory_size or settings.search_cache_predict_memory_size)
+        self.ttl = ttl or settings.search_cache_predict_ttl
+        self.inflight: Dict[str, asyncio.Task] = {}
+
+    async def initialize(self) -> None:
+        if (
+            settings.search_cache_redis_host is not None
+            and settings.search_cache_redis_port is not None
+        ):
+            self.redis = aioredis.from_url(
+                f"redis://{settings.search_cache_redis_host}:{settings.search_cache_redis_port}"
+            )
+
+    async def finalize(self) -> None:
+        if self.redis is not None:
+            await self.redis.close(close_connection_pool=True)
+            self.redis = None
+        self.memory.clear()
+
+    async def get_or_compute(
+        self,
+        kind: str,
+        kbid: str,
+        query: str,
+        compute: Callable[[], Awaitable[Any]],
+        dumps: Callable[[Any], bytes],
+        loads: Callable[[bytes], Any],
+    ) -> Any:
+        key = _query_key(kind, kbid, query)
+        with predict_observer({"type": f"{kind}_cache"}) as recorder:
+            value = await self._get(key, loads)
+            if value is not None:
+                recorder.set_status("hit")
+                return value
+            recorder.set_status("miss")
+
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._compute(key, compute, dumps))
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        # a cancelled caller must not cancel the call other callers wait for
+        return await asyncio.shield(task)
+
+    async def _get(self, key: str, loads: Callable[[bytes], Any]) -> Any:
+        entry = self.memory.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires > time.monotonic():
+                return value
+            del self.memory[key]
+
+        if self.redis is not None:
+            try:
+                data = await self.redis.get(key)
+            except Exception:
+                logger.warning("Error getting predict result from redis", exc_info=True)
+                data = None
+            if data is not None:
+                value = loads(data)
+                self._set_memory(key, value, len(data))
+                return value
+        return None
+
+    async def _compute(
+        self, key: str, compute: Callable[[], Awaitable[Any]], dumps: Callable
+    ) -> Any:
+        value = await compute()
+        if value is None or len(value) == 0:
+            return value
+
+        data = dumps(value)
+        self._set_memory(key, value, len(data))
+        if self.redis is not None:
+            try:
+                await self.redis.set(key, data, ex=self.ttl)
+            except Exception:
+                logger.warning("Error setting predict result on redis", exc_info=True)
+        return value
+
+    def _set_memory(self, key: str, value: Any, size: int) -> None:
+        self.memory.set(key, (time.monotonic() + self.ttl, value), size)
+
+
+def _query_key(kind: str, kbid: str, query: str) -> str:
+    normalized = " ".join(query.split())
+    digest = hashlib.sha256(normalized.encode()).hexdigest()
+    return f"predict/{kind}/{kbid}/{digest}"
+
+
 class DummyPredictEngine:
     def __init__(self):
         self.calls = []
@@ -160,6 +308,7 @@ class PredictEngine:
         nuclia_service_account: Optional[str] = None,
         zone: Optional[str] = None,
         onprem: bool = False,
+        query_cache: Optional[PredictQueryCache] = None,
     ):
         self.nuclia_service_account = nuclia_service_account
         self.cluster_url = cluster_url
@@ -169,12 +318,17 @@ class PredictEngine:
             self.public_url = None
         self.zone = zone
         self.onprem = onprem
+        self.query_cache = query_cache
 
     async def initialize(self):
         self.session = aiohttp.ClientSession()
+        if self.query_cache is not None:
+            await self.query_cache.initialize()
 
     async def finalize(self):
         await self.session.close()
+        if self.query_cache is not None:
+            await self.query_cache.finalize()
 
     async def check_response(self, resp, expected: int = 200) -> None:
         if resp.status == expected:
@@ -274,8 +428,22 @@ class PredictEngine:
         ident = resp.headers.get("NUCLIA-LEARNING-ID")
         return ident, resp.content.iter_any()
 
-    @predict_observer.wrap({"type": "sentence"})
     async def convert_sentence_to_vector(self, kbid: str, sentence: str) -> List[float]:
+        if self.query_cache is None:
+            return await self._convert_sentence_to_vector(kbid, sentence)
+        return await self.query_cache.get_or_compute(
+            "sentence",
+            kbid,
+            sentence,
+            lambda: self._convert_sentence_to_vector(kbid, sentence),
+            dumps=dump_vector,
+            loads=load_vector,
+        )
+
+    @predict_observer.wrap({"type": "sentence"})
+    async def _convert_sentence_to_vector(
+        self, kbid: str, sentence: str
+    ) -> List[float]:
         if self.onprem is False:
             # Upload the payload
             resp = await self.session.get(
@@ -300,8 +468,20 @@ class PredictEngine:
             raise PredictVectorMissing()
         return data["data"]
 
-    @predict_observer.wrap({"type": "entities"})
     async def detect_entities(self, kbid: str, sentence: str) -> List[RelationNode]:
+        if self.query_cache is None:
+            return await self._detect_entities(kbid, sentence)
+        return await self.query_cache.get_or_compute(
+            "entities",
+            kbid,
+            sentence,
+            lambda: self._detect_entities(kbid, sentence),
+            dumps=dump_relations,
+            loads=load_relations,
+        )
+
+    @predict_observer.wrap({"type": "entities"})
+    async def _detect_entities(self, kbid: str, sentence: str) -> List[RelationNode]:
         if self.onprem is False:
             # Upload the payload
             resp = await self.session.get(
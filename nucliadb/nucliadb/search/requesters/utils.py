@@ -19,7 +19,17 @@
 
 import asyncio
 from enum import Enum
-from typing import Any, List, Optional, Tuple, TypeVar, Union, overload
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+    overload,
+)
 
 from fastapi import HTTPException
 from grpc import StatusCode as GrpcStatusCode
@@ -36,19 +46,30 @@ from nucliadb_protos.nodereader_pb2 import (
 )
 from nucliadb_protos.writer_pb2 import ShardObject as PBShardObject
 
+from nucliadb.common.cluster.abc import AbstractIndexNode
 from nucliadb.common.cluster.exceptions import ShardsNotFound
-from nucliadb.common.cluster.manager import choose_node
+from nucliadb.common.cluster.manager import choose_nodes
+from nucliadb.common.cluster.standalone.index_node import StandaloneIndexNode
+from nucliadb.common.cluster.stats import get_node_stats
 from nucliadb.common.cluster.utils import get_shard_manager
 from nucliadb.ingest.txn_utils import abort_transaction
 from nucliadb.search import logger
 from nucliadb.search.search.shards import (
+    query_local_shards,
     query_paragraph_shard,
     query_shard,
     relations_shard,
     suggest_shard,
 )
 from nucliadb.search.settings import settings
-from nucliadb_telemetry import errors
+from nucliadb_telemetry import errors, metrics
+
+HEDGED_REQUESTS = metrics.Counter(
+    "nucliadb_node_hedged_requests", labels={"winner": ""}
+)
+PARTIAL_SHARD_FAILURES = metrics.Counter(
+    "nucliadb_node_query_partial_failures", labels={"reason": ""}
+)
 
 
 class Method(Enum):
@@ -65,6 +86,14 @@ METHODS = {
     Method.RELATIONS: relations_shard,
 }
 
+# Request types the node stats track latencies for
+METHOD_REQUEST_TYPES = {
+    Method.SEARCH: "search",
+    Method.PARAGRAPH: "paragraph_search",
+    Method.SUGGEST: "suggest",
+    Method.RELATIONS: "relation_search",
+}
+
 REQUEST_TYPE = Union[
     SuggestRequest, ParagraphSearchRequest, SearchRequest, RelationSearchRequest
 ]
@@ -137,21 +166,40 @@ async def node_query(
     ops = []
     queried_shards = []
     queried_nodes = []
+    chosen = []
     incomplete_results = False
 
     for shard_obj in shard_groups:
-        try:
-            node, shard_id, node_id = choose_node(shard_obj, shards)
-        except KeyError:
+        candidates = choose_nodes(shard_obj, shards, METHOD_REQUEST_TYPES[method])
+        if len(candidates) == 0:
             incomplete_results = True
         else:
-            if shard_id is not None:
-                # At least one node is alive for this shard group
-                # let's add it ot the query list if has a valid value
-                func = METHODS[method]
+            # At least one node is alive for this shard group
+            # let's add it ot the query list
+            node, shard_id, node_id = candidates[0]
+            chosen.append(candidates)
+            queried_nodes.append((node.label, shard_id, node_id))
+            queried_shards.append(shard_id)
+
+    local_node = get_local_node(method, chosen)
+    if local_node is not None:
+        # all shards live on the node running in this process: search them
+        # with a single call to the node binding
+        ops.append(
+            query_local_shards(local_node, queried_shards, pb_query)  # type: ignore
+        )
+    else:
+        func = METHODS[method]
+        for candidates in chosen:
+            node, shard_id, _ = candidates[0]
+            if settings.search_hedged_requests:
+                ops.append(
+                    hedged_query(
+                        func, candidates, pb_query, METHOD_REQUEST_TYPES[method]
+                    )
+                )
+            else:
                 ops.append(func(node, shard_id, pb_query))  # type: ignore
-                queried_nodes.append((node.label, shard_id, node_id))
-                queried_shards.append(shard_id)
 
     if not ops:
         await abort_transaction()
@@ -161,13 +209,28 @@ async def node_query(
             detail=f"No node found for any of this resources shards {kbid}",
         )
 
-    try:
-        results = await asyncio.wait_for(  # type: ignore
-            asyncio.gather(*ops, return_exceptions=True),  # type: ignore
-            timeout=settings.search_timeout,
-        )
-    except asyncio.TimeoutError as exc:
-        results = [exc]
+    if settings.search_partial_results:
+        results = await query_shards_with_deadline(ops)
+        if local_node is not None:
+            results = expand_local_results(results, len(queried_shards))
+        (
+            results,
+            queried_nodes,
+            queried_shards,
+            partial_incomplete_results,
+        ) = split_partial_results(results, queried_nodes, queried_shards)
+        incomplete_results = incomplete_results or partial_incomplete_results
+    else:
+        try:
+            results = await asyncio.wait_for(  # type: ignore
+                asyncio.gather(*ops, return_exceptions=True),  # type: ignore
+                timeout=settings.search_timeout,
+            )
+        except asyncio.TimeoutError as exc:
+            results = [exc]
+        else:
+            if local_node is not None:
+                results = expand_local_results(results, len(queried_shards))
 
     error = validate_node_query_results(results or [])
     if error is not None:
@@ -177,6 +240,137 @@ async def node_query(
     return results, incomplete_results, queried_nodes, queried_shards
 
 
+def get_local_node(
+    method: Method, chosen: List[List[Tuple[AbstractIndexNode, str, str]]]
+) -> Optional[StandaloneIndexNode]:
+    """
+    Return the standalone node to query when a search goes to several shards
+    that are all served by it.
+    """
+    if method is not Method.SEARCH or len(chosen) < 2:
+        return None
+    nodes = {candidates[0][0] for candidates in chosen}
+    if len(nodes) != 1:
+        return None
+    node = nodes.pop()
+    if not isinstance(node, StandaloneIndexNode):
+        return None
+    return node
+
+
+def expand_local_results(results: List[Any], shards: int) -> List[Any]:
+    """
+    Turn the result of a single local search on several shards into one
+    result per shard: the response or error of each shard. If the whole call
+    failed, all the shards get its error.
+    """
+    (result,) = results
+    if isinstance(result, BaseException):
+        return [result] * shards
+    return result
+
+
+async def query_shards_with_deadline(ops: List[Awaitable[T]]) -> List[Any]:
+    """
+    Run shard queries, each one with its own deadline. Shards not answering in
+    time get their call cancelled and an `asyncio.TimeoutError` as result.
+    """
+    timeout = settings.search_shard_timeout or settings.search_timeout
+    return await asyncio.gather(
+        *[asyncio.wait_for(op, timeout=timeout) for op in ops],
+        return_exceptions=True,
+    )
+
+
+def split_partial_results(
+    results: List[Any],
+    queried_nodes: List[Tuple[str, str, str]],
+    queried_shards: List[str],
+) -> Tuple[List[Any], List[Tuple[str, str, str]], List[str], bool]:
+    """
+    Keep the results of the shards that answered and report the failed ones:
+    they are removed from the queried shards and flagged on the queried nodes
+    debug info.
+
+    If no shard answered, all results are kept so the errors are reported.
+    """
+    answered = [
+        index
+        for index, result in enumerate(results)
+        if not isinstance(result, BaseException)
+    ]
+    if len(answered) == len(results) or len(answered) == 0:
+        return results, queried_nodes, queried_shards, False
+
+    nodes = []
+    for index, (label, shard_id, node_id) in enumerate(queried_nodes):
+        result = results[index]
+        if isinstance(result, BaseException):
+            reason = "timeout" if isinstance(result, asyncio.TimeoutError) else "error"
+            PARTIAL_SHARD_FAILURES.inc({"reason": reason})
+            logger.warning(
+                f"Shard {shard_id} on node {node_id} failed ({reason}), "
+                "returning partial results",
+                exc_info=result if reason == "error" else None,
+            )
+            label = f"{label}:{reason}"
+        nodes.append((label, shard_id, node_id))
+
+    return (
+        [results[index] for index in answered],
+        nodes,
+        [queried_shards[index] for index in answered],
+        True,
+    )
+
+
+async def hedged_query(
+    func: Callable[[AbstractIndexNode, str, Any], Awaitable[T]],
+    candidates: List[Tuple[AbstractIndexNode, str, str]],
+    pb_query: REQUEST_TYPE,
+    request_type: str,
+) -> T:
+    """
+    Query the best replica and, if it takes longer than its usual latency
+    for `request_type` (`search_hedge_percentile`), query the second best one too. The first
+    successful response wins and the other request is cancelled.
+    """
+    node, shard_id, node_id = candidates[0]
+    primary = asyncio.create_task(func(node, shard_id, pb_query))
+    tasks = {primary}
+    try:
+        delay = get_node_stats(node_id).percentile(
+            settings.search_hedge_percentile, request_type
+        )
+        if len(candidates) < 2 or delay is None:
+            return await primary
+
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if len(done) > 0:
+            return primary.result()
+
+        hedge_node, hedge_shard_id, _ = candidates[1]
+        hedge = asyncio.create_task(func(hedge_node, hedge_shard_id, pb_query))
+        tasks.add(hedge)
+        pending = set(tasks)
+        while len(pending) > 0:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    HEDGED_REQUESTS.inc(
+                        {"winner": "primary" if task is primary else "hedge"}
+                    )
+                    return task.result()
+        # both failed, report the error of the preferred replica
+        return primary.result()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
 def validate_node_query_results(results: list[Any]) -> Optional[HTTPException]:
     """
     Validate the results of a node query and return an exception if any error is found
@@ -189,7 +383,7 @@ def validate_node_query_results(results: list[Any]) -> Optional[HTTPException]:
         )
 
     for i, result in enumerate(results):
-        if isinstance(result, Exception):
+        if isinstance(result, BaseException):
             status_code = 500
             reason = "Error while querying shard data."
             if isinstance(result, AioRpcError):
@@ -18,24 +18,145 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 import asyncio
+import time
 from contextvars import ContextVar
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple, Union
 
-from lru import LRU  # type: ignore
+from nucliadb_protos.knowledgebox_pb2 import KnowledgeBoxConfig
+from nucliadb_protos.resources_pb2 import (
+    AllFieldIDs,
+    Basic,
+    Extra,
+    FieldComputedMetadata,
+    FieldType,
+    Origin,
+    Relations,
+)
+from nucliadb_protos.utils_pb2 import ExtractedText
 
 from nucliadb.common.maindb.driver import Transaction
+from nucliadb.ingest.fields.base import KB_RESOURCE_FIELD
+from nucliadb.ingest.orm.knowledgebox import KB_UUID
 from nucliadb.ingest.orm.knowledgebox import KnowledgeBox as KnowledgeBoxORM
+from nucliadb.ingest.orm.resource import (
+    KB_FIELDS,
+    KB_RESOURCE_ALL_FIELDS,
+    KB_RESOURCE_EXTRA,
+    KB_RESOURCE_ORIGIN,
+    KB_RESOURCE_RELATIONS,
+    KB_REVERSE_REVERSE,
+)
 from nucliadb.ingest.orm.resource import Resource as ResourceORM
+from nucliadb.ingest.orm.utils import get_basic_key
 from nucliadb.ingest.txn_utils import get_transaction
 from nucliadb.search import SERVICE_NAME
-from nucliadb_utils.utilities import get_storage
+from nucliadb.search.settings import settings
+from nucliadb_utils.cache import KB_RESOURCE_CACHE
+from nucliadb_utils.utilities import get_cache, get_storage
+
+FieldKey = Tuple[FieldType.ValueType, str]
+
+# Max number of keys asked to maindb on a single batch_get
+PREFETCH_BATCH_SIZE = 500
+
+# Fields whose value is not stored on their own maindb key
+NOT_PREFETCHABLE_FIELDS = (FieldType.GENERIC, FieldType.CONVERSATION)
 
 rcache: ContextVar[Optional[Dict[str, ResourceORM]]] = ContextVar(
     "rcache", default=None
 )
+rlocks: ContextVar[Optional[Dict[str, asyncio.Lock]]] = ContextVar(
+    "rlocks", default=None
+)
+# Cache entry found for each resource of the request when it was loaded
+rsources: ContextVar[
+    Optional[Dict[str, Union["ResourceSnapshot", "SnapshotFillToken"]]]
+] = ContextVar("rsources", default=None)
+
+
+class ResourceSnapshot:
+    """
+    Read only copy of the data of a resource we need to build search
+    results: basic, field ids and the extracted text and computed metadata of
+    its fields.
+
+    Snapshots are shared between requests through the cache utility, so
+    objects stored here must never be modified. Ingest invalidates them
+    whenever a resource is committed and they expire after
+    `search_cache_resource_ttl` seconds as a safety net.
+    """
+
+    def __init__(self, basic: Basic, disable_vectors: bool):
+        self.basic = basic
+        self.disable_vectors = disable_vectors
+        self.fields_ids: list[FieldKey] = []
+        self.extracted_texts: Dict[FieldKey, ExtractedText] = {}
+        self.fields_metadata: Dict[FieldKey, FieldComputedMetadata] = {}
+        self.created = time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() - self.created > settings.search_cache_resource_ttl
+
+    @property
+    def size(self) -> int:
+        size = self.basic.ByteSize()
+        for extracted_text in self.extracted_texts.values():
+            size += extracted_text.ByteSize()
+        for field_metadata in self.fields_metadata.values():
+            size += field_metadata.ByteSize()
+        return size
 
+    @classmethod
+    def from_orm(
+        cls,
+        orm_resource: ResourceORM,
+        previous: Optional["ResourceSnapshot"] = None,
+    ) -> "ResourceSnapshot":
+        """
+        New snapshot with what `previous`, the snapshot the resource was loaded
+        from, holds plus what has been loaded since
+        """
+        snapshot = cls(orm_resource.basic, disable_vectors=orm_resource.disable_vectors)
+        if previous is not None:
+            # its data is not any newer
+            snapshot.created = previous.created
+            snapshot.fields_ids = list(previous.fields_ids)
+            snapshot.extracted_texts.update(previous.extracted_texts)
+            snapshot.fields_metadata.update(previous.fields_metadata)
+        if len(orm_resource.all_fields_keys) > 0:
+            snapshot.fields_ids = list(orm_resource.all_fields_keys)
+        for field_key, field in orm_resource.fields.items():
+            if field.extracted_text is not None:
+                snapshot.extracted_texts[field_key] = field.extracted_text
+            if field.computed_metadata is not None:
+                snapshot.fields_metadata[field_key] = field.computed_metadata
+        return snapshot
 
-RESOURCE_LOCKS: Dict[str, asyncio.Lock] = LRU(1000)
+    def to_orm(self, txn: Transaction, kb: KnowledgeBoxORM, uuid: str) -> ResourceORM:
+        orm_resource = ResourceORM(
+            txn=txn,
+            storage=kb.storage,
+            kb=kb,
+            uuid=uuid,
+            basic=self.basic,
+            disable_vectors=self.disable_vectors,
+        )
+        orm_resource.all_fields_keys = list(self.fields_ids)
+        for field_key in self.extracted_texts.keys() | self.fields_metadata.keys():
+            field_type, field_id = field_key
+            field = KB_FIELDS[field_type](id=field_id, resource=orm_resource)
+            field.extracted_text = self.extracted_texts.get(field_key)
+            field.computed_metadata = self.fields_metadata.get(field_key)
+            orm_resource.fields[field_key] = field
+        return orm_resource
+
+
+class SnapshotFillToken:
+    """
+    Set on the cache before loading a resource from maindb. Invalidations
+    replace it, so a snapshot is only stored if the token is still there.
+    """
 
 
 def get_resource_cache(clear: bool = False) -> Dict[str, ResourceORM]:
@@ -43,9 +164,48 @@ def get_resource_cache(clear: bool = False) -> Dict[str, ResourceORM]:
     if value is None or clear:
         value = {}
         rcache.set(value)
+        rlocks.set({})
+        rsources.set({})
     return value
 
 
+def _get_resources_sources() -> Dict[str, Union[ResourceSnapshot, SnapshotFillToken]]:
+    sources = rsources.get()
+    if sources is None:
+        sources = {}
+        rsources.set(sources)
+    return sources
+
+
+def _get_resource_lock(uuid: str) -> asyncio.Lock:
+    locks: Optional[Dict[str, asyncio.Lock]] = rlocks.get()
+    if locks is None:
+        locks = {}
+        rlocks.set(locks)
+    return locks.setdefault(uuid, asyncio.Lock())
+
+
+async def _get_snapshot(kbid: str, uuid: str) -> Optional[ResourceSnapshot]:
+    """
+    Snapshot of the resource, if any. Otherwise a fill token is left on the
+    cache, as the caller is going to load the resource from maindb.
+    """
+    cache = await get_cache()
+    if cache is None:
+        return None
+    key = KB_RESOURCE_CACHE.format(kbid=kbid, uuid=uuid)
+    entry = await cache.get(key)
+    sources = _get_resources_sources()
+    if isinstance(entry, ResourceSnapshot) and not entry.expired:
+        sources[uuid] = entry
+        return entry
+    if not isinstance(entry, SnapshotFillToken):
+        entry = SnapshotFillToken()
+        await cache.set(key, entry, size=0)
+    sources[uuid] = entry
+    return None
+
+
 async def get_resource_from_cache(
     kbid: str, uuid: str, txn: Optional[Transaction] = None
 ) -> Optional[ResourceORM]:
@@ -53,16 +213,17 @@ async def get_resource_from_cache(
 
     resource_cache = get_resource_cache()
 
-    if uuid not in RESOURCE_LOCKS:
-        RESOURCE_LOCKS[uuid] = asyncio.Lock()
-
-    async with RESOURCE_LOCKS[uuid]:
+    async with _get_resource_lock(uuid):
         if uuid not in resource_cache:
             if txn is None:
                 txn = await get_transaction()
             storage = await get_storage(service_name=SERVICE_NAME)
             kb = KnowledgeBoxORM(txn, storage, kbid)
-            orm_resource = await kb.get(uuid)
+            snapshot = await _get_snapshot(kbid, uuid)
+            if snapshot is not None:
+                orm_resource = snapshot.to_orm(txn, kb, uuid)
+            else:
+                orm_resource = await kb.get(uuid)
 
         if orm_resource is not None:
             resource_cache[uuid] = orm_resource
@@ -70,3 +231,178 @@ async def get_resource_from_cache(
             orm_resource = resource_cache.get(uuid)
 
     return orm_resource
+
+
+async def store_resources_snapshots(kbid: str) -> None:
+    """
+    Save what has been loaded for the resources of the current request so
+    next requests on the same resources do not need to go to maindb or blob
+    storage again.
+    """
+    cache = await get_cache()
+    if cache is None:
+        return
+
+    sources = _get_resources_sources()
+    for uuid, orm_resource in get_resource_cache().items():
+        source = sources.get(uuid)
+        if source is None or orm_resource.basic is None:
+            continue
+        key = KB_RESOURCE_CACHE.format(kbid=kbid, uuid=uuid)
+        if await cache.get(key) is not source:
+            # invalidated or refreshed since we loaded it
+            continue
+        previous = source if isinstance(source, ResourceSnapshot) else None
+        snapshot = ResourceSnapshot.from_orm(orm_resource, previous)
+        await cache.set(key, snapshot, size=snapshot.size)
+
+
+async def _batch_get(txn: Transaction, keys: List[str]) -> Tuple[Dict[str, bytes], int]:
+    values: Dict[str, bytes] = {}
+    round_trips = 0
+    for index in range(0, len(keys), PREFETCH_BATCH_SIZE):
+        batch = keys[index : index + PREFETCH_BATCH_SIZE]
+        round_trips += 1
+        for key, value in zip(batch, await txn.batch_get(batch)):
+            if value is not None:
+                values[key] = value
+    return values, round_trips
+
+
+def _parse(klass, payload: Optional[bytes]):
+    if payload is None:
+        return None
+    pb = klass()
+    pb.ParseFromString(payload)
+    return pb
+
+
+async def prefetch_resources(
+    kbid: str,
+    uuids: List[str],
+    *,
+    origin: bool = False,
+    extra: bool = False,
+    relations: bool = False,
+    fields: bool = False,
+) -> int:
+    """
+    Load on the request resource cache everything maindb holds for the given
+    resources and the serialization will need: basic, field ids and,
+    optionally, origin, extra, relations and field values. Keys are asked
+    with as few `batch_get` calls as possible on the request transaction so
+    serialization and paragraph slicing don't need to go to maindb again.
+
+    Returns the number of maindb round trips done.
+    """
+    resource_cache = get_resource_cache()
+    uuids = [uuid for uuid in dict.fromkeys(uuids) if uuid not in resource_cache]
+    if len(uuids) == 0:
+        return 0
+
+    txn = await get_transaction()
+    storage = await get_storage(service_name=SERVICE_NAME)
+    kb = KnowledgeBoxORM(txn, storage, kbid)
+
+    snapshots: Dict[str, ResourceSnapshot] = {}
+    keys: List[str] = [KB_UUID.format(kbid=kbid)]
+    for uuid in uuids:
+        snapshot = await _get_snapshot(kbid, uuid)
+        if snapshot is not None:
+            snapshots[uuid] = snapshot
+        else:
+            keys.append(get_basic_key(kbid, uuid))
+            keys.append(KB_RESOURCE_ALL_FIELDS.format(kbid=kbid, uuid=uuid))
+        if origin:
+            keys.append(KB_RESOURCE_ORIGIN.format(kbid=kbid, uuid=uuid))
+        if extra:
+            keys.append(KB_RESOURCE_EXTRA.format(kbid=kbid, uuid=uuid))
+        if relations:
+            keys.append(KB_RESOURCE_RELATIONS.format(kbid=kbid, uuid=uuid))
+
+    values, round_trips = await _batch_get(txn, keys)
+
+    config = _parse(KnowledgeBoxConfig, values.get(KB_UUID.format(kbid=kbid)))
+    kb._config = config
+    disable_vectors = config.disable_vectors if config is not None else True
+
+    resources: Dict[str, ResourceORM] = {}
+    for uuid in uuids:
+        if uuid in snapshots:
+            orm_resource = snapshots[uuid].to_orm(txn, kb, uuid)
+        else:
+            basic = _parse(Basic, values.get(get_basic_key(kbid, uuid)))
+            if basic is None:
+                # Resource does not exist, leave it to the lazy path
+                continue
+            orm_resource = ResourceORM(
+                txn=txn,
+                storage=storage,
+                kb=kb,
+                uuid=uuid,
+                basic=basic,
+                disable_vectors=disable_vectors,
+            )
+            all_fields = _parse(
+                AllFieldIDs,
+                values.get(KB_RESOURCE_ALL_FIELDS.format(kbid=kbid, uuid=uuid)),
+            )
+            # without the allfields key, fields ids are scanned lazily
+            if all_fields is not None:
+                orm_resource.all_fields_keys = [
+                    (f.field_type, f.field) for f in all_fields.fields
+                ]
+                orm_resource.all_fields_keys.extend(
+                    ResourceORM.get_generic_fields_ids(basic)
+                )
+        orm_resource.origin = _parse(
+            Origin, values.get(KB_RESOURCE_ORIGIN.format(kbid=kbid, uuid=uuid))
+        )
+        orm_resource.extra = _parse(
+            Extra, values.get(KB_RESOURCE_EXTRA.format(kbid=kbid, uuid=uuid))
+        )
+        orm_resource.relations = _parse(
+            Relations, values.get(KB_RESOURCE_RELATIONS.format(kbid=kbid, uuid=uuid))
+        )
+        resources[uuid] = orm_resource
+
+    if fields:
+        round_trips += await _prefetch_fields_values(kbid, txn, resources)
+
+    resource_cache.update(resources)
+    return round_trips
+
+
+async def _prefetch_fields_values(
+    kbid: str, txn: Transaction, resources: Dict[str, ResourceORM]
+) -> int:
+    keys: Dict[str, Tuple[ResourceORM, FieldKey]] = {}
+    for uuid, orm_resource in resources.items():
+        for field_key in orm_resource.all_fields_keys:
+            field_type, field_id = field_key
+            if field_type in NOT_PREFETCHABLE_FIELDS:
+                continue
+            field = orm_resource.fields.get(field_key)
+            if field is not None and field.value is not None:
+                continue
+            key = KB_RESOURCE_FIELD.format(
+                kbid=kbid,
+                uuid=uuid,
+                type=KB_REVERSE_REVERSE[field_type],
+                field=field_id,
+            )
+            keys[key] = (orm_resource, field_key)
+
+    if len(keys) == 0:
+        return 0
+
+    values, round_trips = await _batch_get(txn, list(keys.keys()))
+    for key, (orm_resource, field_key) in keys.items():
+        field_type, field_id = field_key
+        field = orm_resource.fields.get(field_key)
+        if field is None:
+            field = KB_FIELDS[field_type](id=field_id, resource=orm_resource)
+            orm_resource.fields[field_key] = field
+        if key in values:
+            field.value = _parse(field.pbklass, values[key])
+    return round_trips
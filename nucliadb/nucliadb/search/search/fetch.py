@@ -25,8 +25,8 @@ from nucliadb_protos.resources_pb2 import Paragraph
 
 from nucliadb.ingest.orm.resource import KB_REVERSE
 from nucliadb.ingest.orm.resource import Resource as ResourceORM
-from nucliadb.ingest.serialize import serialize
-from nucliadb.search import SERVICE_NAME, logger
+from nucliadb.ingest.serialize import serialize_orm_resource
+from nucliadb.search import logger
 from nucliadb_models.common import FieldTypeName
 from nucliadb_models.resource import ExtractedDataTypeName, Resource
 from nucliadb_models.search import ResourceProperties
@@ -47,16 +47,15 @@ async def fetch_resources(
 ) -> Dict[str, Resource]:
     result = {}
     for resource in resources:
-        serialization = await serialize(
-            kbid,
-            resource,
+        orm_resource = await get_resource_from_cache(kbid, resource)
+        if orm_resource is None:
+            continue
+        result[resource] = await serialize_orm_resource(
+            orm_resource,
             show,
             field_type_filter=field_type_filter,
             extracted=extracted,
-            service_name=SERVICE_NAME,
         )
-        if serialization is not None:
-            result[resource] = serialization
     return result
 
 
@@ -27,10 +27,14 @@ from nucliadb_protos.nodereader_pb2 import (
     SearchResponse,
 )
 
-from nucliadb.ingest.serialize import serialize
+from nucliadb.ingest.serialize import serialize_orm_resource
 from nucliadb.ingest.txn_utils import abort_transaction, get_transaction
-from nucliadb.search import SERVICE_NAME
-from nucliadb.search.search.cache import get_resource_cache
+from nucliadb.search.search.cache import (
+    get_resource_cache,
+    get_resource_from_cache,
+    prefetch_resources,
+    store_resources_snapshots,
+)
 from nucliadb.search.search.merge import merge_relations_results
 from nucliadb_models.common import FieldTypeName
 from nucliadb_models.resource import ExtractedDataTypeName
@@ -53,6 +57,10 @@ FIND_FETCH_OPS_DISTRIBUTION = metrics.Histogram(
     "nucliadb_find_fetch_operations",
     buckets=[1, 5, 10, 20, 30, 40, 50, 60, 80, 100, 200],
 )
+FIND_FETCH_ROUND_TRIPS_DISTRIBUTION = metrics.Histogram(
+    "nucliadb_find_fetch_round_trips",
+    buckets=[0, 1, 2, 3, 4, 5, 10, 20, 50],
+)
 
 
 async def set_text_value(
@@ -94,15 +102,14 @@ async def set_resource_metadata_value(
     await max_operations.acquire()
 
     try:
-        serialized_resource = await serialize(
-            kbid,
-            resource,
-            show,
-            field_type_filter=field_type_filter,
-            extracted=extracted,
-            service_name=SERVICE_NAME,
-        )
-        if serialized_resource is not None:
+        orm_resource = await get_resource_from_cache(kbid, resource)
+        if orm_resource is not None:
+            serialized_resource = await serialize_orm_resource(
+                orm_resource,
+                show,
+                field_type_filter=field_type_filter,
+                extracted=extracted,
+            )
             find_resources[resource].updated_from(serialized_resource)
     finally:
         max_operations.release()
@@ -213,6 +220,19 @@ async def fetch_find_metadata(
             )
         )
 
+    # Get everything maindb has for the page in a few round trips, so the
+    # operations below are served from the request resource cache
+    round_trips = await prefetch_resources(
+        kbid,
+        list(resources),
+        origin=ResourceProperties.ORIGIN in show,
+        extra=ResourceProperties.EXTRA in show,
+        relations=ResourceProperties.RELATIONS in show,
+        fields=len(field_type_filter) > 0
+        and (ResourceProperties.VALUES in show or ResourceProperties.EXTRACTED in show),
+    )
+    FIND_FETCH_ROUND_TRIPS_DISTRIBUTION.observe(round_trips)
+
     FIND_FETCH_OPS_DISTRIBUTION.observe(len(operations))
     if len(operations) > 0:
         await asyncio.wait(operations)  # type: ignore
@@ -401,5 +421,6 @@ async def find_merge_results(
         relations, requested_relations
     )
 
+    await store_resources_snapshots(kbid)
     await abort_transaction()
     return api_results
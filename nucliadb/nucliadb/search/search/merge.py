@@ -18,8 +18,9 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
 import datetime
+import heapq
 import math
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, List, Optional, Tuple, TypeVar, Union
 
 from nucliadb_protos.nodereader_pb2 import (
     DocumentResult,
@@ -33,6 +34,7 @@ from nucliadb_protos.nodereader_pb2 import (
     SuggestResponse,
     VectorSearchResponse,
 )
+from nucliadb_protos.resources_pb2 import Basic
 
 from nucliadb.search import logger
 from nucliadb.search.search.fetch import (
@@ -68,7 +70,7 @@ from nucliadb_models.search import (
 )
 from nucliadb_telemetry import errors
 
-from .cache import get_resource_cache, get_resource_from_cache
+from .cache import get_resource_cache, prefetch_resources, store_resources_snapshots
 from .metrics import merge_observer
 from .paragraphs import get_paragraph_text, get_text_sentence
 
@@ -76,41 +78,60 @@ Bm25Score = Tuple[int, int]
 TimestampScore = datetime.datetime
 TitleScore = str
 Score = Union[Bm25Score, TimestampScore, TitleScore]
+ResultType = TypeVar("ResultType", DocumentResult, ParagraphResult)
 
 
 def sort_results_by_score(results: Union[List[ParagraphResult], List[DocumentResult]]):
     results.sort(key=lambda x: (x.score.bm25, x.score.booster), reverse=True)
 
 
-async def text_score(
-    item: Union[DocumentResult, ParagraphResult],
-    sort_field: SortField,
-    kbid: str,
-) -> Optional[Score]:
-    """Returns the score for given `item` and `sort_field`. If the resource is being
-    deleted, it might appear on search results but not in maindb. In this
-    specific case, return None.
+# Sort fields whose values are not on the index results but on the basic of
+# their resources
+BASIC_SORT_FIELDS = (SortField.CREATED, SortField.MODIFIED, SortField.TITLE)
 
-    """
-    score: Any = None
-
-    resource = await get_resource_from_cache(kbid, item.uuid)
-    if resource is None:
-        return score
-    basic = await resource.get_basic()
-    if basic is None:
-        return score
-
-    if sort_field == SortField.SCORE:
-        score = (item.score.bm25, item.score.booster)
-    elif sort_field == SortField.CREATED:
-        score = basic.created.ToDatetime()
+
+def basic_score(basic: Basic, sort_field: SortField) -> Score:
+    if sort_field == SortField.CREATED:
+        return basic.created.ToDatetime()
     elif sort_field == SortField.MODIFIED:
-        score = basic.modified.ToDatetime()
-    elif sort_field == SortField.TITLE:
-        score = basic.title
+        return basic.modified.ToDatetime()
+    else:
+        return basic.title
 
-    return score
+
+async def rank_results(
+    results: List[ResultType], sort: SortOptions, kbid: str, limit: int
+) -> List[Tuple[ResultType, Score]]:
+    """Returns the first `limit` results in the requested order. Results of
+    resources not in maindb (i.e. being deleted) are left out.
+
+    Results are picked with a bounded heap instead of sorting all of them. When
+    sorting by score, everything needed is on the results and maindb is only
+    asked for the resources of the picked ones. Other sort fields need the basic
+    of every resource, loaded in batches.
+    """
+    select = heapq.nlargest if sort.order == SortOrder.DESC else heapq.nsmallest
+    resource_cache = get_resource_cache()
+
+    if sort.field in BASIC_SORT_FIELDS:
+        await prefetch_resources(kbid, [result.uuid for result in results])
+        scored: List[Tuple[ResultType, Score]] = []
+        for result in results:
+            resource = resource_cache.get(result.uuid)
+            if resource is None or resource.basic is None:
+                continue
+            scored.append((result, basic_score(resource.basic, sort.field)))
+        return select(limit, scored, key=lambda x: x[1])
+
+    scored = [(result, (result.score.bm25, result.score.booster)) for result in results]
+    window = limit
+    while True:
+        ranked = select(window, scored, key=lambda x: x[1])
+        await prefetch_resources(kbid, [result.uuid for result, _ in ranked])
+        existing = [item for item in ranked if item[0].uuid in resource_cache]
+        if len(existing) >= limit or window >= len(scored):
+            return existing[:limit]
+        window *= 2
 
 
 async def merge_documents_results(
@@ -121,7 +142,7 @@ async def merge_documents_results(
     kbid: str,
     sort: SortOptions,
 ) -> Resources:
-    raw_resource_list: List[Tuple[DocumentResult, Score]] = []
+    raw_resource_list: List[DocumentResult] = []
     facets: Dict[str, Any] = {}
     query = None
     total = 0
@@ -137,23 +158,19 @@ async def merge_documents_results(
 
         if document_response.next_page:
             next_page = True
-        for result in document_response.results:
-            score = await text_score(result, sort.field, kbid)
-            if score is not None:
-                raw_resource_list.append((result, score))
+        raw_resource_list.extend(document_response.results)
         total += document_response.total
 
-    raw_resource_list.sort(key=lambda x: x[1], reverse=(sort.order == SortOrder.DESC))
-
     skip = page * count
     end = skip + count
-    length = len(raw_resource_list)
+    # one more than the page to know if there is a next one
+    ranked = await rank_results(raw_resource_list, sort, kbid, end + 1)
 
-    if length > end:
+    if len(ranked) > end:
         next_page = True
 
     result_resource_list: List[ResourceResult] = []
-    for result, _ in raw_resource_list[min(skip, length) : min(end, length)]:
+    for result, _ in ranked[skip:end]:
         # /f/file
 
         labels = await get_labels_resource(result, kbid)
@@ -325,7 +342,7 @@ async def merge_paragraph_results(
     highlight: bool,
     sort: SortOptions,
 ):
-    raw_paragraph_list: List[Tuple[ParagraphResult, Score]] = []
+    raw_paragraph_list: List[ParagraphResult] = []
     facets: Dict[str, Any] = {}
     query = None
     next_page = False
@@ -344,23 +361,19 @@ async def merge_paragraph_results(
                     facets[key][facetresult.tag] += facetresult.total
         if paragraph_response.next_page:
             next_page = True
-        for result in paragraph_response.results:
-            score = await text_score(result, sort.field, kbid)
-            if score is not None:
-                raw_paragraph_list.append((result, score))
+        raw_paragraph_list.extend(paragraph_response.results)
         total += paragraph_response.total
 
-    raw_paragraph_list.sort(key=lambda x: x[1], reverse=(sort.order == SortOrder.DESC))
-
     skip = page * count
     end = skip + count
-    length = len(raw_paragraph_list)
+    # one more than the page to know if there is a next one
+    ranked = await rank_results(raw_paragraph_list, sort, kbid, end + 1)
 
-    if length > end:
+    if len(ranked) > end:
         next_page = True
 
     result_paragraph_list: List[Paragraph] = []
-    for result, _ in raw_paragraph_list[min(skip, length) : min(end, length)]:
+    for result, _ in ranked[skip:end]:
         _, field_type, field = result.field.split("/")
         text = await get_paragraph_text(
             kbid=kbid,
@@ -518,6 +531,7 @@ async def merge_results(
     api_results.resources = await fetch_resources(
         resources, kbid, show, field_type_filter, extracted
     )
+    await store_resources_snapshots(kbid)
     return api_results
 
 
@@ -17,6 +17,13 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
+import asyncio
+
 from nucliadb_telemetry import metrics
 
 merge_observer = metrics.Observer("merge_results", labels={"type": ""})
+query_step_observer = metrics.Observer(
+    "query_enrichment_step",
+    labels={"step": ""},
+    error_mappings={"timeout": asyncio.TimeoutError},
+)
@@ -17,31 +17,40 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
-import asyncio
 import logging
 import re
 import string
+import uuid
+import weakref
 from typing import Optional
 
+from nucliadb_protos.resources_pb2 import FieldID
+from nucliadb_protos.writer_pb2 import Notification
 from redis import asyncio as aioredis
 from redis.asyncio.client import Redis
 
 from nucliadb.ingest.fields.base import Field
-from nucliadb.ingest.orm.resource import KB_REVERSE
+from nucliadb.ingest.orm.resource import KB_REVERSE, KB_REVERSE_REVERSE
 from nucliadb.ingest.orm.resource import Resource as ResourceORM
 from nucliadb.search.settings import settings
 from nucliadb_telemetry import metrics
-from nucliadb_utils.utilities import get_utility, set_utility
+from nucliadb_utils import const
+from nucliadb_utils.cache.pubsub import PubSubDriver
+from nucliadb_utils.cache.settings import settings as cache_settings
+from nucliadb_utils.utilities import get_pubsub, get_utility, set_utility
 
 from .cache import get_resource_from_cache
 
+try:
+    from memorylru import LRU  # type: ignore
+except ImportError:  # pragma: no cover
+    from lru import LRU  # type: ignore
+
 logger = logging.getLogger(__name__)
 PRE_WORD = string.punctuation + " "
 
-CACHE_OPS = metrics.Counter("nucliadb_paragraph_cache_ops", labels={"type": "miss"})
-CACHE_HIT_DISTRIBUTION = metrics.Histogram(
-    "nucliadb_paragraph_cache_dist",
-    buckets=[1, 2, 4, 8, 16, 32, 64, 128, 512, 1024, metrics.INF],
+CACHE_OPS = metrics.Counter(
+    "nucliadb_paragraph_cache_ops", labels={"type": "miss", "tier": ""}
 )
 GET_PARAGRAPH_LATENCY = metrics.Observer(
     "nucliadb_get_paragraph",
@@ -64,63 +73,99 @@ GET_PARAGRAPH_LATENCY = metrics.Observer(
 )
 
 _PARAGRAPHS_CACHE_UTIL = "paragraphs_cache"
+_REDIS_KEY_PREFIX = "paragraphs/"
+
+
+class FillToken:
+    """
+    Taken before reading a paragraph from maindb. Invalidations drop the token
+    of the resource, so a text read before an invalidation is not cached.
+    """
 
 
 class ParagraphsCache:
     """
-    Skeleton of paragraph cache.
+    Two tier cache of paragraph texts.
+
+    Paragraphs are kept on an in-process LRU bounded by size and, if a redis
+    is configured, on a redis shared by all search processes. Entries are
+    grouped by resource so we can drop them when ingest notifies that a new
+    extracted text has been committed for any of its fields.
 
-    For now, it will be used for us to track hits/misses on a potential
-    paragraph cache implementation.
+    The cache is only enabled when there is a pubsub to receive invalidations.
     """
 
-    consumer_task: Optional[asyncio.Task] = None
-    redis: Redis
+    redis: Optional[Redis] = None
+    pubsub: Optional[PubSubDriver] = None
+    subscription_id: Optional[str] = None
 
-    def __init__(self):
-        self.queue = asyncio.Queue()
+    def __init__(
+        self,
+        pubsub: Optional[PubSubDriver] = None,
+        memory_size: Optional[int] = None,
+        ttl: Optional[int] = None,
+    ):
+        self.pubsub = pubsub
+        self.memory = LRU(memory_size or settings.search_cache_paragraphs_memory_size)
+        self.ttl = ttl or settings.search_cache_paragraphs_ttl
+        # tokens only live while a fill holds them
+        self.fill_tokens: weakref.WeakValueDictionary[
+            str, FillToken
+        ] = weakref.WeakValueDictionary()
+        self.initialized = False
 
     async def initialize(self) -> None:
+        if self.pubsub is None:
+            if not cache_settings.cache_enabled:
+                # No way to get invalidations, keep the cache disabled
+                return
+            self.pubsub = await get_pubsub()
+
+        self.subscription_id = str(uuid.uuid4())
+        await self.pubsub.subscribe(
+            handler=self.handle_message,
+            key=const.PubSubChannels.RESOURCE_NOTIFY.format(kbid="*"),
+            subscription_id=self.subscription_id,
+        )
         if (
-            settings.search_cache_redis_host is None
-            or settings.search_cache_redis_port is None
+            settings.search_cache_redis_host is not None
+            and settings.search_cache_redis_port is not None
         ):
-            # Cache is not configured, ignore
-            return
-        self.consumer_task = asyncio.create_task(self.queue_consumer())
-        self.redis = aioredis.from_url(
-            f"redis://{settings.search_cache_redis_host}:{settings.search_cache_redis_port}"
-        )
+            self.redis = aioredis.from_url(
+                f"redis://{settings.search_cache_redis_host}:{settings.search_cache_redis_port}"
+            )
+        self.initialized = True
 
     async def finalize(self) -> None:
-        if self.consumer_task is None:
+        if not self.initialized:
+            return
+        self.initialized = False
+        if self.pubsub is not None and self.subscription_id is not None:
+            await self.pubsub.unsubscribe(self.subscription_id)
+        if self.redis is not None:
+            await self.redis.close(close_connection_pool=True)
+        self.memory.clear()
+
+    async def handle_message(self, raw_data) -> None:
+        if self.pubsub is None:  # pragma: no cover
+            return
+        data = self.pubsub.parse(raw_data)
+        notification = Notification()
+        notification.ParseFromString(data)
+        if notification.action != Notification.Action.COMMIT:
             return
-        self.consumer_task.cancel()
-        await self.redis.close(close_connection_pool=True)
 
-    async def queue_consumer(self) -> None:
-        while True:
-            try:
-                key = await self.queue.get()
-                key = key + "_hits"
-                val = await self.redis.get(key)
-                if val is None:
-                    CACHE_OPS.inc({"type": "miss"})
-                else:
-                    CACHE_OPS.inc({"type": "hit"})
-                    CACHE_HIT_DISTRIBUTION.observe(int(val))
-                await self.redis.incr(key, 1)
-                await self.redis.expire(key, 60 * 60)
-                self.queue.task_done()
-            except (
-                asyncio.CancelledError,
-                asyncio.TimeoutError,
-                RuntimeError,
-            ):
-                return
-            except Exception:  # pragma: no cover
-                logger.exception("Error in queue consumer, retrying...")
-                await asyncio.sleep(1)
+        if notification.write_type == Notification.WriteType.DELETED:
+            await self.invalidate(kbid=notification.kbid, rid=notification.uuid)
+            return
+
+        message = notification.message
+        fields = [et.field for et in message.extracted_text]
+        fields.extend(message.delete_fields)
+        if len(fields) > 0:
+            await self.invalidate(
+                kbid=notification.kbid, rid=notification.uuid, fields=fields
+            )
 
     async def get(
         self,
@@ -128,16 +173,156 @@ class ParagraphsCache:
         kbid: str,
         rid: str,
         field: str,
-        field_id: str,
         start: int,
         end: int,
         split: Optional[str],
     ) -> Optional[str]:
-        if self.consumer_task is None:
+        if not self.initialized:
             return None
-        key = f"{kbid}/{rid}/{field}/{field_id}::{start}-{end}:{split or ''}"
-        self.queue.put_nowait(key)
-        return None
+
+        with GET_PARAGRAPH_LATENCY({"type": "cache"}) as recorder:
+            resource_key = _resource_key(kbid, rid)
+            paragraph_key = _paragraph_key(field, start, end, split)
+
+            paragraphs = self.memory.get(resource_key)
+            if paragraphs is not None and paragraph_key in paragraphs:
+                CACHE_OPS.inc({"type": "hit", "tier": "memory"})
+                return paragraphs[paragraph_key]
+
+            if self.redis is not None:
+                try:
+                    value = await self.redis.hget(
+                        _REDIS_KEY_PREFIX + resource_key, paragraph_key
+                    )
+                except Exception:
+                    logger.warning("Error getting paragraph from redis", exc_info=True)
+                    value = None
+                if value is not None:
+                    text = value.decode()
+                    self._set_memory(resource_key, paragraph_key, text)
+                    CACHE_OPS.inc({"type": "hit", "tier": "redis"})
+                    return text
+
+            CACHE_OPS.inc({"type": "miss"})
+            recorder.set_status("miss")
+            return None
+
+    def fill_token(self, *, kbid: str, rid: str) -> FillToken:
+        """
+        Must be taken before reading the text that will be passed to `set`
+        """
+        resource_key = _resource_key(kbid, rid)
+        token = self.fill_tokens.get(resource_key)
+        if token is None:
+            token = FillToken()
+            self.fill_tokens[resource_key] = token
+        return token
+
+    async def set(
+        self,
+        *,
+        kbid: str,
+        rid: str,
+        field: str,
+        start: int,
+        end: int,
+        split: Optional[str],
+        text: str,
+        token: FillToken,
+    ) -> None:
+        resource_key = _resource_key(kbid, rid)
+        if not self.initialized or self.fill_tokens.get(resource_key) is not token:
+            return
+
+        paragraph_key = _paragraph_key(field, start, end, split)
+        self._set_memory(resource_key, paragraph_key, text)
+
+        if self.redis is not None:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.hset(_REDIS_KEY_PREFIX + resource_key, paragraph_key, text)
+                    pipe.expire(_REDIS_KEY_PREFIX + resource_key, self.ttl)
+                    await pipe.execute()
+                if self.fill_tokens.get(resource_key) is not token:
+                    # invalidated meanwhile, its delete may have run before our
+                    # write reached redis
+                    await self.redis.hdel(
+                        _REDIS_KEY_PREFIX + resource_key, paragraph_key
+                    )
+            except Exception:
+                logger.warning("Error setting paragraph on redis", exc_info=True)
+
+    async def invalidate(
+        self, *, kbid: str, rid: str, fields: Optional[list[FieldID]] = None
+    ) -> None:
+        """
+        Drop cached paragraphs of a resource. If `fields` is provided, only the
+        paragraphs of those fields are dropped.
+        """
+        resource_key = _resource_key(kbid, rid)
+        self.fill_tokens.pop(resource_key, None)
+        if fields is None:
+            if resource_key in self.memory:
+                del self.memory[resource_key]
+            if self.redis is not None:
+                try:
+                    await self.redis.delete(_REDIS_KEY_PREFIX + resource_key)
+                except Exception:
+                    logger.warning("Error deleting paragraphs on redis", exc_info=True)
+            return
+
+        prefixes = tuple(
+            f"/{KB_REVERSE_REVERSE[field.field_type]}/{field.field}::"
+            for field in fields
+        )
+        paragraphs = self.memory.get(resource_key)
+        if paragraphs is not None:
+            remaining = {
+                key: text
+                for key, text in paragraphs.items()
+                if not key.startswith(prefixes)
+            }
+            if len(remaining) > 0:
+                self.memory.set(resource_key, remaining, _size(remaining))
+            else:
+                del self.memory[resource_key]
+
+        if self.redis is not None:
+            try:
+                to_delete = [
+                    key
+                    async for key in self.redis.hscan_iter(
+                        _REDIS_KEY_PREFIX + resource_key
+                    )
+                    if key.decode().startswith(prefixes)
+                ]
+                if len(to_delete) > 0:
+                    await self.redis.hdel(_REDIS_KEY_PREFIX + resource_key, *to_delete)
+            except Exception:
+                logger.warning("Error deleting paragraphs on redis", exc_info=True)
+
+    def _set_memory(self, resource_key: str, paragraph_key: str, text: str) -> None:
+        paragraphs = self.memory.get(resource_key)
+        if paragraphs is None:
+            paragraphs = {}
+        paragraphs[paragraph_key] = text
+        self.memory.set(resource_key, paragraphs, _size(paragraphs))
+
+
+def _resource_key(kbid: str, rid: str) -> str:
+    return f"{kbid}/{rid}"
+
+
+def _paragraph_key(field: str, start: int, end: int, split: Optional[str]) -> str:
+    return f"{field}::{start}-{end}:{split or ''}"
+
+
+def _size(paragraphs: dict[str, str]) -> int:
+    return sum(len(key) + len(text) for key, text in paragraphs.items())
+
+
+def get_paragraphs_cache() -> Optional[ParagraphsCache]:
+    return get_utility(_PARAGRAPHS_CACHE_UTIL)
 
 
 async def initialize_cache() -> None:
@@ -182,36 +367,40 @@ async def get_paragraph_text(
         ResourceORM
     ] = None,  # allow passing in orm_resource to avoid extra DB calls or txn issues
 ) -> str:
-    if orm_resource is None:
-        orm_resource = await get_resource_from_cache(kbid, rid)
-        if orm_resource is None:
-            logger.error(f"{kbid}/{rid}:{field} does not exist on DB")
-            return ""
-
-    _, field_type, field = field.split("/")
-    field_type_int = KB_REVERSE[field_type]
-    field_obj = await orm_resource.get_field(field, field_type_int, load=False)
+    paragraphs_cache = get_paragraphs_cache()
+    text = None
+    if paragraphs_cache is not None:
+        text = await paragraphs_cache.get(
+            kbid=kbid, rid=rid, field=field, start=start, end=end, split=split
+        )
 
-    paragraphs_cache: ParagraphsCache = get_utility(_PARAGRAPHS_CACHE_UTIL)
-    cache_val = (
-        paragraphs_cache is not None
-        and await paragraphs_cache.get(
-            kbid=kbid,
-            rid=rid,
-            field=field,
-            field_id=field_obj.id,
-            start=start,
-            end=end,
-            split=split,
+    if text is None:
+        token = None
+        if paragraphs_cache is not None:
+            token = paragraphs_cache.fill_token(kbid=kbid, rid=rid)
+        if orm_resource is None:
+            orm_resource = await get_resource_from_cache(kbid, rid)
+            if orm_resource is None:
+                logger.error(f"{kbid}/{rid}:{field} does not exist on DB")
+                return ""
+
+        _, field_type, field_name = field.split("/")
+        field_type_int = KB_REVERSE[field_type]
+        field_obj = await orm_resource.get_field(field_name, field_type_int, load=False)
+        text = await get_paragraph_from_full_text(
+            field=field_obj, start=start, end=end, split=split
         )
-        or None
-    )
-    if cache_val is not None:
-        return cache_val
-
-    text = await get_paragraph_from_full_text(
-        field=field_obj, start=start, end=end, split=split
-    )
+        if paragraphs_cache is not None and token is not None:
+            await paragraphs_cache.set(
+                kbid=kbid,
+                rid=rid,
+                field=field,
+                start=start,
+                end=end,
+                split=split,
+                text=text,
+                token=token,
+            )
 
     if highlight:
         text = highlight_paragraph(text, words=matches, ematches=ematches)
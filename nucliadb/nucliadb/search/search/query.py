@@ -17,9 +17,10 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
+import asyncio
 import re
 from datetime import datetime
-from typing import List, Optional, Tuple
+from typing import Awaitable, List, Optional, Tuple
 
 from fastapi import HTTPException
 from nucliadb_protos.nodereader_pb2 import (
@@ -32,7 +33,9 @@ from nucliadb_protos.utils_pb2 import RelationNode
 
 from nucliadb.search import logger
 from nucliadb.search.predict import PredictVectorMissing, SendToPredictError
+from nucliadb.search.search.metrics import query_step_observer
 from nucliadb.search.search.synonyms import apply_synonyms_to_request
+from nucliadb.search.settings import settings
 from nucliadb.search.utilities import get_predict
 from nucliadb_models.metadata import ResourceProcessingStatus
 from nucliadb_models.search import (
@@ -76,7 +79,8 @@ async def global_query_to_pb(
     :return: (request, incomplete, autofilters)
         where:
             - request: protobuf SearchRequest object
-            - incomplete: If the query is incomplete (missing vectors)
+            - incomplete: If the query is incomplete (missing vectors or an
+              enrichment step that timed out)
             - autofilters: The autofilters that were applied
     """
     fields = fields or []
@@ -125,22 +129,6 @@ async def global_query_to_pb(
     request.document = SearchOptions.DOCUMENT in features
     request.paragraph = SearchOptions.PARAGRAPH in features
 
-    incomplete = False
-    if SearchOptions.VECTOR in features:
-        incomplete = await _parse_vectors(
-            request, kbid, query, user_vector=user_vector, vectorset=vectorset
-        )
-
-    relations_search = SearchOptions.RELATIONS in features
-    if relations_search or autofilter:
-        detected_entities = await detect_entities(kbid, query)
-        if relations_search:
-            request.relation_subgraph.entry_points.extend(detected_entities)
-            request.relation_subgraph.depth = 1
-        if autofilter:
-            entity_filters = parse_entities_to_filters(request, detected_entities)
-            autofilters.extend(entity_filters)
-
     if with_synonyms:
         if advanced_query:
             raise HTTPException(
@@ -152,11 +140,81 @@ async def global_query_to_pb(
                 status_code=422,
                 detail="Search with custom synonyms is only supported on paragraph and document search",
             )
-        await apply_synonyms_to_request(request, kbid)
+
+    # Enrichment steps are independent from each other (they fill different
+    # parts of the request), so they all run at the same time
+    steps: List[Tuple[str, Awaitable]] = []
+    if SearchOptions.VECTOR in features:
+        steps.append(
+            (
+                "vectors",
+                _parse_vectors(
+                    request, kbid, query, user_vector=user_vector, vectorset=vectorset
+                ),
+            )
+        )
+
+    relations_search = SearchOptions.RELATIONS in features
+    if relations_search or autofilter:
+        steps.append(
+            (
+                "entities",
+                _parse_entities(
+                    request,
+                    kbid,
+                    query,
+                    relations_search=relations_search,
+                    autofilter=autofilter,
+                    autofilters=autofilters,
+                ),
+            )
+        )
+
+    if with_synonyms:
+        steps.append(("synonyms", apply_synonyms_to_request(request, kbid)))
+
+    incomplete = False
+    if len(steps) > 0:
+        results = await asyncio.gather(*[_run_step(name, step) for name, step in steps])
+        incomplete = any(results)
 
     return request, incomplete, autofilters
 
 
+async def _run_step(name: str, step: Awaitable) -> bool:
+    """
+    Run a query enrichment step within its time budget. Returns whether the
+    query is incomplete because of the step.
+    """
+    with query_step_observer({"step": name}) as recorder:
+        try:
+            incomplete = await asyncio.wait_for(
+                step, timeout=settings.search_query_step_timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"Timeout on query {name} step, skipping it")
+            recorder.set_status("timeout")
+            return True
+    return bool(incomplete)
+
+
+async def _parse_entities(
+    request: SearchRequest,
+    kbid: str,
+    query: str,
+    relations_search: bool,
+    autofilter: bool,
+    autofilters: List[str],
+) -> None:
+    detected_entities = await detect_entities(kbid, query)
+    if relations_search:
+        request.relation_subgraph.entry_points.extend(detected_entities)
+        request.relation_subgraph.depth = 1
+    if autofilter:
+        entity_filters = parse_entities_to_filters(request, detected_entities)
+        autofilters.extend(entity_filters)
+
+
 async def _parse_vectors(
     request: SearchRequest,
     kbid: str,
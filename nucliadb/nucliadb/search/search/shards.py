@@ -17,7 +17,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
-from typing import Optional
+from typing import List, Optional
 
 from nucliadb_protos.nodereader_pb2 import (
     GetShardRequest,
@@ -33,6 +33,7 @@ from nucliadb_protos.nodereader_pb2 import (
 from nucliadb_protos.noderesources_pb2 import Shard
 
 from nucliadb.common.cluster.abc import AbstractIndexNode
+from nucliadb.common.cluster.stats import track_node_request
 from nucliadb_telemetry import metrics
 
 node_observer = metrics.Observer("node_client", labels={"type": ""})
@@ -44,10 +45,22 @@ async def query_shard(
     req = SearchRequest()
     req.CopyFrom(query)
     req.shard = shard
-    with node_observer({"type": "search"}):
+    with node_observer({"type": "search"}), track_node_request(node.id, "search"):
         return await node.reader.Search(req)  # type: ignore
 
 
+async def query_local_shards(
+    node: AbstractIndexNode, shards: List[str], query: SearchRequest
+) -> List[SearchResponse]:
+    """
+    Search several shards of an in-process (standalone) node at once
+    """
+    with node_observer({"type": "search_many"}), track_node_request(
+        node.id, "search_many"
+    ):
+        return await node.reader.SearchMany(shards, query)  # type: ignore
+
+
 async def get_shard(
     node: AbstractIndexNode, shard_id: str, vectorset: Optional[str] = None
 ) -> Shard:
@@ -65,7 +78,9 @@ async def query_paragraph_shard(
     req = ParagraphSearchRequest()
     req.CopyFrom(query)
     req.id = shard
-    with node_observer({"type": "paragraph_search"}):
+    with node_observer({"type": "paragraph_search"}), track_node_request(
+        node.id, "paragraph_search"
+    ):
         return await node.reader.ParagraphSearch(req)  # type: ignore
 
 
@@ -75,7 +90,7 @@ async def suggest_shard(
     req = SuggestRequest()
     req.CopyFrom(query)
     req.shard = shard
-    with node_observer({"type": "suggest"}):
+    with node_observer({"type": "suggest"}), track_node_request(node.id, "suggest"):
         return await node.reader.Suggest(req)  # type: ignore
 
 
@@ -85,5 +100,7 @@ async def relations_shard(
     req = RelationSearchRequest()
     req.CopyFrom(query)
     req.shard_id = shard
-    with node_observer({"type": "relation_search"}):
+    with node_observer({"type": "relation_search"}), track_node_request(
+        node.id, "relation_search"
+    ):
         return await node.reader.RelationSearch(req)  # type: ignore
@@ -24,9 +24,20 @@ from nucliadb.ingest.settings import DriverSettings
 
 class Settings(DriverSettings):
     search_timeout: float = 10.0
+    search_query_step_timeout: float = 5.0
+    search_hedged_requests: bool = False
+    search_hedge_percentile: float = 95.0
+    # Merge the shards answering in time instead of failing the whole query
+    search_partial_results: bool = False
+    search_shard_timeout: Optional[float] = None
 
     search_cache_redis_host: Optional[str] = None
     search_cache_redis_port: Optional[int] = None
+    search_cache_paragraphs_memory_size: int = 64 * 1024 * 1024
+    search_cache_paragraphs_ttl: int = 60 * 60
+    search_cache_resource_ttl: int = 60 * 5
+    search_cache_predict_memory_size: int = 16 * 1024 * 1024
+    search_cache_predict_ttl: int = 60 * 10
 
 
 settings = Settings()
@@ -17,11 +17,16 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
-import asyncio
 import uuid
+from unittest.mock import AsyncMock
 
 import pytest
-from nucliadb_protos.resources_pb2 import Basic, ExtractedTextWrapper
+from nucliadb_protos.resources_pb2 import (
+    Basic,
+    ExtractedTextWrapper,
+    FieldID,
+    FieldType,
+)
 from nucliadb_protos.utils_pb2 import ExtractedText
 from redis import asyncio as aioredis
 
@@ -38,7 +43,7 @@ async def paragraph_cache(redis):
     driver = aioredis.from_url(f"redis://{redis[0]}:{redis[1]}")
     await driver.flushall()
 
-    cache = paragraphs.ParagraphsCache()
+    cache = paragraphs.ParagraphsCache(pubsub=AsyncMock())
     await cache.initialize()
     yield cache
     await cache.finalize()
@@ -47,48 +52,91 @@ async def paragraph_cache(redis):
     await driver.close(close_connection_pool=True)
 
 
-async def wait_for_queue(paragraph_cache: paragraphs.ParagraphsCache):
-    while paragraph_cache.queue.qsize() > 0:
-        await asyncio.sleep(0.01)
-
-
 async def test_get_paragraph_cache_metrics(paragraph_cache: paragraphs.ParagraphsCache):
     try:
         paragraphs.CACHE_OPS.counter.clear()
-        paragraphs.CACHE_HIT_DISTRIBUTION.histo.clear()
     except AttributeError:  # pragma: no cover
         # when no metrics are registered, this will fail
         pass
 
     assert (
         await paragraph_cache.get(
-            kbid="1", rid="1", field="1", field_id="field_id", start=0, end=0, split="1"
+            kbid="1", rid="1", field="/t/1", start=0, end=0, split="1"
         )
         is None
     )
-    # RIGHT NOW IT SHOULD ALWAYS BE NONE! No Cache implemented yet!
+    token = paragraph_cache.fill_token(kbid="1", rid="1")
+    await paragraph_cache.set(
+        kbid="1",
+        rid="1",
+        field="/t/1",
+        start=0,
+        end=0,
+        split="1",
+        text="Hello",
+        token=token,
+    )
+    # drop memory tier, value must come from redis
+    paragraph_cache.memory.clear()
     assert (
         await paragraph_cache.get(
-            kbid="1", rid="1", field="1", field_id="field_id", start=0, end=0, split="1"
+            kbid="1", rid="1", field="/t/1", start=0, end=0, split="1"
         )
-        is None
+        == "Hello"
+    )
+    assert (
+        await paragraph_cache.get(
+            kbid="1", rid="1", field="/t/1", start=0, end=0, split="1"
+        )
+        == "Hello"
     )
 
-    await wait_for_queue(paragraph_cache)
-
+    samples = paragraphs.CACHE_OPS.counter.collect()[0].samples  # type: ignore
+    assert [samp for samp in samples if samp.labels["type"] == "miss"][0].value == 1.0
     assert [
         samp
-        for samp in paragraphs.CACHE_OPS.counter.collect()[0].samples  # type: ignore
-        if samp.labels["type"] == "miss"
+        for samp in samples
+        if samp.labels["type"] == "hit" and samp.labels["tier"] == "redis"
     ][0].value == 1.0
-
     assert [
         samp
-        for samp in paragraphs.CACHE_OPS.counter.collect()[0].samples  # type: ignore
-        if samp.labels["type"] == "hit"
+        for samp in samples
+        if samp.labels["type"] == "hit" and samp.labels["tier"] == "memory"
     ][0].value == 1.0
 
 
+async def test_invalidate_redis_field(paragraph_cache: paragraphs.ParagraphsCache):
+    for field in ("/t/1", "/t/2"):
+        token = paragraph_cache.fill_token(kbid="1", rid="1")
+        await paragraph_cache.set(
+            kbid="1",
+            rid="1",
+            field=field,
+            start=0,
+            end=5,
+            split=None,
+            text="Hello",
+            token=token,
+        )
+    await paragraph_cache.invalidate(
+        kbid="1", rid="1", fields=[FieldID(field_type=FieldType.TEXT, field="1")]
+    )
+    paragraph_cache.memory.clear()
+
+    assert (
+        await paragraph_cache.get(
+            kbid="1", rid="1", field="/t/1", start=0, end=5, split=None
+        )
+        is None
+    )
+    assert (
+        await paragraph_cache.get(
+            kbid="1", rid="1", field="/t/2", start=0, end=5, split=None
+        )
+        == "Hello"
+    )
+
+
 async def test_get_paragraph_text(
     gcs_storage, cache, txn, fake_node, processor, knowledgebox_ingest
 ):
@@ -17,12 +17,16 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
-from unittest.mock import Mock
+import asyncio
+from unittest.mock import Mock, patch
 
+import pytest
 from fastapi import HTTPException
 from grpc import StatusCode
 from grpc.aio import AioRpcError  # type: ignore
 
+from nucliadb.common.cluster import stats
+from nucliadb.common.cluster.standalone.index_node import StandaloneIndexNode
 from nucliadb.search.requesters import utils
 
 
@@ -56,3 +60,143 @@ def test_validate_node_query_results_invalid_query():
     assert isinstance(result, HTTPException)
     assert result.status_code == 412
     assert result.detail == "Query is invalid. AllButQueryForbidden"
+
+
+@pytest.fixture()
+def nodes_stats():
+    with patch.object(stats, "NODES_STATS", new={}):
+        yield
+
+
+async def test_hedged_query_uses_fastest_answer(nodes_stats):
+    for _ in range(stats.MIN_PERCENTILE_SAMPLES):
+        stats.get_node_stats("node-1").observe(0.01, error=False, request_type="search")
+
+    cancelled = []
+
+    async def query(node, shard_id, pb_query):
+        try:
+            await asyncio.sleep(10 if node == "slow" else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(node)
+            raise
+        return node
+
+    candidates = [("slow", "shard-1", "node-1"), ("fast", "shard-2", "node-2")]
+    assert await utils.hedged_query(query, candidates, Mock(), "search") == "fast"
+    await asyncio.sleep(0)
+    assert cancelled == ["slow"]
+
+
+async def test_hedged_query_without_stats_does_not_hedge(nodes_stats):
+    queried = []
+
+    async def query(node, shard_id, pb_query):
+        queried.append(node)
+        await asyncio.sleep(0.01)
+        return node
+
+    candidates = [("node", "shard-1", "node-1"), ("other", "shard-2", "node-2")]
+    assert await utils.hedged_query(query, candidates, Mock(), "search") == "node"
+    assert queried == ["node"]
+
+
+async def test_query_shards_with_deadline_cancels_late_shards():
+    cancelled = []
+
+    async def query(delay):
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(delay)
+            raise
+        return delay
+
+    with patch.object(utils.settings, "search_shard_timeout", 0.05):
+        results = await utils.query_shards_with_deadline([query(0), query(10)])
+    assert results[0] == 0
+    assert isinstance(results[1], asyncio.TimeoutError)
+    assert cancelled == [10]
+
+
+def test_split_partial_results():
+    response = Mock()
+    results, nodes, shards, incomplete = utils.split_partial_results(
+        [response, asyncio.TimeoutError(), Exception()],
+        [("node", "s1", "n1"), ("node", "s2", "n2"), ("node", "s3", "n3")],
+        ["s1", "s2", "s3"],
+    )
+    assert results == [response]
+    assert nodes == [
+        ("node", "s1", "n1"),
+        ("node:timeout", "s2", "n2"),
+        ("node:error", "s3", "n3"),
+    ]
+    assert shards == ["s1"]
+    assert incomplete
+
+
+def test_split_partial_results_all_failed():
+    error = Exception()
+    results, _, shards, incomplete = utils.split_partial_results(
+        [error], [("node", "s1", "n1")], ["s1"]
+    )
+    assert results == [error]
+    assert shards == ["s1"]
+    assert not incomplete
+    assert isinstance(utils.validate_node_query_results(results), HTTPException)
+
+
+def test_split_partial_results_cancelled_shard():
+    response = Mock()
+    results, nodes, shards, incomplete = utils.split_partial_results(
+        [response, asyncio.CancelledError()],
+        [("node", "s1", "n1"), ("node", "s2", "n2")],
+        ["s1", "s2"],
+    )
+    assert results == [response]
+    assert nodes == [("node", "s1", "n1"), ("node:error", "s2", "n2")]
+    assert shards == ["s1"]
+    assert incomplete
+
+
+def test_validate_node_query_results_cancelled():
+    error = utils.validate_node_query_results([asyncio.CancelledError()])
+    assert isinstance(error, HTTPException)
+
+
+def test_get_local_node():
+    local = Mock(spec=StandaloneIndexNode)
+    remote = Mock()
+    shards = [[(local, "s1", "n1")], [(local, "s2", "n1")]]
+
+    assert utils.get_local_node(utils.Method.SEARCH, shards) is local
+    assert utils.get_local_node(utils.Method.SUGGEST, shards) is None
+    assert utils.get_local_node(utils.Method.SEARCH, shards[:1]) is None
+    assert (
+        utils.get_local_node(
+            utils.Method.SEARCH, [[(local, "s1", "n1")], [(remote, "s2", "n2")]]
+        )
+        is None
+    )
+    assert (
+        utils.get_local_node(
+            utils.Method.SEARCH, [[(remote, "s1", "n2")], [(remote, "s2", "n2")]]
+        )
+        is None
+    )
+
+
+def test_expand_local_results():
+    responses = [Mock(), Mock()]
+    assert utils.expand_local_results([responses], 2) == responses
+
+    error = asyncio.TimeoutError()
+    assert utils.expand_local_results([error], 2) == [error, error]
+
+    # shards failing on their own keep their error
+    shard_error = TypeError("Error loading shard")
+    assert utils.expand_local_results([[responses[0], shard_error]], 2) == [
+        responses[0],
+        shard_error,
+    ]
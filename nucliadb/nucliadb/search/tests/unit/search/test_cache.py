@@ -0,0 +1,211 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from nucliadb_protos.resources_pb2 import (
+    AllFieldIDs,
+    Basic,
+    FieldComputedMetadata,
+    FieldID,
+    FieldText,
+    FieldType,
+    Origin,
+)
+from nucliadb_protos.utils_pb2 import ExtractedText
+
+from nucliadb.ingest.orm.resource import Resource as ResourceORM
+from nucliadb.search.search import cache
+from nucliadb.search.settings import settings
+from nucliadb_utils.cache.utility import Cache
+
+try:
+    from memorylru import LRU  # type: ignore
+except ImportError:  # pragma: no cover
+    from lru import LRU  # type: ignore
+
+
+@pytest.fixture()
+def cache_utility():
+    pubsub = AsyncMock()
+    pubsub.parse = lambda x: x
+    utility = Cache(pubsub=pubsub)
+    utility._memory_cache = LRU(1024 * 1024)
+    with patch("nucliadb.search.search.cache.get_cache", return_value=utility):
+        yield utility
+
+
+@pytest.fixture()
+def kb():
+    mock = MagicMock(kbid="kbid")
+    mock.get = AsyncMock()
+    with patch("nucliadb.search.search.cache.KnowledgeBoxORM", return_value=mock):
+        yield mock
+
+
+@pytest.fixture(autouse=True)
+def txn():
+    txn = AsyncMock()
+    with patch("nucliadb.search.search.cache.get_transaction", return_value=txn), patch(
+        "nucliadb.search.search.cache.get_storage"
+    ):
+        yield txn
+
+
+def orm_resource(kb) -> ResourceORM:
+    resource = ResourceORM(
+        txn=AsyncMock(), storage=AsyncMock(), kb=kb, uuid="rid", basic=Basic(title="T")
+    )
+    resource.all_fields_keys = [(FieldType.TEXT, "text")]
+    field = resource.fields[(FieldType.TEXT, "text")] = MagicMock()
+    field.extracted_text = ExtractedText(text="Hello")
+    field.computed_metadata = FieldComputedMetadata()
+    return resource
+
+
+async def test_snapshot_is_used_on_next_requests(cache_utility, kb):
+    kb.get.return_value = orm_resource(kb)
+
+    cache.get_resource_cache(clear=True)
+    assert await cache.get_resource_from_cache("kbid", "rid") is kb.get.return_value
+    await cache.store_resources_snapshots("kbid")
+    kb.get.assert_awaited_once()
+
+    # new request
+    cache.get_resource_cache(clear=True)
+    resource = await cache.get_resource_from_cache("kbid", "rid")
+    kb.get.assert_awaited_once()
+
+    assert resource is not None
+    assert (await resource.get_basic()).title == "T"
+    assert await resource.get_fields_ids() == [(FieldType.TEXT, "text")]
+    field = await resource.get_field("text", FieldType.TEXT, load=False)
+    assert (await field.get_extracted_text()).text == "Hello"
+    assert await field.get_field_metadata() == FieldComputedMetadata()
+
+
+async def test_invalidated_snapshot_is_not_used(cache_utility, kb):
+    kb.get.return_value = orm_resource(kb)
+
+    cache.get_resource_cache(clear=True)
+    await cache.get_resource_from_cache("kbid", "rid")
+    await cache.store_resources_snapshots("kbid")
+
+    cache_utility.invalidate(b'{"keys": ["kb_kbid_resource_rid"], "origin": "ingest"}')
+
+    cache.get_resource_cache(clear=True)
+    await cache.get_resource_from_cache("kbid", "rid")
+    assert kb.get.await_count == 2
+
+
+async def test_snapshot_not_stored_if_invalidated_while_loading(cache_utility, kb):
+    kb.get.return_value = orm_resource(kb)
+
+    cache.get_resource_cache(clear=True)
+    await cache.get_resource_from_cache("kbid", "rid")
+    cache_utility.invalidate(b'{"keys": ["kb_kbid_resource_rid"], "origin": "ingest"}')
+    await cache.store_resources_snapshots("kbid")
+
+    assert await cache_utility.get("kb_kbid_resource_rid") is None
+
+
+async def test_stored_snapshots_are_not_modified(cache_utility, kb):
+    kb.get.return_value = orm_resource(kb)
+
+    cache.get_resource_cache(clear=True)
+    await cache.get_resource_from_cache("kbid", "rid")
+    await cache.store_resources_snapshots("kbid")
+    snapshot = await cache_utility.get("kb_kbid_resource_rid")
+
+    cache.get_resource_cache(clear=True)
+    resource = await cache.get_resource_from_cache("kbid", "rid")
+    field = resource.fields[(FieldType.TEXT, "other")] = MagicMock()
+    field.extracted_text = ExtractedText(text="Other")
+    field.computed_metadata = None
+    await cache.store_resources_snapshots("kbid")
+
+    assert list(snapshot.extracted_texts.keys()) == [(FieldType.TEXT, "text")]
+    new_snapshot = await cache_utility.get("kb_kbid_resource_rid")
+    assert new_snapshot is not snapshot
+    assert new_snapshot.created == snapshot.created
+    assert set(new_snapshot.extracted_texts.keys()) == {
+        (FieldType.TEXT, "text"),
+        (FieldType.TEXT, "other"),
+    }
+
+
+async def test_expired_snapshot_is_not_used(cache_utility, kb):
+    kb.get.return_value = orm_resource(kb)
+
+    cache.get_resource_cache(clear=True)
+    await cache.get_resource_from_cache("kbid", "rid")
+    await cache.store_resources_snapshots("kbid")
+
+    with patch.object(settings, "search_cache_resource_ttl", -1):
+        cache.get_resource_cache(clear=True)
+        await cache.get_resource_from_cache("kbid", "rid")
+    assert kb.get.await_count == 2
+
+
+async def test_no_cache_utility(kb):
+    kb.get.return_value = orm_resource(kb)
+    with patch("nucliadb.search.search.cache.get_cache", return_value=None):
+        cache.get_resource_cache(clear=True)
+        await cache.get_resource_from_cache("kbid", "rid")
+        await cache.store_resources_snapshots("kbid")
+
+        cache.get_resource_cache(clear=True)
+        await cache.get_resource_from_cache("kbid", "rid")
+    assert kb.get.await_count == 2
+
+
+async def test_prefetch_resources(txn, kb):
+    maindb = {
+        "/kbs/kbid/r/rid": Basic(title="T").SerializeToString(),
+        "/kbs/kbid/r/rid/allfields": AllFieldIDs(
+            fields=[FieldID(field_type=FieldType.TEXT, field="text")]
+        ).SerializeToString(),
+        "/kbs/kbid/r/rid/origin": Origin(url="https://nuclia.com").SerializeToString(),
+        "/kbs/kbid/r/rid/f/t/text": FieldText(body="Hello").SerializeToString(),
+    }
+    txn.batch_get.side_effect = lambda keys: [maindb.get(key) for key in keys]
+
+    cache.get_resource_cache(clear=True)
+    with patch("nucliadb.search.search.cache.get_cache", return_value=None):
+        round_trips = await cache.prefetch_resources(
+            "kbid", ["rid", "missing", "rid"], origin=True, fields=True
+        )
+    assert round_trips == 2
+    txn.get.assert_not_awaited()
+
+    resource = await cache.get_resource_from_cache("kbid", "rid")
+    kb.get.assert_not_awaited()
+    assert resource is not None
+    assert resource.basic.title == "T"
+    assert resource.origin.url == "https://nuclia.com"
+    assert await resource.get_fields_ids() == [
+        (FieldType.TEXT, "text"),
+        (FieldType.GENERIC, "title"),
+    ]
+    field = await resource.get_field("text", FieldType.TEXT)
+    assert (await field.get_value()).body == "Hello"
+    txn.get.assert_not_awaited()
+
+    # already prefetched resources are not asked again
+    assert await cache.prefetch_resources("kbid", ["rid"], fields=True) == 0
@@ -0,0 +1,95 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+from nucliadb_protos.nodereader_pb2 import DocumentResult
+from nucliadb_protos.resources_pb2 import Basic
+
+from nucliadb.search.search import merge
+from nucliadb_models.search import SortField, SortOptions, SortOrder
+
+
+@pytest.fixture()
+def resource_cache():
+    resource_cache = {}
+    with patch.object(merge, "get_resource_cache", return_value=resource_cache):
+        yield resource_cache
+
+
+@pytest.fixture()
+def prefetch_resources(resource_cache):
+    prefetched = []
+
+    async def prefetch(kbid, uuids):
+        prefetched.append(uuids)
+        for uuid in uuids:
+            if uuid != "deleted":
+                resource_cache.setdefault(
+                    uuid, MagicMock(basic=Basic(title=uuid.upper()))
+                )
+
+    with patch.object(merge, "prefetch_resources", side_effect=prefetch):
+        yield prefetched
+
+
+def result(uuid: str, bm25: float = 0) -> DocumentResult:
+    pb = DocumentResult(uuid=uuid)
+    pb.score.bm25 = bm25
+    return pb
+
+
+async def test_rank_results_by_score_only_loads_picked_resources(prefetch_resources):
+    results = [result(f"r{index}", bm25=index) for index in range(10)]
+    sort = SortOptions(field=SortField.SCORE, order=SortOrder.DESC)
+
+    ranked = await merge.rank_results(results, sort, "kbid", 3)
+
+    assert [item.uuid for item, _ in ranked] == ["r9", "r8", "r7"]
+    assert prefetch_resources == [["r9", "r8", "r7"]]
+
+
+async def test_rank_results_by_score_skips_deleted_resources(prefetch_resources):
+    results = [result("r1", bm25=1), result("deleted", bm25=3), result("r2", bm25=2)]
+    sort = SortOptions(field=SortField.SCORE, order=SortOrder.DESC)
+
+    ranked = await merge.rank_results(results, sort, "kbid", 2)
+
+    assert [item.uuid for item, _ in ranked] == ["r2", "r1"]
+
+
+async def test_rank_results_by_basic_field(prefetch_resources, resource_cache):
+    results = [result("b"), result("deleted"), result("c"), result("a")]
+    sort = SortOptions(field=SortField.TITLE, order=SortOrder.ASC)
+
+    ranked = await merge.rank_results(results, sort, "kbid", 2)
+
+    assert ranked == [(results[3], "A"), (results[0], "B")]
+    assert prefetch_resources == [["b", "deleted", "c", "a"]]
+
+
+def test_basic_score():
+    basic = Basic(title="Title")
+    basic.created.FromDatetime(datetime.datetime(2023, 1, 1))
+    basic.modified.FromDatetime(datetime.datetime(2023, 2, 1))
+
+    assert merge.basic_score(basic, SortField.TITLE) == "Title"
+    assert merge.basic_score(basic, SortField.CREATED) == datetime.datetime(2023, 1, 1)
+    assert merge.basic_score(basic, SortField.MODIFIED) == datetime.datetime(2023, 2, 1)
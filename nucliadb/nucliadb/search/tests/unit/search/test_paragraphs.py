@@ -20,7 +20,9 @@
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
+from nucliadb_protos.resources_pb2 import ExtractedTextWrapper, FieldID, FieldType
 from nucliadb_protos.utils_pb2 import ExtractedText
+from nucliadb_protos.writer_pb2 import BrokerMessage, Notification
 
 from nucliadb.search.search import paragraphs
 
@@ -89,6 +91,7 @@ class TestGetParagraphText:
     def pcache(self):
         mock = AsyncMock()
         mock.get.return_value = None
+        mock.fill_token = MagicMock()
         with patch("nucliadb.search.search.paragraphs.get_utility", return_value=mock):
             yield mock
 
@@ -110,6 +113,8 @@ class TestGetParagraphText:
 
         orm_resource.get_field.assert_called_once_with("text", 4, load=False)
         pcache.get.assert_called_once()
+        pcache.fill_token.assert_called_once_with(kbid="kbid", rid="rid")
+        assert pcache.set.call_args.kwargs["token"] is pcache.fill_token.return_value
 
     async def test_get_paragraph_text_with_pcache(self, orm_resource, pcache):
         pcache.get.return_value = "Cached Value!"
@@ -127,3 +132,138 @@ class TestGetParagraphText:
             )
             == "Cached Value!"
         )
+        orm_resource.get_field.assert_not_called()
+        pcache.set.assert_not_called()
+
+
+class TestParagraphsCache:
+    @pytest.fixture()
+    def pubsub(self):
+        mock = AsyncMock()
+        mock.parse = lambda x: x
+        yield mock
+
+    @pytest.fixture()
+    async def pcache(self, pubsub):
+        cache = paragraphs.ParagraphsCache(pubsub=pubsub)
+        await cache.initialize()
+        yield cache
+        await cache.finalize()
+
+    async def _set(self, pcache, field="/t/text", text="Hello", token=None):
+        if token is None:
+            token = pcache.fill_token(kbid="kbid", rid="rid")
+        await pcache.set(
+            kbid="kbid",
+            rid="rid",
+            field=field,
+            start=0,
+            end=5,
+            split=None,
+            text=text,
+            token=token,
+        )
+
+    async def _get(self, pcache, field="/t/text"):
+        return await pcache.get(
+            kbid="kbid", rid="rid", field=field, start=0, end=5, split=None
+        )
+
+    async def test_subscribes_to_notifications(self, pcache, pubsub):
+        pubsub.subscribe.assert_called_once()
+        assert pubsub.subscribe.call_args.kwargs["key"] == "notify.*"
+
+    async def test_get_set(self, pcache):
+        assert await self._get(pcache) is None
+        await self._set(pcache)
+        assert await self._get(pcache) == "Hello"
+        assert await self._get(pcache, field="/t/other") is None
+
+    async def test_disabled_without_pubsub(self):
+        with patch.object(paragraphs.cache_settings, "cache_enabled", False):
+            pcache = paragraphs.ParagraphsCache()
+            await pcache.initialize()
+        await self._set(pcache)
+        assert await self._get(pcache) is None
+
+    async def test_memory_size_bounded(self, pubsub):
+        pcache = paragraphs.ParagraphsCache(pubsub=pubsub, memory_size=100)
+        await pcache.initialize()
+        await self._set(pcache, text="x" * 200)
+        assert await self._get(pcache) is None
+
+    async def test_invalidate_on_extracted_text_commit(self, pcache):
+        await self._set(pcache)
+        await self._set(pcache, field="/f/file", text="File!")
+
+        notification = Notification(
+            kbid="kbid",
+            uuid="rid",
+            action=Notification.Action.COMMIT,
+            write_type=Notification.WriteType.MODIFIED,
+            message=BrokerMessage(
+                extracted_text=[
+                    ExtractedTextWrapper(
+                        field=FieldID(field_type=FieldType.TEXT, field="text")
+                    )
+                ]
+            ),
+        )
+        await pcache.handle_message(notification.SerializeToString())
+
+        assert await self._get(pcache) is None
+        assert await self._get(pcache, field="/f/file") == "File!"
+
+    async def test_invalidate_on_resource_deleted(self, pcache):
+        await self._set(pcache)
+
+        notification = Notification(
+            kbid="kbid",
+            uuid="rid",
+            action=Notification.Action.COMMIT,
+            write_type=Notification.WriteType.DELETED,
+        )
+        await pcache.handle_message(notification.SerializeToString())
+
+        assert await self._get(pcache) is None
+
+    async def test_ignore_other_notifications(self, pcache):
+        await self._set(pcache)
+
+        notification = Notification(
+            kbid="kbid", uuid="rid", action=Notification.Action.INDEXED
+        )
+        await pcache.handle_message(notification.SerializeToString())
+
+        assert await self._get(pcache) == "Hello"
+
+    async def test_set_skipped_after_invalidation(self, pcache):
+        token = pcache.fill_token(kbid="kbid", rid="rid")
+        await pcache.invalidate(kbid="kbid", rid="rid")
+
+        await self._set(pcache, token=token)
+
+        assert await self._get(pcache) is None
+
+    async def test_redis_set_undone_if_invalidated_meanwhile(self, pcache):
+        pcache.redis = MagicMock()
+        pipe = pcache.redis.pipeline.return_value.__aenter__.return_value
+
+        async def execute():
+            await pcache.invalidate(kbid="kbid", rid="rid")
+
+        pipe.execute = execute
+        pcache.redis.delete = AsyncMock()
+        pcache.redis.hdel = AsyncMock()
+
+        await self._set(pcache)
+
+        pcache.redis.hdel.assert_called_once_with(
+            "paragraphs/kbid/rid", "/t/text::0-5:"
+        )
+
+    async def test_invalidate_ignores_redis_errors(self, pcache):
+        pcache.redis = MagicMock()
+        pcache.redis.delete = AsyncMock(side_effect=Exception())
+
+        await pcache.invalidate(kbid="kbid", rid="rid")
@@ -16,17 +16,24 @@
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
+import asyncio
+from unittest.mock import AsyncMock, patch
 
+import pytest
 from nucliadb_protos.nodereader_pb2 import SearchRequest
 from nucliadb_protos.utils_pb2 import RelationNode
 
-from nucliadb.search.search.query import parse_entities_to_filters
+from nucliadb.search.search.query import global_query_to_pb, parse_entities_to_filters
+from nucliadb.search.settings import settings
+from nucliadb_models.search import SearchOptions
+
+DETECTED_ENTITIES = [
+    RelationNode(value="John", ntype=RelationNode.NodeType.ENTITY, subtype="person")
+]
 
 
 def test_parse_entities_to_filters():
-    detected_entities = [
-        RelationNode(value="John", ntype=RelationNode.NodeType.ENTITY, subtype="person")
-    ]
+    detected_entities = DETECTED_ENTITIES
 
     request = SearchRequest()
     assert parse_entities_to_filters(request, detected_entities) == ["/e/person/John"]
@@ -34,3 +41,66 @@ def test_parse_entities_to_filters():
 
     assert parse_entities_to_filters(request, detected_entities) == []
     assert request.filter.tags == ["/e/person/John"]
+
+
+@pytest.fixture()
+def predict():
+    predict = AsyncMock()
+    with patch("nucliadb.search.search.query.get_predict", return_value=predict):
+        yield predict
+
+
+async def query_to_pb(**kwargs):
+    return await global_query_to_pb(
+        kbid="kbid",
+        query="query",
+        filters=[],
+        faceted=[],
+        page_number=0,
+        page_size=20,
+        sort=None,
+        **kwargs,
+    )
+
+
+async def test_global_query_to_pb_runs_enrichment_steps_concurrently(predict):
+    started = []
+
+    async def convert_sentence_to_vector(kbid, query):
+        started.append("vectors")
+        await asyncio.sleep(0.1)
+        return [0.1, 0.2]
+
+    async def detect_entities(kbid, query):
+        started.append("entities")
+        # both steps have started before any of them finishes
+        await asyncio.sleep(0.1)
+        assert started == ["vectors", "entities"]
+        return DETECTED_ENTITIES
+
+    predict.convert_sentence_to_vector.side_effect = convert_sentence_to_vector
+    predict.detect_entities.side_effect = detect_entities
+
+    request, incomplete, autofilters = await query_to_pb(
+        features=[SearchOptions.VECTOR, SearchOptions.RELATIONS], autofilter=True
+    )
+    assert not incomplete
+    assert list(request.vector) == pytest.approx([0.1, 0.2])
+    assert len(request.relation_subgraph.entry_points) == 1
+    assert autofilters == ["/e/person/John"]
+
+
+async def test_global_query_to_pb_step_timeout(predict):
+    async def convert_sentence_to_vector(kbid, query):
+        await asyncio.sleep(1)
+
+    predict.convert_sentence_to_vector.side_effect = convert_sentence_to_vector
+    predict.detect_entities.return_value = DETECTED_ENTITIES
+
+    with patch.object(settings, "search_query_step_timeout", 0.05):
+        request, incomplete, autofilters = await query_to_pb(
+            features=[SearchOptions.VECTOR], autofilter=True
+        )
+    assert incomplete
+    assert len(request.vector) == 0
+    assert autofilters == ["/e/person/John"]
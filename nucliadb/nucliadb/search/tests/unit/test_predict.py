@@ -17,6 +17,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
+import asyncio
 from unittest.mock import AsyncMock, MagicMock, Mock
 
 import pytest
@@ -24,6 +25,7 @@ import pytest
 from nucliadb.search.predict import (
     DummyPredictEngine,
     PredictEngine,
+    PredictQueryCache,
     PredictVectorMissing,
     SendToPredictError,
 )
@@ -284,3 +286,61 @@ async def test_convert_sentence_to_vector_empty_vectors():
     )
     with pytest.raises(PredictVectorMissing):
         await pe.convert_sentence_to_vector("kbid", "sentence")
+
+
+async def test_query_cache():
+    pe = PredictEngine(
+        "cluster",
+        "public-{zone}",
+        "service-account",
+        query_cache=PredictQueryCache(),
+    )
+    pe.session = get_mocked_session(
+        "GET", 200, json={"data": [0.0, 0.1]}, context_manager=False
+    )
+
+    assert await pe.convert_sentence_to_vector("kbid", "some sentence") == [0.0, 0.1]
+    assert await pe.convert_sentence_to_vector("kbid", " some  sentence ") == [
+        0.0,
+        0.1,
+    ]
+    assert pe.session.get.await_count == 1
+
+    # other kbs do not share cached results
+    await pe.convert_sentence_to_vector("kbid2", "some sentence")
+    assert pe.session.get.await_count == 2
+
+
+async def test_query_cache_coalesces_concurrent_calls():
+    pe = PredictEngine(
+        "cluster",
+        "public-{zone}",
+        "service-account",
+        query_cache=PredictQueryCache(),
+    )
+    pe.session = get_mocked_session(
+        "GET",
+        200,
+        json={"tokens": [{"text": "foo", "ner": "bar"}]},
+        context_manager=False,
+    )
+
+    results = await asyncio.gather(
+        *[pe.detect_entities("kbid", "some sentence") for _ in range(5)]
+    )
+    assert all(result[0].value == "foo" for result in results)
+    assert pe.session.get.await_count == 1
+
+
+async def test_query_cache_does_not_cache_errors():
+    pe = PredictEngine(
+        "cluster",
+        "public-{zone}",
+        "service-account",
+        query_cache=PredictQueryCache(),
+    )
+    pe.session = get_mocked_session("GET", 500, read="error", context_manager=False)
+    for _ in range(2):
+        with pytest.raises(SendToPredictError):
+            await pe.detect_entities("kbid", "some sentence")
+    assert pe.session.get.await_count == 2
@@ -17,6 +17,9 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
+import asyncio
+from unittest import mock
+
 import asyncpg
 import pytest
 
@@ -32,6 +35,85 @@ async def test_redis_driver(redis):
     await driver_basic(driver)
 
 
+@pytest.mark.asyncio
+async def test_redis_driver_keys_index(redis):
+    url = f"redis://{redis[0]}:{redis[1]}"
+    driver = RedisDriver(url=url)
+    await driver.initialize()
+    await driver.redis.flushall()
+
+    # Keys written without the index are indexed on initialization
+    await driver.redis.set(b"/kbs/kb1/r/uuid2", b"2")
+    await driver.finalize()
+    driver = RedisDriver(url=url)
+    await driver.initialize()
+
+    txn = await driver.begin()
+    await txn.set("/kbs/kb1/r/uuid1", b"1")
+    await txn.set("/kbs/kb1/r/uuid3", b"3")
+    await txn.set("/kbs/kb10/r/uuid1", b"1")
+    await txn.commit()
+
+    txn = await driver.begin()
+    await txn.delete("/kbs/kb1/r/uuid1")
+    await txn.set("/kbs/kb1/r/uuid0", b"0")
+    assert [key async for key in txn.keys("/kbs/kb1/", count=-1)] == [
+        "/kbs/kb1/r/uuid0",
+        "/kbs/kb1/r/uuid2",
+        "/kbs/kb1/r/uuid3",
+    ]
+    assert [key async for key in txn.keys("/kbs/kb1/", count=2)] == [
+        "/kbs/kb1/r/uuid0",
+        "/kbs/kb1/r/uuid2",
+    ]
+
+    # Concurrent reads are pipelined on a single request
+    mget = mock.AsyncMock(wraps=driver.redis.mget)
+    with mock.patch.object(driver.redis, "mget", new=mget):
+        results = await asyncio.gather(
+            txn.get("/kbs/kb1/r/uuid2"),
+            txn.get("/kbs/kb1/r/uuid3"),
+            txn.batch_get(["/kbs/kb1/r/uuid0", "/kbs/kb10/r/uuid1"]),
+        )
+    assert results == [b"2", b"3", [b"0", b"1"]]
+    mget.assert_awaited_once()
+    await txn.commit()
+
+    assert [key async for key in driver.keys("/kbs/kb1/", count=-1)] == [
+        "/kbs/kb1/r/uuid0",
+        "/kbs/kb1/r/uuid2",
+        "/kbs/kb1/r/uuid3",
+    ]
+    await driver.finalize()
+
+
+@pytest.mark.asyncio
+async def test_redis_driver_keys_index_skips_deleted_keys(redis):
+    url = f"redis://{redis[0]}:{redis[1]}"
+    driver = RedisDriver(url=url)
+    await driver.initialize()
+    await driver.redis.flushall()
+    await driver.redis.set(b"/kbs/kb1/r/uuid1", b"1")
+    await driver.redis.set(b"/kbs/kb1/r/uuid2", b"2")
+
+    # A key scanned for the index but deleted before being indexed
+    scan_iter = driver.redis.scan_iter
+
+    async def scan_and_delete(*args, **kwargs):
+        async for key in scan_iter(*args, **kwargs):
+            if key == b"/kbs/kb1/r/uuid1":
+                await driver.redis.delete(key)
+            yield key
+
+    with mock.patch.object(driver.redis, "scan_iter", new=scan_and_delete):
+        await driver.build_keys_index()
+
+    assert [key async for key in driver.keys("/kbs/kb1/", count=-1)] == [
+        "/kbs/kb1/r/uuid2",
+    ]
+    await driver.finalize()
+
+
 @pytest.mark.asyncio
 async def test_tikv_driver(tikvd):
     url = [f"{tikvd[0]}:{tikvd[2]}"]
@@ -85,8 +167,9 @@ async def driver_basic(driver):
     assert result == b"My title"
 
     result = await txn.batch_get(
-        ["/kbs/kb1/r/uuid1/text", "/internal/kbs/kb1/shards/shard1"]
+        ["/kbs/kb1/r/uuid1/text", "/i/do/not/exist", "/internal/kbs/kb1/shards/shard1"]
     )
+    assert result == [b"My title", None, b"node1"]
     await txn.abort()
 
     current_internal_kbs_keys = set()
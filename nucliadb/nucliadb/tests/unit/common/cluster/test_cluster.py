@@ -22,10 +22,11 @@ from unittest import mock
 
 import pytest
 
-from nucliadb.common.cluster import manager
+from nucliadb.common.cluster import manager, stats
 from nucliadb.common.cluster.exceptions import NodeClusterSmall
 from nucliadb.common.cluster.index_node import IndexNode
 from nucliadb.common.cluster.settings import settings
+from nucliadb_protos import writer_pb2
 
 
 @pytest.fixture(scope="function")
@@ -74,3 +75,146 @@ def test_find_nodes_checks_max_node_replicas_only_if_set(nodes):
 
     with mock.patch.object(settings, "max_node_replicas", -1):
         assert len(manager.find_nodes())
+
+
+@pytest.fixture(scope="function")
+def shard(nodes):
+    shard = writer_pb2.ShardObject(shard="shard")
+    for node_id in nodes.keys():
+        replica = shard.replicas.add()
+        replica.node = node_id
+        replica.shard.id = f"{node_id}-shard"
+    with mock.patch.object(stats, "NODES_STATS", new={}), mock.patch.object(
+        stats, "EXPLORATION_RATIO", 0
+    ):
+        yield shard
+
+
+def test_choose_node_prefers_fastest_node(shard):
+    stats.get_node_stats("node-0").observe(0.5, error=False, request_type="search")
+    stats.get_node_stats("node-30").observe(0.1, error=False, request_type="search")
+    stats.get_node_stats("node-40").observe(0.3, error=False, request_type="search")
+    _, shard_id, node_id = manager.choose_node(shard)
+    assert (node_id, shard_id) == ("node-30", "node-30-shard")
+
+    # in-flight requests count
+    stats.get_node_stats("node-30").inflight = 5
+    _, _, node_id = manager.choose_node(shard)
+    assert node_id == "node-40"
+
+
+def test_choose_node_avoids_unhealthy_nodes(shard):
+    stats.get_node_stats("node-0").observe(0.1, error=False, request_type="search")
+    stats.get_node_stats("node-30").observe(0.2, error=False, request_type="search")
+    stats.get_node_stats("node-40").observe(0.3, error=False, request_type="search")
+    for _ in range(stats.UNHEALTHY_ERRORS):
+        stats.get_node_stats("node-0").observe(0.1, error=True, request_type="search")
+    _, _, node_id = manager.choose_node(shard)
+    assert node_id == "node-30"
+
+
+def test_choose_node_tracks_latencies_by_request_type(shard):
+    stats.get_node_stats("node-0").observe(0.1, error=False, request_type="search")
+    stats.get_node_stats("node-30").observe(0.2, error=False, request_type="search")
+    stats.get_node_stats("node-40").observe(0.3, error=False, request_type="search")
+    stats.get_node_stats("node-0").observe(1.0, error=False, request_type="suggest")
+    stats.get_node_stats("node-30").observe(2.0, error=False, request_type="suggest")
+    stats.get_node_stats("node-40").observe(0.5, error=False, request_type="suggest")
+    assert manager.choose_node(shard)[2] == "node-0"
+    assert manager.choose_node(shard, request_type="suggest")[2] == "node-40"
+
+
+def test_idle_node_latency_decays_towards_the_mean(shard):
+    node_stats = stats.get_node_stats("node-0")
+    node_stats.observe(10.0, error=False, request_type="search")
+    assert node_stats.score("search", 1.0) == pytest.approx(10.0)
+
+    node_stats.latencies["search"].updated -= stats.LATENCY_DECAY_TIME * 10
+    assert node_stats.score("search", 1.0) == pytest.approx(1.0, abs=0.01)
+
+
+def test_choose_node_explores_other_healthy_nodes(shard):
+    stats.get_node_stats("node-0").observe(0.1, error=False, request_type="search")
+    stats.get_node_stats("node-30").observe(0.2, error=False, request_type="search")
+    stats.get_node_stats("node-40").observe(0.3, error=False, request_type="search")
+    for _ in range(stats.UNHEALTHY_ERRORS):
+        stats.get_node_stats("node-40").observe(0.1, error=True, request_type="search")
+    with mock.patch.object(stats, "EXPLORATION_RATIO", 1):
+        for _ in range(10):
+            assert manager.choose_node(shard)[2] == "node-30"
+
+
+def test_choose_node_filters_shard_replicas(shard):
+    _, shard_id, _ = manager.choose_node(shard, ["node-40-shard"])
+    assert shard_id == "node-40-shard"
+    with pytest.raises(KeyError):
+        manager.choose_node(shard, ["unknown"])
+
+
+class FakeCache:
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, size=None):
+        self.values[key] = value
+
+    async def delete(self, key, invalidate=False):
+        self.values.pop(key, None)
+
+
+@pytest.fixture(scope="function")
+def kb_shards_cache():
+    cache = FakeCache()
+    shards = writer_pb2.Shards(kbid="kbid", actual=0)
+    shards.shards.append(writer_pb2.ShardObject(shard="shard"))
+    txn = mock.AsyncMock()
+    txn.get.return_value = shards.SerializeToString()
+    driver = mock.MagicMock()
+    driver.transaction.return_value.__aenter__.return_value = txn
+    with mock.patch.object(
+        manager, "get_cache", new=mock.AsyncMock(return_value=cache)
+    ), mock.patch.object(manager, "get_driver", return_value=driver):
+        yield cache, txn
+
+
+async def test_get_shards_by_kbid_inner_is_cached(kb_shards_cache):
+    cache, txn = kb_shards_cache
+    shard_manager = manager.KBShardManager()
+
+    shards = await shard_manager.get_shards_by_kbid_inner("kbid")
+    assert shards.shards[0].shard == "shard"
+    assert await shard_manager.get_shards_by_kbid_inner("kbid") is shards
+    assert txn.get.call_count == 1
+
+    await manager.invalidate_kb_shards_cache("kbid")
+    await shard_manager.get_shards_by_kbid_inner("kbid")
+    assert txn.get.call_count == 2
+
+    with mock.patch.object(settings, "kb_shards_cache_ttl", -1):
+        await shard_manager.get_shards_by_kbid_inner("kbid")
+    assert txn.get.call_count == 3
+
+
+async def test_get_shards_by_kbid_inner_not_cached_if_invalidated(kb_shards_cache):
+    cache, txn = kb_shards_cache
+    shard_manager = manager.KBShardManager()
+
+    async def invalidate_while_reading(key):
+        await manager.invalidate_kb_shards_cache("kbid")
+        return writer_pb2.Shards(kbid="kbid").SerializeToString()
+
+    txn.get.side_effect = invalidate_while_reading
+    await shard_manager.get_shards_by_kbid_inner("kbid")
+    assert cache.values == {}
+
+
+async def test_get_current_active_shard_with_txn_is_not_cached(kb_shards_cache):
+    cache, txn = kb_shards_cache
+    shard_manager = manager.KBShardManager()
+
+    shard = await shard_manager.get_current_active_shard(txn, "kbid")
+    assert shard.shard == "shard"
+    assert cache.values == {}
@@ -0,0 +1,127 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+from unittest.mock import MagicMock, patch
+
+import pytest
+from nucliadb_protos.nodereader_pb2 import (
+    DocumentSearchResponse,
+    ParagraphItem,
+    SearchRequest,
+    SearchResponse,
+    StreamRequest,
+)
+
+from nucliadb.common.cluster.standalone import grpc_node_binding
+
+
+class FakeProducer:
+    def __init__(self, items):
+        self.items = iter(items)
+
+    def next(self):
+        try:
+            return next(self.items)
+        except StopIteration:
+            raise TypeError("Empty iterator")
+
+
+@pytest.fixture()
+def reader():
+    with patch.object(grpc_node_binding, "NodeReader", MagicMock()):
+        yield grpc_node_binding.StandaloneReaderWrapper()
+
+
+@pytest.mark.asyncio
+async def test_paragraphs_are_streamed_in_chunks(reader):
+    total = grpc_node_binding.STREAM_CHUNK_SIZE * 2 + 1
+    items = [
+        ParagraphItem(id=f"rid/t/text/{index}").SerializeToString()
+        for index in range(total)
+    ]
+    reader.reader.paragraphs = MagicMock(return_value=FakeProducer(items))
+
+    paragraphs = [item async for item in reader.Paragraphs(StreamRequest())]
+
+    assert [item.id for item in paragraphs] == [
+        f"rid/t/text/{index}" for index in range(total)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_paragraphs_stream_raises_errors(reader):
+    producer = MagicMock()
+    producer.next.side_effect = [
+        ParagraphItem(id="rid/t/text/0").SerializeToString(),
+        ValueError(),
+    ]
+    reader.reader.paragraphs = MagicMock(return_value=producer)
+
+    with pytest.raises(ValueError):
+        [item async for item in reader.Paragraphs(StreamRequest())]
+
+
+@pytest.mark.asyncio
+async def test_search_many(reader):
+    results = [
+        SearchResponse(document=DocumentSearchResponse(total=total)) for total in (1, 2)
+    ]
+    reader.reader.search_many = MagicMock(
+        return_value=[result.SerializeToString() for result in results]
+    )
+    request = SearchRequest(body="query")
+
+    responses = await reader.SearchMany(["shard-1", "shard-2"], request)
+
+    reader.reader.search_many.assert_called_once_with(
+        ["shard-1", "shard-2"], request.SerializeToString()
+    )
+    assert responses == results
+
+
+@pytest.mark.asyncio
+async def test_search_many_returns_errors_per_shard(reader):
+    result = SearchResponse(document=DocumentSearchResponse(total=1))
+    error = TypeError("Error loading shard")
+    reader.reader.search_many = MagicMock(
+        return_value=[result.SerializeToString(), error]
+    )
+
+    responses = await reader.SearchMany(["shard-1", "shard-2"], SearchRequest())
+
+    assert responses == [result, error]
+
+
+@pytest.mark.asyncio
+async def test_search_many_retries_io_errors(reader):
+    result = SearchResponse(document=DocumentSearchResponse(total=1))
+    failing = MagicMock(
+        return_value=[result.SerializeToString(), TypeError("IO error")]
+    )
+    reader.reader.search_many = failing
+    new_reader = grpc_node_binding.NodeReader.new.return_value = MagicMock()
+    new_reader.search_many = MagicMock(
+        return_value=[result.SerializeToString(), result.SerializeToString()]
+    )
+
+    responses = await reader.SearchMany(["shard-1", "shard-2"], SearchRequest())
+
+    assert responses == [result, result]
+    failing.assert_called_once()
+    assert reader.reader is new_reader
@@ -0,0 +1,96 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+import asyncio
+from unittest import mock
+
+import pytest
+
+from nucliadb.common.maindb.pg import PGTransaction, _prefix_upper
+
+
+def test_prefix_upper():
+    assert _prefix_upper("/kbs/kb1/") == "/kbs/kb10"
+    assert _prefix_upper("/kbs/kb1/r/") == "/kbs/kb1/r0"
+    assert _prefix_upper("a\U0010ffff") == "b"
+    assert _prefix_upper("a\ud7ff") == "a\ue000"
+    assert _prefix_upper("") is None
+
+
+@pytest.fixture(scope="function")
+def connection():
+    connection = mock.AsyncMock()
+    connection.fetch.return_value = [{"key": "/a", "value": b"a"}]
+    yield connection
+
+
+@pytest.fixture(scope="function")
+def txn(connection):
+    yield PGTransaction(connection, mock.AsyncMock(), driver=mock.AsyncMock())
+
+
+@pytest.mark.asyncio
+async def test_writes_are_flushed_in_bulk_on_commit(txn, connection):
+    for i in range(10):
+        await txn.set(f"/key/{i}", b"value")
+    await txn.delete("/key/0")
+    await txn.delete("/other")
+    connection.execute.assert_not_awaited()
+
+    assert await txn.get("/key/0") is None
+    assert await txn.get("/key/1") == b"value"
+    assert await txn.batch_get(["/key/0", "/key/1", "/a", "/b"]) == [
+        None,
+        b"value",
+        b"a",
+        None,
+    ]
+    connection.fetch.assert_awaited_once()
+
+    await txn.commit()
+
+    assert connection.execute.await_count == 2
+    deleted = connection.execute.await_args_list[0].args[1]
+    assert sorted(deleted) == ["/key/0", "/other"]
+    keys, values = connection.execute.await_args_list[1].args[1:]
+    assert keys == [f"/key/{i}" for i in range(1, 10)]
+    assert values == [b"value"] * 9
+    txn.txn.commit.assert_awaited_once()
+    txn.driver.pool.release.assert_awaited_once_with(connection)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_queries_are_serialized(txn, connection):
+    running = 0
+    max_running = 0
+
+    async def query(*args):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return b"value"
+
+    connection.fetchval.side_effect = query
+
+    results = await asyncio.gather(*[txn.get(f"/key/{i}") for i in range(5)])
+
+    assert results == [b"value"] * 5
+    assert max_running == 1
@@ -17,13 +17,13 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
+import asyncio
 import base64
 import mimetypes
 import pickle
 import uuid
 from datetime import datetime
 from hashlib import md5
-from io import BytesIO
 from typing import List, Optional
 
 from fastapi import HTTPException
@@ -540,25 +540,21 @@ async def upload(
 
     await storage_manager.start(dm, path=path, kbid=kbid)
 
-    async def generate_buffer(storage_manager, request):
-        buf = BytesIO()
-        async for chunk in request.stream():
-            buf.write(chunk)
-            while buf.tell() > storage_manager.chunk_size:
-                buf.seek(0)
-                data = buf.read(storage_manager.chunk_size)
-                if len(data):
-                    yield data
-                old_data = buf.read()
-                buf = BytesIO()
-                buf.write(old_data)
-        buf.seek(0)
-        data = buf.read()
-        if len(data):
-            yield data
+    checksum = md5()
+
+    async def hash_chunks(chunks):
+        loop = asyncio.get_running_loop()
+        async for chunk in chunks:
+            # hashlib releases the GIL: keep big chunks off the event loop
+            await loop.run_in_executor(None, checksum.update, chunk)
+            yield chunk
 
     size = await storage_manager.append(
-        dm, generate_buffer(storage_manager=storage_manager, request=request), 0
+        dm,
+        hash_chunks(
+            storage_manager.iterate_body_chunks(request, storage_manager.chunk_size)
+        ),
+        0,
     )
     await storage_manager.finish(dm)
     try:
@@ -570,7 +566,7 @@ async def upload(
             filename=filename,
             password=x_password[0] if x_password and len(x_password) else None,
             language=x_language[0] if x_language and len(x_language) else None,
-            md5=x_md5[0] if x_md5 and len(x_md5) else None,
+            md5=md5_user or checksum.hexdigest(),
             field=valid_field,
             source=storage_manager.storage.source,
             rid=rid,
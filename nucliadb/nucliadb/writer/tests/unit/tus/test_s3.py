@@ -0,0 +1,91 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from nucliadb.writer.tus import s3
+from nucliadb.writer.tus.dm import FileDataMangaer
+from nucliadb.writer.tus.s3 import S3FileStorageManager
+
+
+async def iter_chunks(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+@pytest.fixture()
+def dm():
+    dm = FileDataMangaer()
+    dm._data = {
+        "bucket": "bucket",
+        "path": "path",
+        "mpu": {"UploadId": "upload"},
+        "multipart": {"Parts": [{"PartNumber": 1, "ETag": "etag1"}]},
+        "block": 2,
+    }
+    return dm
+
+
+async def test_append_uploads_parts_concurrently(dm):
+    running = 0
+    max_running = 0
+
+    async def upload_part(PartNumber, **kwargs):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        # later parts finish first
+        await asyncio.sleep(0.01 / PartNumber)
+        running -= 1
+        return {"ETag": f"etag{PartNumber}"}
+
+    storage = Mock()
+    storage._s3aioclient.upload_part = AsyncMock(side_effect=upload_part)
+    storage_manager = S3FileStorageManager(storage)
+
+    chunks = [b"x"] * (s3.UPLOAD_PART_CONCURRENCY + 2)
+    size = await storage_manager.append(dm, iter_chunks(*chunks), 1)
+
+    assert size == len(chunks)
+    assert max_running == s3.UPLOAD_PART_CONCURRENCY
+    assert dm.get("block") == len(chunks) + 2
+    assert dm.get("multipart")["Parts"] == [
+        {"PartNumber": number, "ETag": f"etag{number}"}
+        for number in range(1, len(chunks) + 2)
+    ]
+
+
+async def test_append_cancels_pending_parts_on_error(dm):
+    async def upload_part(PartNumber, **kwargs):
+        if PartNumber == 2:
+            raise ValueError()
+        await asyncio.sleep(10)
+
+    storage = Mock()
+    storage._s3aioclient.upload_part = AsyncMock(side_effect=upload_part)
+    storage_manager = S3FileStorageManager(storage)
+
+    with pytest.raises(ValueError):
+        await storage_manager.append(dm, iter_chunks(b"x", b"y", b"z"), 1)
+
+    assert dm.get("block") == 2
+    assert len(dm.get("multipart")["Parts"]) == 1
@@ -0,0 +1,54 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from unittest.mock import Mock
+
+import pytest
+
+from nucliadb.writer.tus.storage import FileStorageManager
+
+
+def request_stream(*chunks):
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+
+    request = Mock()
+    request.stream = stream
+    return request
+
+
+@pytest.mark.parametrize(
+    "chunks,expected",
+    [
+        ([], []),
+        ([b"", b"ab", b""], [b"ab"]),
+        ([b"ab", b"cd", b"ef"], [b"abcd", b"ef"]),
+        ([b"abcd"], [b"abcd"]),
+        ([b"abcdefghij", b"k"], [b"abcd", b"efgh", b"ijk"]),
+        ([b"a", b"bcdefghijkl"], [b"abcd", b"efgh", b"ijkl"]),
+    ],
+)
+async def test_iterate_body_chunks(chunks, expected):
+    storage_manager = FileStorageManager(Mock())
+    request = request_stream(*chunks)
+
+    result = [chunk async for chunk in storage_manager.iterate_body_chunks(request, 4)]
+
+    assert result == expected
@@ -19,9 +19,10 @@
 #
 from __future__ import annotations
 
+import asyncio
 import uuid
 from contextlib import AsyncExitStack
-from typing import AsyncIterator, Dict, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
 
 import aiobotocore  # type: ignore
 import aiohttp
@@ -41,6 +42,8 @@ RETRIABLE_EXCEPTIONS = (
     botocore.exceptions.BotoCoreError,
 )
 CHUNK_SIZE = 5 * 1024 * 1024
+# Parts of a multipart upload being uploaded at the same time
+UPLOAD_PART_CONCURRENCY = 4
 
 
 class S3FileStorageManager(FileStorageManager):
@@ -80,26 +83,48 @@ class S3FileStorageManager(FileStorageManager):
         )
 
     async def append(self, dm: FileDataMangaer, iterable, offset) -> int:
+        """
+        Upload the chunks as parts of the multipart upload, up to
+        UPLOAD_PART_CONCURRENCY at a time. Parts are only recorded once they
+        are all uploaded, as the offset of the upload.
+        """
         size = 0
-        async for chunk in iterable:
-            # It seems that starlette stream() finishes with an emtpy chunk of data
-            size += len(chunk)
-            part = await self._upload_part(dm, chunk)
-
-            multipart = dm.get("multipart")
-            multipart["Parts"].append(
-                {"PartNumber": dm.get("block"), "ETag": part["ETag"]}
-            )
-            await dm.update(multipart=multipart, block=dm.get("block") + 1)
+        block = dm.get("block")
+        parts: List[Dict[str, Any]] = []
+        pending: Set[asyncio.Task] = set()
+        try:
+            async for chunk in iterable:
+                size += len(chunk)
+                if len(pending) >= UPLOAD_PART_CONCURRENCY:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    parts.extend(task.result() for task in done)
+                pending.add(asyncio.create_task(self._upload_block(dm, chunk, block)))
+                block += 1
+            parts.extend(await asyncio.gather(*pending))
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            raise
 
+        multipart = dm.get("multipart")
+        multipart["Parts"].extend(sorted(parts, key=lambda part: part["PartNumber"]))
+        await dm.update(multipart=multipart, block=block)
         return size
 
+    async def _upload_block(
+        self, dm: FileDataMangaer, data, block: int
+    ) -> Dict[str, Any]:
+        part = await self._upload_part(dm, data, block)
+        return {"PartNumber": block, "ETag": part["ETag"]}
+
     @backoff.on_exception(backoff.expo, RETRIABLE_EXCEPTIONS, max_tries=3)
-    async def _upload_part(self, dm: FileDataMangaer, data):
+    async def _upload_part(self, dm: FileDataMangaer, data, block: int):
         return await self.storage._s3aioclient.upload_part(
             Bucket=dm.get("bucket"),
             Key=dm.get("path"),
-            PartNumber=dm.get("block"),
+            PartNumber=block,
             UploadId=dm.get("mpu")["UploadId"],
             Body=data,
         )
@@ -114,7 +139,7 @@ class S3FileStorageManager(FileStorageManager):
         # if blocks is 0, it means the file is of zero length so we need to
         # trick it to finish a multiple part with no data.
         if dm.get("block") == 1:
-            part = await self._upload_part(dm, b"")
+            part = await self._upload_part(dm, b"", dm.get("block"))
             multipart = dm.get("multipart")
             multipart["Parts"].append(
                 {"PartNumber": dm.get("block"), "ETag": part["ETag"]}
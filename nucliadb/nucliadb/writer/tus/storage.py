@@ -123,25 +123,20 @@ class FileStorageManager:
         )
 
     async def iterate_body_chunks(self, request, chunk_size):
-        partial = b""
-        remaining = b""
+        """
+        Iterate the request body in chunks of chunk_size, only the last one can
+        be smaller. No more than a chunk plus the last data received is kept.
+        """
+        buffer = bytearray()
         async for chunk in request.stream():
-            if len(chunk) == 0:
+            buffer += chunk
+            if len(buffer) < chunk_size:
                 continue
-
-            partial += remaining[:chunk_size]
-            remaining = b""
-
-            wanted = chunk_size - len(partial)
-            partial += chunk[:wanted]
-
-            remaining = chunk[wanted:]
-
-            if len(partial) < chunk_size:
-                continue
-
-            yield partial
-            partial = b""
-
-        if partial or remaining:
-            yield partial + remaining
+            offset = 0
+            while len(buffer) - offset >= chunk_size:
+                yield bytes(buffer[offset : offset + chunk_size])
+                offset += chunk_size
+            del buffer[:offset]
+
+        if buffer:
+            yield bytes(buffer)
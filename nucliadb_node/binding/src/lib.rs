@@ -21,6 +21,7 @@ use std::io::Cursor;
 
 use nucliadb_core::paragraphs::ParagraphIterator;
 use nucliadb_core::texts::DocumentIterator;
+use nucliadb_core::thread::prelude::*;
 use nucliadb_node::env;
 use nucliadb_node::reader::NodeReaderService as RustReaderService;
 use nucliadb_node::writer::NodeWriterService as RustWriterService;
@@ -35,13 +36,12 @@ use nucliadb_telemetry::payload::TelemetryEvent;
 use prost::Message;
 use pyo3::exceptions;
 use pyo3::prelude::*;
-use pyo3::types::PyList;
+use pyo3::types::PyBytes;
 use tracing::*;
 use tracing_subscriber::filter::Targets;
 use tracing_subscriber::layer::SubscriberExt;
 use tracing_subscriber::util::SubscriberInitExt;
 use tracing_subscriber::Layer;
-type RawProtos = Vec<u8>;
 
 #[pyclass]
 pub struct PyParagraphProducer {
@@ -52,7 +52,7 @@ impl PyParagraphProducer {
     pub fn next<'p>(&mut self, py: Python<'p>) -> PyResult<&'p PyAny> {
         match self.inner.next() {
             None => Err(exceptions::PyTypeError::new_err("Empty iterator")),
-            Some(item) => Ok(PyList::new(py, item.encode_to_vec())),
+            Some(item) => Ok(PyBytes::new(py, &item.encode_to_vec())),
         }
     }
 }
@@ -66,7 +66,7 @@ impl PyDocumentProducer {
     pub fn next<'p>(&mut self, py: Python<'p>) -> PyResult<&'p PyAny> {
         match self.inner.next() {
             None => Err(exceptions::PyTypeError::new_err("Empty iterator")),
-            Some(item) => Ok(PyList::new(py, item.encode_to_vec())),
+            Some(item) => Ok(PyBytes::new(py, &item.encode_to_vec())),
         }
     }
 }
@@ -90,7 +90,7 @@ impl NodeReader {
         }
     }
 
-    pub fn paragraphs(&mut self, shard_id: RawProtos) -> PyResult<PyParagraphProducer> {
+    pub fn paragraphs(&mut self, shard_id: &[u8]) -> PyResult<PyParagraphProducer> {
         let request = StreamRequest::decode(&mut Cursor::new(shard_id)).unwrap();
         let Some(shard_id) = request.shard_id.clone() else {
             return Err(exceptions::PyTypeError::new_err("Error loading shard"));
@@ -107,7 +107,7 @@ impl NodeReader {
         }
     }
 
-    pub fn documents(&mut self, shard_id: RawProtos) -> PyResult<PyDocumentProducer> {
+    pub fn documents(&mut self, shard_id: &[u8]) -> PyResult<PyDocumentProducer> {
         let request = StreamRequest::decode(&mut Cursor::new(shard_id)).unwrap();
         let Some(shard_id) = request.shard_id.clone() else {
             return Err(exceptions::PyTypeError::new_err("Error loading shard"));
@@ -124,18 +124,18 @@ impl NodeReader {
         }
     }
 
-    pub fn get_shard<'p>(&mut self, shard_id: RawProtos, py: Python<'p>) -> PyResult<&'p PyAny> {
+    pub fn get_shard<'p>(&mut self, shard_id: &[u8], py: Python<'p>) -> PyResult<&'p PyAny> {
         let request = GetShardRequest::decode(&mut Cursor::new(shard_id)).unwrap();
         let shard_id = &request.shard_id.clone().unwrap();
         self.reader.load_shard(shard_id);
         match self.reader.get_info(shard_id, request).transpose() {
-            Some(Ok(shard)) => Ok(PyList::new(py, shard.encode_to_vec())),
+            Some(Ok(shard)) => Ok(PyBytes::new(py, &shard.encode_to_vec())),
             Some(Err(e)) => Err(exceptions::PyTypeError::new_err(e.to_string())),
             None => Err(exceptions::PyTypeError::new_err("Error loading shard")),
         }
     }
 
-    pub fn search<'p>(&mut self, request: RawProtos, py: Python<'p>) -> PyResult<&'p PyAny> {
+    pub fn search<'p>(&mut self, request: &[u8], py: Python<'p>) -> PyResult<&'p PyAny> {
         let search_request = SearchRequest::decode(&mut Cursor::new(request)).unwrap();
         let shard_id = ShardId {
             id: search_request.shard.clone(),
@@ -143,13 +143,46 @@ impl NodeReader {
         self.reader.load_shard(&shard_id);
         let response = self.reader.search(&shard_id, search_request);
         match response.transpose() {
-            Some(Ok(response)) => Ok(PyList::new(py, response.encode_to_vec())),
+            Some(Ok(response)) => Ok(PyBytes::new(py, &response.encode_to_vec())),
             Some(Err(e)) => Err(exceptions::PyTypeError::new_err(e.to_string())),
             None => Err(exceptions::PyTypeError::new_err("Error loading shard")),
         }
     }
 
-    pub fn suggest<'p>(&mut self, request: RawProtos, py: Python<'p>) -> PyResult<&'p PyAny> {
+    /// Runs the same search on several shards in parallel and returns one result per shard, in
+    /// the same order as `shard_ids`: the response bytes or, if the shard failed, the exception
+    /// that `search` would raise, so a failing shard does not discard the others.
+    pub fn search_many(
+        &mut self,
+        shard_ids: Vec<String>,
+        request: &[u8],
+        py: Python,
+    ) -> Vec<PyObject> {
+        let search_request = SearchRequest::decode(&mut Cursor::new(request)).unwrap();
+        let shard_ids: Vec<_> = shard_ids.into_iter().map(|id| ShardId { id }).collect();
+        for shard_id in &shard_ids {
+            self.reader.load_shard(shard_id);
+        }
+        let reader = &self.reader;
+        let responses: Vec<_> = shard_ids
+            .par_iter()
+            .map(|shard_id| {
+                let mut shard_request = search_request.clone();
+                shard_request.shard = shard_id.id.clone();
+                reader.search(shard_id, shard_request)
+            })
+            .collect();
+        responses
+            .into_iter()
+            .map(|response| match response.transpose() {
+                Some(Ok(response)) => PyBytes::new(py, &response.encode_to_vec()).into_py(py),
+                Some(Err(e)) => exceptions::PyTypeError::new_err(e.to_string()).into_py(py),
+                None => exceptions::PyTypeError::new_err("Error loading shard").into_py(py),
+            })
+            .collect()
+    }
+
+    pub fn suggest<'p>(&mut self, request: &[u8], py: Python<'p>) -> PyResult<&'p PyAny> {
         let suggest_request = SuggestRequest::decode(&mut Cursor::new(request)).unwrap();
         let shard_id = ShardId {
             id: suggest_request.shard.clone(),
@@ -157,13 +190,13 @@ impl NodeReader {
         self.reader.load_shard(&shard_id);
         let response = self.reader.suggest(&shard_id, suggest_request);
         match response.transpose() {
-            Some(Ok(response)) => Ok(PyList::new(py, response.encode_to_vec())),
+            Some(Ok(response)) => Ok(PyBytes::new(py, &response.encode_to_vec())),
             Some(Err(e)) => Err(exceptions::PyTypeError::new_err(e.to_string())),
             None => Err(exceptions::PyTypeError::new_err("Error loading shard")),
         }
     }
 
-    pub fn vector_search<'p>(&mut self, request: RawProtos, py: Python<'p>) -> PyResult<&'p PyAny> {
+    pub fn vector_search<'p>(&mut self, request: &[u8], py: Python<'p>) -> PyResult<&'p PyAny> {
         let vector_request = VectorSearchRequest::decode(&mut Cursor::new(request)).unwrap();
         let shard_id = ShardId {
             id: vector_request.id.clone(),
@@ -171,17 +204,13 @@ impl NodeReader {
         self.reader.load_shard(&shard_id);
         let response = self.reader.vector_search(&shard_id, vector_request);
         match response.transpose() {
-            Some(Ok(response)) => Ok(PyList::new(py, response.encode_to_vec())),
+            Some(Ok(response)) => Ok(PyBytes::new(py, &response.encode_to_vec())),
             Some(Err(e)) => Err(exceptions::PyTypeError::new_err(e.to_string())),
             None => Err(exceptions::PyTypeError::new_err("Error loading shard")),
         }
     }
 
-    pub fn document_search<'p>(
-        &mut self,
-        request: RawProtos,
-        py: Python<'p>,
-    ) -> PyResult<&'p PyAny> {
+    pub fn document_search<'p>(&mut self, request: &[u8], py: Python<'p>) -> PyResult<&'p PyAny> {
         let document_request = DocumentSearchRequest::decode(&mut Cursor::new(request)).unwrap();
         let shard_id = ShardId {
             id: document_request.id.clone(),
@@ -189,17 +218,13 @@ impl NodeReader {
         self.reader.load_shard(&shard_id);
         let response = self.reader.document_search(&shard_id, document_request);
         match response.transpose() {
-            Some(Ok(response)) => Ok(PyList::new(py, response.encode_to_vec())),
+            Some(Ok(response)) => Ok(PyBytes::new(py, &response.encode_to_vec())),
             Some(Err(e)) => Err(exceptions::PyTypeError::new_err(e.to_string())),
             None => Err(exceptions::PyTypeError::new_err("Error loading shard")),
         }
     }
 
-    pub fn paragraph_search<'p>(
-        &mut self,
-        request: RawProtos,
-        py: Python<'p>,
-    ) -> PyResult<&'p PyAny> {
+    pub fn paragraph_search<'p>(&mut self, request: &[u8], py: Python<'p>) -> PyResult<&'p PyAny> {
         let paragraph_request = ParagraphSearchRequest::decode(&mut Cursor::new(request)).unwrap();
         let shard_id = ShardId {
             id: paragraph_request.id.clone(),
@@ -207,17 +232,13 @@ impl NodeReader {
         self.reader.load_shard(&shard_id);
         let response = self.reader.paragraph_search(&shard_id, paragraph_request);
         match response.transpose() {
-            Some(Ok(response)) => Ok(PyList::new(py, response.encode_to_vec())),
+            Some(Ok(response)) => Ok(PyBytes::new(py, &response.encode_to_vec())),
             Some(Err(e)) => Err(exceptions::PyTypeError::new_err(e.to_string())),
             None => Err(exceptions::PyTypeError::new_err("Error loading shard")),
         }
     }
 
-    pub fn relation_search<'p>(
-        &mut self,
-        request: RawProtos,
-        py: Python<'p>,
-    ) -> PyResult<&'p PyAny> {
+    pub fn relation_search<'p>(&mut self, request: &[u8], py: Python<'p>) -> PyResult<&'p PyAny> {
         let paragraph_request = RelationSearchRequest::decode(&mut Cursor::new(request)).unwrap();
         let shard_id = ShardId {
             id: paragraph_request.shard_id.clone(),
@@ -225,37 +246,29 @@ impl NodeReader {
         self.reader.load_shard(&shard_id);
         let response = self.reader.relation_search(&shard_id, paragraph_request);
         match response.transpose() {
-            Some(Ok(response)) => Ok(PyList::new(py, response.encode_to_vec())),
+            Some(Ok(response)) => Ok(PyBytes::new(py, &response.encode_to_vec())),
             Some(Err(e)) => Err(exceptions::PyTypeError::new_err(e.to_string())),
             None => Err(exceptions::PyTypeError::new_err("Error loading shard")),
         }
     }
 
-    pub fn relation_edges<'p>(
-        &mut self,
-        request: RawProtos,
-        py: Python<'p>,
-    ) -> PyResult<&'p PyAny> {
+    pub fn relation_edges<'p>(&mut self, request: &[u8], py: Python<'p>) -> PyResult<&'p PyAny> {
         let shard_id = ShardId::decode(&mut Cursor::new(request)).unwrap();
         self.reader.load_shard(&shard_id);
         let response = self.reader.relation_edges(&shard_id);
         match response.transpose() {
-            Some(Ok(response)) => Ok(PyList::new(py, response.encode_to_vec())),
+            Some(Ok(response)) => Ok(PyBytes::new(py, &response.encode_to_vec())),
             Some(Err(e)) => Err(exceptions::PyTypeError::new_err(e.to_string())),
             None => Err(exceptions::PyTypeError::new_err("Error loading shard")),
         }
     }
 
-    pub fn relation_types<'p>(
-        &mut self,
-        request: RawProtos,
-        py: Python<'p>,
-    ) -> PyResult<&'p PyAny> {
+    pub fn relation_types<'p>(&mut self, request: &[u8], py: Python<'p>) -> PyResult<&'p PyAny> {
         let shard_id = ShardId::decode(&mut Cursor::new(request)).unwrap();
         self.reader.load_shard(&shard_id);
         let response = self.reader.relation_types(&shard_id);
         match response.transpose() {
-            Some(Ok(response)) => Ok(PyList::new(py, response.encode_to_vec())),
+            Some(Ok(response)) => Ok(PyBytes::new(py, &response.encode_to_vec())),
             Some(Err(e)) => Err(exceptions::PyTypeError::new_err(e.to_string())),
             None => Err(exceptions::PyTypeError::new_err("Error loading shard")),
         }
@@ -281,42 +294,42 @@ impl NodeWriter {
         }
     }
 
-    pub fn new_shard<'p>(&self, metadata: RawProtos, py: Python<'p>) -> PyResult<&'p PyAny> {
+    pub fn new_shard<'p>(&self, metadata: &[u8], py: Python<'p>) -> PyResult<&'p PyAny> {
         send_telemetry_event(TelemetryEvent::Create);
         let request = NewShardRequest::decode(&mut Cursor::new(metadata)).unwrap();
         match RustWriterService::new_shard(&request) {
-            Ok(shard) => Ok(PyList::new(py, shard.encode_to_vec())),
+            Ok(shard) => Ok(PyBytes::new(py, &shard.encode_to_vec())),
             Err(e) => Err(exceptions::PyTypeError::new_err(e.to_string())),
         }
     }
 
-    pub fn delete_shard<'p>(&mut self, shard_id: RawProtos, py: Python<'p>) -> PyResult<&'p PyAny> {
+    pub fn delete_shard<'p>(&mut self, shard_id: &[u8], py: Python<'p>) -> PyResult<&'p PyAny> {
         send_telemetry_event(TelemetryEvent::Delete);
         let shard_id = ShardId::decode(&mut Cursor::new(shard_id)).unwrap();
         match self.writer.delete_shard(&shard_id) {
-            Ok(_) => Ok(PyList::new(py, shard_id.encode_to_vec())),
+            Ok(_) => Ok(PyBytes::new(py, &shard_id.encode_to_vec())),
             Err(e) => Err(exceptions::PyTypeError::new_err(e.to_string())),
         }
     }
 
     pub fn clean_and_upgrade_shard<'p>(
         &mut self,
-        shard_id: RawProtos,
+        shard_id: &[u8],
         py: Python<'p>,
     ) -> PyResult<&'p PyAny> {
         let shard_id = ShardId::decode(&mut Cursor::new(shard_id)).unwrap();
         match self.writer.clean_and_upgrade_shard(&shard_id) {
-            Ok(clean_data) => Ok(PyList::new(py, clean_data.encode_to_vec())),
+            Ok(clean_data) => Ok(PyBytes::new(py, &clean_data.encode_to_vec())),
             Err(e) => Err(exceptions::PyTypeError::new_err(e.to_string())),
         }
     }
 
     pub fn list_shards<'p>(&mut self, py: Python<'p>) -> PyResult<&'p PyAny> {
         let shard_ids = self.writer.get_shard_ids();
-        Ok(PyList::new(py, shard_ids.encode_to_vec()))
+        Ok(PyBytes::new(py, &shard_ids.encode_to_vec()))
     }
 
-    pub fn set_resource<'p>(&mut self, resource: RawProtos, py: Python<'p>) -> PyResult<&'p PyAny> {
+    pub fn set_resource<'p>(&mut self, resource: &[u8], py: Python<'p>) -> PyResult<&'p PyAny> {
         let resource = Resource::decode(&mut Cursor::new(resource)).unwrap();
         let shard_id = ShardId {
             id: resource.shard_id.clone(),
@@ -327,7 +340,7 @@ impl NodeWriter {
                 info!("Set resource ends correctly");
                 status.status = 0;
                 status.detail = "Success!".to_string();
-                Ok(PyList::new(py, status.encode_to_vec()))
+                Ok(PyBytes::new(py, &status.encode_to_vec()))
             }
             Some(Err(e)) => {
                 let status = OpStatus {
@@ -337,7 +350,7 @@ impl NodeWriter {
                     shard_id: shard_id.id.clone(),
                     ..Default::default()
                 };
-                Ok(PyList::new(py, status.encode_to_vec()))
+                Ok(PyBytes::new(py, &status.encode_to_vec()))
             }
             None => {
                 let message = format!("Error loading shard {:?}", shard_id);
@@ -346,11 +359,7 @@ impl NodeWriter {
         }
     }
 
-    pub fn remove_resource<'p>(
-        &mut self,
-        resource: RawProtos,
-        py: Python<'p>,
-    ) -> PyResult<&'p PyAny> {
+    pub fn remove_resource<'p>(&mut self, resource: &[u8], py: Python<'p>) -> PyResult<&'p PyAny> {
         let resource = ResourceId::decode(&mut Cursor::new(resource)).unwrap();
         let shard_id = ShardId {
             id: resource.shard_id.clone(),
@@ -361,7 +370,7 @@ impl NodeWriter {
             .remove_resource(&shard_id, &resource)
             .transpose()
         {
-            Some(Ok(shard)) => Ok(PyList::new(py, shard.encode_to_vec())),
+            Some(Ok(shard)) => Ok(PyBytes::new(py, &shard.encode_to_vec())),
             Some(Err(e)) => Err(exceptions::PyTypeError::new_err(e.to_string())),
             None => {
                 let message = format!("Error loading shard {:?}", shard_id);
@@ -370,7 +379,7 @@ impl NodeWriter {
         }
     }
 
-    pub fn join_graph<'p>(&mut self, request: RawProtos, py: Python<'p>) -> PyResult<&'p PyAny> {
+    pub fn join_graph<'p>(&mut self, request: &[u8], py: Python<'p>) -> PyResult<&'p PyAny> {
         let request = SetGraph::decode(&mut Cursor::new(request)).unwrap();
         let shard_id = request.shard_id.unwrap();
         let graph = request.graph.unwrap();
@@ -384,7 +393,7 @@ impl NodeWriter {
                 info!("Remove resource ends correctly");
                 status.status = 0;
                 status.detail = "Success!".to_string();
-                Ok(PyList::new(py, status.encode_to_vec()))
+                Ok(PyBytes::new(py, &status.encode_to_vec()))
             }
             Some(Err(e)) => {
                 let op_status = OpStatus {
@@ -394,7 +403,7 @@ impl NodeWriter {
                     shard_id: shard_id.id.clone(),
                     ..Default::default()
                 };
-                Ok(PyList::new(py, op_status.encode_to_vec()))
+                Ok(PyBytes::new(py, &op_status.encode_to_vec()))
             }
             None => {
                 let message = format!("Error loading shard {:?}", shard_id);
@@ -405,7 +414,7 @@ impl NodeWriter {
 
     pub fn delete_relation_nodes<'p>(
         &mut self,
-        request: RawProtos,
+        request: &[u8],
         py: Python<'p>,
     ) -> PyResult<&'p PyAny> {
         let nodes = DeleteGraphNodes::decode(&mut Cursor::new(request)).unwrap();
@@ -420,7 +429,7 @@ impl NodeWriter {
                 info!("Remove resource ends correctly");
                 status.status = 0;
                 status.detail = "Success!".to_string();
-                Ok(PyList::new(py, status.encode_to_vec()))
+                Ok(PyBytes::new(py, &status.encode_to_vec()))
             }
             Some(Err(e)) => {
                 let op_status = OpStatus {
@@ -430,7 +439,7 @@ impl NodeWriter {
                     shard_id: shard_id.id.clone(),
                     ..Default::default()
                 };
-                Ok(PyList::new(py, op_status.encode_to_vec()))
+                Ok(PyBytes::new(py, &op_status.encode_to_vec()))
             }
             None => {
                 let message = format!("Error loading shard {:?}", shard_id);
@@ -439,7 +448,7 @@ impl NodeWriter {
         }
     }
 
-    pub fn get_vectorset<'p>(&mut self, request: RawProtos, py: Python<'p>) -> PyResult<&'p PyAny> {
+    pub fn get_vectorset<'p>(&mut self, request: &[u8], py: Python<'p>) -> PyResult<&'p PyAny> {
         let shard_id = ShardId::decode(&mut Cursor::new(request)).unwrap();
         self.writer.load_shard(&shard_id);
         match self.writer.list_vectorsets(&shard_id).transpose() {
@@ -450,12 +459,12 @@ impl NodeWriter {
                     shard: Some(shard_id),
                     vectorset: list,
                 };
-                Ok(PyList::new(py, response.encode_to_vec()))
+                Ok(PyBytes::new(py, &response.encode_to_vec()))
             }
         }
     }
 
-    pub fn set_vectorset<'p>(&mut self, request: RawProtos, py: Python<'p>) -> PyResult<&'p PyAny> {
+    pub fn set_vectorset<'p>(&mut self, request: &[u8], py: Python<'p>) -> PyResult<&'p PyAny> {
         let request = NewVectorSetRequest::decode(&mut Cursor::new(request)).unwrap();
         let Some(shard_id) = request.id.as_ref().and_then(|i| i.shard.clone()) else {
             return Err(exceptions::PyTypeError::new_err("A shard id must be given"));
@@ -465,7 +474,7 @@ impl NodeWriter {
             Some(Ok(mut status)) => {
                 status.status = 0;
                 status.detail = "Success!".to_string();
-                Ok(PyList::new(py, status.encode_to_vec()))
+                Ok(PyBytes::new(py, &status.encode_to_vec()))
             }
             Some(Err(e)) => {
                 let op_status = OpStatus {
@@ -475,7 +484,7 @@ impl NodeWriter {
                     shard_id: shard_id.id.clone(),
                     ..Default::default()
                 };
-                Ok(PyList::new(py, op_status.encode_to_vec()))
+                Ok(PyBytes::new(py, &op_status.encode_to_vec()))
             }
             None => {
                 let message = format!("Error loading shard {:?}", shard_id);
@@ -484,7 +493,7 @@ impl NodeWriter {
         }
     }
 
-    pub fn del_vectorset<'p>(&mut self, request: RawProtos, py: Python<'p>) -> PyResult<&'p PyAny> {
+    pub fn del_vectorset<'p>(&mut self, request: &[u8], py: Python<'p>) -> PyResult<&'p PyAny> {
         let vectorset = VectorSetId::decode(&mut Cursor::new(request)).unwrap();
         let shard_id = vectorset.shard.as_ref().unwrap();
         self.writer.load_shard(shard_id);
@@ -497,7 +506,7 @@ impl NodeWriter {
                 info!("remove_vector_set ends correctly");
                 status.status = 0;
                 status.detail = "Success!".to_string();
-                Ok(PyList::new(py, status.encode_to_vec()))
+                Ok(PyBytes::new(py, &status.encode_to_vec()))
             }
             Some(Err(e)) => {
                 let op_status = OpStatus {
@@ -507,7 +516,7 @@ impl NodeWriter {
                     shard_id: shard_id.id.clone(),
                     ..Default::default()
                 };
-                Ok(PyList::new(py, op_status.encode_to_vec()))
+                Ok(PyBytes::new(py, &op_status.encode_to_vec()))
             }
             None => {
                 let message = format!("Error loading shard {:?}", shard_id);
@@ -516,7 +525,7 @@ impl NodeWriter {
         }
     }
 
-    pub fn gc<'p>(&mut self, request: RawProtos, py: Python<'p>) -> PyResult<&'p PyAny> {
+    pub fn gc<'p>(&mut self, request: &[u8], py: Python<'p>) -> PyResult<&'p PyAny> {
         send_telemetry_event(TelemetryEvent::GarbageCollect);
         let shard_id = ShardId::decode(&mut Cursor::new(request)).unwrap();
         self.writer.load_shard(&shard_id);
@@ -529,7 +538,7 @@ impl NodeWriter {
                     shard_id: shard_id.id.clone(),
                     ..Default::default()
                 };
-                Ok(PyList::new(py, status.encode_to_vec()))
+                Ok(PyBytes::new(py, &status.encode_to_vec()))
             }
             Some(Err(e)) => {
                 let op_status = OpStatus {
@@ -539,7 +548,7 @@ impl NodeWriter {
                     shard_id: shard_id.id.clone(),
                     ..Default::default()
                 };
-                Ok(PyList::new(py, op_status.encode_to_vec()))
+                Ok(PyBytes::new(py, &op_status.encode_to_vec()))
             }
             None => {
                 let message = format!("Error loading shard {:?}", shard_id);
@@ -20,7 +20,8 @@
 # We need to pull from jetstream key partition
 
 import asyncio
-from typing import List, Optional
+from functools import partial
+from typing import AsyncIterator, Awaitable, Dict, List, Optional, Set, Tuple
 
 import nats
 from grpc import StatusCode
@@ -33,7 +34,7 @@ from nucliadb_protos.nodewriter_pb2 import IndexMessage, OpStatus, TypeMessage
 from nucliadb_protos.writer_pb2 import Notification
 from nucliadb_telemetry import errors, metrics
 from nucliadb_utils import const
-from nucliadb_utils.nats import get_traced_jetstream
+from nucliadb_utils.nats import SeqidTracker, get_traced_jetstream
 from nucliadb_utils.storages.exceptions import IndexDataNotFound
 from nucliadb_utils.storages.storage import Storage
 from nucliadb_utils.utilities import get_pubsub, get_storage
@@ -64,6 +65,26 @@ subscriber_observer = metrics.Observer(
 )
 
 
+class SetResourceError(Exception):
+    """
+    The node writer failed to index a resource, `brain` is the part of it
+    that was being sent
+    """
+
+    def __init__(self, grpc_error: AioRpcError, brain: Resource):
+        super().__init__(str(grpc_error))
+        self.grpc_error = grpc_error
+        self.brain = brain
+
+
+async def prefetched_parts(
+    first: Awaitable[Resource], parts: AsyncIterator[Resource]
+) -> AsyncIterator[Resource]:
+    yield await first
+    async for part in parts:
+        yield part
+
+
 class Worker:
     subscriptions: List[Subscription]
     storage: Storage
@@ -84,11 +105,21 @@ class Worker:
         self.gc_task = None
         self.publisher = IndexedPublisher()
         self.load_seqid()
-        self.brain: Optional[Resource] = None
+        self.seqids = SeqidTracker(self.last_seqid or 0)
+        self.shard_tasks: Dict[str, asyncio.Task] = {}
+        # seqids of pipelined messages waiting their turn, by shard and resource
+        self.queued_resources: Dict[Tuple[str, str], List[int]] = {}
+        self.superseded: Set[int] = set()
+        # seqids of pipelined messages that failed, by shard: until they are
+        # redelivered and indexed, later messages of the shard are not taken
+        self.failed_seqids: Dict[str, Set[int]] = {}
 
     async def finalize(self):
         if self.gc_task:
             self.gc_task.cancel()
+        for task in list(self.shard_tasks.values()):
+            # not acked, they will be redelivered
+            task.cancel()
 
         await self.publisher.finalize()
         await self.subscriber_finalize()
@@ -168,7 +199,7 @@ class Worker:
         while True:
             await self.event.wait()
             await asyncio.sleep(10)
-            if self.event.is_set():
+            if self.event.is_set() and not self.shard_tasks:
                 async with self.lock:
                     try:
                         logger.info(f"Mr Propper working")
@@ -199,16 +230,25 @@ class Worker:
             # First time the consumer is started
             self.last_seqid = None
 
-    async def set_resource(self, pb: IndexMessage) -> OpStatus:
-        self.brain = await self.storage.get_indexing(pb)
-        self.brain.shard_id = self.brain.resource.shard_id = pb.shard
-        logger.info(
-            f"Added {self.brain.resource.uuid} at {self.brain.shard_id} otx:{pb.txid}"
-        )
-        status = await self.writer.set_resource(self.brain)
+    async def set_resource(
+        self, pb: IndexMessage, parts: Optional[AsyncIterator[Resource]] = None
+    ) -> Optional[OpStatus]:
+        # Big resources come in parts: each of them is downloaded and sent to
+        # the node on its own, so there's never the whole resource in memory
+        if parts is None:
+            parts = self.storage.iter_indexing(pb)
+        status: Optional[OpStatus] = None
+        async for brain in parts:
+            brain.shard_id = brain.resource.shard_id = pb.shard
+            logger.info(
+                f"Added {brain.resource.uuid} at {brain.shard_id} otx:{pb.txid}"
+            )
+            try:
+                status = await self.writer.set_resource(brain)
+            except AioRpcError as grpc_error:
+                raise SetResourceError(grpc_error, brain) from grpc_error
+            del brain
         logger.info(f"...done")
-        del self.brain
-        self.brain = None
         return status
 
     async def delete_resource(self, pb: IndexMessage) -> OpStatus:
@@ -218,6 +258,10 @@ class Worker:
         logger.info(f"...done")
         return status
 
+    @property
+    def pipelined(self) -> bool:
+        return settings.indexing_max_concurrency > 1
+
     @subscriber_observer.wrap()
     async def subscription_worker(self, msg: Msg):
         subject = msg.subject
@@ -234,49 +278,159 @@ class Worker:
             return
 
         self.event.clear()
-        status: Optional[OpStatus] = None
-        async with self.lock:
-            try:
-                pb = IndexMessage()
-                pb.ParseFromString(msg.data)
-                if pb.typemessage == TypeMessage.CREATION:
-                    status = await self.set_resource(pb)
-                elif pb.typemessage == TypeMessage.DELETION:
-                    status = await self.delete_resource(pb)
-                if status:
-                    self.reader.update(pb.shard, status)
+        pb = IndexMessage()
+        pb.ParseFromString(msg.data)
+        if self.pipelined:
+            self.start_pipelined(msg, seqid, pb)
+            return
 
-            except AioRpcError as grpc_error:
-                if grpc_error.code() == StatusCode.NOT_FOUND:
-                    logger.error(f"Shard does not exist {pb.shard}")
-                else:
-                    event_id = errors.capture_exception(grpc_error)
-                    logger.error(
-                        f"An error on subscription_worker. Check sentry for more details. Event id: {event_id}"
-                    )
-                    if (
-                        pb.typemessage == TypeMessage.CREATION
-                        and self.brain
-                        and self.brain.HasField("metadata")
-                    ):
-                        # Hard fail if we have the correct data
-                        raise grpc_error
-
-            except IndexDataNotFound as storage_error:
-                # This should never happen now.
-                # Remove this block in the future once we're confident it's not needed.
-                errors.capture_exception(storage_error)
+        async with self.lock:
+            await self.index(pb)
+        await self.finish(msg, seqid, pb)
+
+    def start_pipelined(self, msg: Msg, seqid: int, pb: IndexMessage) -> None:
+        """
+        Index the message on its own task: messages of different shards are
+        indexed at the same time, while the ones of a shard keep their order.
+        """
+        self.seqids.start(seqid)
+        failed = self.failed_seqids.get(pb.shard)
+        if failed:
+            first_failed = min(failed)
+            if seqid != first_failed:
+                # not acked: it will be redelivered after the failed ones, so
+                # the messages of the shard keep their order
                 logger.warning(
-                    "Error retrieving the indexing payload we do not block as that means its already deleted!"
+                    f"Shard {pb.shard} is blocked until seqid {first_failed} is "
+                    f"indexed, seqid {seqid} will be redelivered"
+                )
+                return
+            failed.remove(seqid)
+            if not failed:
+                del self.failed_seqids[pb.shard]
+        if pb.resource:
+            queued = self.queued_resources.setdefault((pb.shard, pb.resource), [])
+            if pb.typemessage == TypeMessage.DELETION:
+                # removing the resource makes the messages of the resource still
+                # waiting their turn pointless: they are acked without indexing
+                self.superseded.update(queued)
+            queued.append(seqid)
+        previous = self.shard_tasks.get(pb.shard)
+        task = asyncio.create_task(self.pipelined_worker(msg, seqid, pb, previous))
+        self.shard_tasks[pb.shard] = task
+        task.add_done_callback(partial(self.pipelined_done, pb.shard))
+
+    def dequeue_resource(self, seqid: int, pb: IndexMessage) -> None:
+        self.superseded.discard(seqid)
+        key = (pb.shard, pb.resource)
+        queued = self.queued_resources.get(key)
+        if queued is None:
+            return
+        if seqid in queued:
+            queued.remove(seqid)
+        if not queued:
+            del self.queued_resources[key]
+
+    def pipelined_done(self, shard: str, task: asyncio.Task) -> None:
+        if self.shard_tasks.get(shard) is task:
+            del self.shard_tasks[shard]
+        if not task.cancelled() and task.exception() is not None:
+            # not acked, the message will be redelivered
+            logger.warning(f"Could not index message of shard {shard}")
+
+    async def pipelined_worker(
+        self,
+        msg: Msg,
+        seqid: int,
+        pb: IndexMessage,
+        previous: Optional[asyncio.Task],
+    ):
+        parts = None
+        prefetch = None
+        if pb.typemessage == TypeMessage.CREATION:
+            # download the payload while previous messages are being indexed
+            iterator = self.storage.iter_indexing(pb)
+            prefetch = asyncio.ensure_future(iterator.__anext__())
+            parts = prefetched_parts(prefetch, iterator)
+        try:
+            if previous is not None:
+                # if the previous message of the shard failed this one is not
+                # indexed either, both of them will be redelivered
+                await previous
+            if seqid in self.superseded:
+                logger.info(
+                    f"Skipping {pb.resource} at {pb.shard} otx:{pb.txid}, "
+                    "it is deleted by a later message"
                 )
-            except Exception as e:
-                event_id = errors.capture_exception(e)
+            else:
+                await self.index(pb, parts)
+        except Exception:
+            self.failed_seqids.setdefault(pb.shard, set()).add(seqid)
+            raise
+        finally:
+            self.dequeue_resource(seqid, pb)
+            if prefetch is not None and not prefetch.cancel():
+                if not prefetch.cancelled():
+                    # retrieve the error of a payload that was never used
+                    prefetch.exception()
+        await self.finish(msg, seqid, pb)
+
+    async def index(
+        self, pb: IndexMessage, parts: Optional[AsyncIterator[Resource]] = None
+    ) -> None:
+        status: Optional[OpStatus] = None
+        brain: Optional[Resource] = None
+        try:
+            if pb.typemessage == TypeMessage.CREATION:
+                try:
+                    status = await self.set_resource(pb, parts)
+                except SetResourceError as error:
+                    brain = error.brain
+                    raise error.grpc_error
+            elif pb.typemessage == TypeMessage.DELETION:
+                status = await self.delete_resource(pb)
+            if status:
+                self.reader.update(pb.shard, status)
+
+        except AioRpcError as grpc_error:
+            if grpc_error.code() == StatusCode.NOT_FOUND:
+                logger.error(f"Shard does not exist {pb.shard}")
+            else:
+                event_id = errors.capture_exception(grpc_error)
                 logger.error(
                     f"An error on subscription_worker. Check sentry for more details. Event id: {event_id}"
                 )
-                raise e
+                if (
+                    pb.typemessage == TypeMessage.CREATION
+                    and brain
+                    and brain.HasField("metadata")
+                ):
+                    # Hard fail if we have the correct data
+                    raise grpc_error
+
+        except IndexDataNotFound as storage_error:
+            # This should never happen now.
+            # Remove this block in the future once we're confident it's not needed.
+            errors.capture_exception(storage_error)
+            logger.warning(
+                "Error retrieving the indexing payload we do not block as that means its already deleted!"
+            )
+        except Exception as e:
+            event_id = errors.capture_exception(e)
+            logger.error(
+                f"An error on subscription_worker. Check sentry for more details. Event id: {event_id}"
+            )
+            raise e
+
+    async def finish(self, msg: Msg, seqid: int, pb: IndexMessage) -> None:
         try:
-            self.store_seqid(seqid)
+            if self.pipelined:
+                # only up to where all the previous messages are indexed too
+                last_seqid = self.seqids.finish(seqid)
+                if last_seqid > (self.last_seqid or 0):
+                    self.store_seqid(last_seqid)
+            else:
+                self.store_seqid(seqid)
             await msg.ack()
             self.event.set()
             await self.publisher.indexed(pb)
@@ -313,7 +467,7 @@ class Worker:
                 opt_start_seq=self.last_seqid or 1,
                 ack_policy=nats.js.api.AckPolicy.EXPLICIT,
                 max_deliver=10000,
-                max_ack_pending=1,
+                max_ack_pending=settings.indexing_max_concurrency,
                 ack_wait=self.ack_wait,
                 idle_heartbeat=5,
             ),
@@ -33,6 +33,10 @@ class Settings(BaseSettings):
 
     data_path: Optional[str] = None
 
+    # Index messages downloaded and indexed at the same time. Messages of the
+    # same shard are always indexed in order.
+    indexing_max_concurrency: int = 1
+
 
 settings = Settings()
 indexing_settings = utils_settings.IndexingSettings()
@@ -17,12 +17,16 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
+import asyncio
 import tempfile
 from unittest import mock
 from unittest.mock import AsyncMock, MagicMock, Mock
 
 import pytest
+from grpc import StatusCode
+from grpc.aio import AioRpcError  # type: ignore
 from nats.aio.client import Msg
+from nucliadb_protos.noderesources_pb2 import Resource, ResourceMetadata
 from nucliadb_protos.nodewriter_pb2 import IndexMessage, TypeMessage
 from nucliadb_utils import const
 
@@ -146,3 +150,180 @@ class TestSubscriptionWorker:
         await worker.reconnected_cb()
 
         assert worker.nc.jetstream().subscribe.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_set_resource_sends_each_part(self, worker: Worker):
+        parts = [Resource(labels=["part1"]), Resource(labels=["part2"])]
+
+        async def iter_indexing(pb):
+            for part in parts:
+                yield part
+
+        worker.storage = MagicMock(iter_indexing=iter_indexing)
+        index = IndexMessage(shard="shard", typemessage=TypeMessage.CREATION)
+
+        status = await worker.set_resource(index)
+
+        assert status is worker.writer.set_resource.return_value
+        sent = [call.args[0] for call in worker.writer.set_resource.call_args_list]
+        assert [list(pb.labels) for pb in sent] == [["part1"], ["part2"]]
+        assert all(pb.shard_id == "shard" for pb in sent)
+
+    @pytest.mark.asyncio
+    async def test_index_fails_if_resource_with_metadata_is_not_indexed(
+        self, worker: Worker
+    ):
+        async def iter_indexing(pb):
+            yield Resource(metadata=ResourceMetadata())
+
+        error = AioRpcError(
+            code=StatusCode.INTERNAL,
+            initial_metadata=Mock(),
+            trailing_metadata=Mock(),
+            details="",
+        )
+        worker.storage = MagicMock(iter_indexing=iter_indexing)
+        worker.writer.set_resource.side_effect = error
+        index = IndexMessage(shard="shard", typemessage=TypeMessage.CREATION)
+
+        with mock.patch("nucliadb_node.pull.errors"):
+            with pytest.raises(AioRpcError):
+                await worker.index(index)
+
+    @pytest.mark.asyncio
+    async def test_pipelined_indexing(self, worker: Worker):
+        indexed = []
+        release = asyncio.Event()
+
+        async def index(pb, parts=None):
+            if pb.resource == "r1":
+                await release.wait()
+            indexed.append(pb.resource)
+
+        worker.index = index  # type: ignore
+        worker.publisher = AsyncMock()
+        msgs = []
+        for seqid, (shard, resource) in enumerate(
+            [("shard1", "r1"), ("shard1", "r2"), ("shard2", "r3")], start=1
+        ):
+            msg = self.get_msg(seqid=seqid)
+            msg.data = IndexMessage(
+                shard=shard, resource=resource, typemessage=TypeMessage.DELETION
+            ).SerializeToString()
+            msgs.append(msg)
+
+        with mock.patch.object(settings, "indexing_max_concurrency", 4):
+            for msg in msgs:
+                await worker.subscription_worker(msg)
+            await asyncio.sleep(0.01)
+
+            # shard2 does not wait for shard1, but its seqid is not stored yet
+            assert indexed == ["r3"]
+            msgs[2].ack.assert_awaited_once()
+            worker.store_seqid.assert_not_called()
+
+            release.set()
+            await asyncio.sleep(0.01)
+
+        # messages of a shard keep their order
+        assert indexed == ["r3", "r1", "r2"]
+        worker.store_seqid.assert_called_with(3)
+        assert worker.shard_tasks == {}
+
+    @pytest.mark.asyncio
+    async def test_pipelined_skips_messages_of_deleted_resources(self, worker: Worker):
+        indexed = []
+        release = asyncio.Event()
+
+        async def index(pb, parts=None):
+            if pb.resource == "r1":
+                await release.wait()
+            indexed.append((pb.resource, pb.typemessage))
+
+        async def iter_indexing(pb):
+            yield Resource()
+
+        worker.index = index  # type: ignore
+        worker.storage = MagicMock(iter_indexing=iter_indexing)
+        worker.publisher = AsyncMock()
+        msgs = []
+        for seqid, (resource, typemessage) in enumerate(
+            [
+                ("r1", TypeMessage.CREATION),
+                ("r2", TypeMessage.CREATION),
+                ("r2", TypeMessage.CREATION),
+                ("r2", TypeMessage.DELETION),
+            ],
+            start=1,
+        ):
+            msg = self.get_msg(seqid=seqid)
+            msg.data = IndexMessage(
+                shard="shard", resource=resource, typemessage=typemessage
+            ).SerializeToString()
+            msgs.append(msg)
+
+        with mock.patch.object(settings, "indexing_max_concurrency", 4):
+            for msg in msgs:
+                await worker.subscription_worker(msg)
+            release.set()
+            await asyncio.sleep(0.01)
+
+        # only the deletion of r2 gets to the node
+        assert indexed == [("r1", TypeMessage.CREATION), ("r2", TypeMessage.DELETION)]
+        for msg in msgs:
+            msg.ack.assert_awaited_once()
+        assert worker.publisher.indexed.await_count == 4
+        worker.store_seqid.assert_called_with(4)
+        assert worker.queued_resources == {}
+        assert worker.superseded == set()
+
+    @pytest.mark.asyncio
+    async def test_pipelined_blocks_shard_after_failure(self, worker: Worker):
+        indexed = []
+        failing = {1}
+
+        async def index(pb, parts=None):
+            if pb.txid in failing:
+                raise ValueError()
+            indexed.append(pb.txid)
+
+        worker.index = index  # type: ignore
+        worker.publisher = AsyncMock()
+
+        def get_msg(seqid, shard="shard1"):
+            msg = self.get_msg(seqid=seqid)
+            msg.data = IndexMessage(
+                shard=shard,
+                txid=seqid,
+                resource=f"r{seqid}",
+                typemessage=TypeMessage.DELETION,
+            ).SerializeToString()
+            return msg
+
+        with mock.patch.object(settings, "indexing_max_concurrency", 4):
+            first = get_msg(1)
+            await worker.subscription_worker(first)
+            await asyncio.sleep(0.01)
+            first.ack.assert_not_awaited()
+
+            # later messages of the shard are not taken, other shards are
+            second = get_msg(2)
+            other = get_msg(3, shard="shard2")
+            await worker.subscription_worker(second)
+            await worker.subscription_worker(other)
+            await asyncio.sleep(0.01)
+            assert indexed == [3]
+            second.ack.assert_not_awaited()
+            worker.store_seqid.assert_not_called()
+
+            # until the failed one is redelivered and indexed
+            failing.clear()
+            await worker.subscription_worker(first)
+            await worker.subscription_worker(second)
+            await asyncio.sleep(0.01)
+
+        assert indexed == [3, 1, 2]
+        first.ack.assert_awaited_once()
+        second.ack.assert_awaited_once()
+        worker.store_seqid.assert_called_with(3)
+        assert worker.failed_seqids == {}
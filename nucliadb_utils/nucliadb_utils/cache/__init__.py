@@ -19,3 +19,5 @@
 
 CACHE_PREFIX = "gcache2-"
 KB_COUNTER_CACHE = "kb_{kbid}_counters"
+KB_RESOURCE_CACHE = "kb_{kbid}_resource_{uuid}"
+KB_SHARDS_CACHE = "kb_{kbid}_shards"
@@ -94,8 +94,15 @@ class Cache:
         return _default_size
 
     # Set a object from cache
-    async def set(self, key: str, value: Any, invalidate: bool = False):
-        size = self.get_size(value)
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        invalidate: bool = False,
+        size: Optional[int] = None,
+    ):
+        if size is None:
+            size = self.get_size(value)
         self._memory_cache.set(key, value, size)
         if invalidate:
             await self.send_invalidation([key])
@@ -18,6 +18,7 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 import asyncio
+import heapq
 import logging
 import time
 from functools import cached_property
@@ -46,6 +47,36 @@ def get_traced_jetstream(nc: NATSClient, service_name: str) -> JetStreamContext:
     return jetstream
 
 
+class SeqidTracker:
+    """
+    Keeps track of the messages of a partition being processed out of order
+    to know up to which seqid all of them are done.
+    """
+
+    def __init__(self, last_seqid: int = 0):
+        self.last_seqid = last_seqid
+        self.pending: list[int] = []
+        self.done: set[int] = set()
+
+    def start(self, seqid: int) -> None:
+        if seqid <= self.last_seqid or seqid in self.pending:
+            # redelivery of a message we're already tracking
+            return
+        heapq.heappush(self.pending, seqid)
+
+    def finish(self, seqid: int) -> int:
+        """
+        Mark a message as done and return the highest seqid up to which all
+        messages are done.
+        """
+        if seqid in self.pending:
+            self.done.add(seqid)
+        while self.pending and self.pending[0] in self.done:
+            self.done.remove(self.pending[0])
+            self.last_seqid = heapq.heappop(self.pending)
+        return self.last_seqid
+
+
 class NatsConnectionManager:
     _nc: NATSClient
     _subscriptions: list[tuple[Subscription, Callable[[], Awaitable[None]]]]
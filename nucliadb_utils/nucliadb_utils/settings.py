@@ -90,6 +90,12 @@ class StorageSettings(BaseSettings):
     )
     upload_token_expiration: Optional[int] = 3
 
+    # Objects of this size or bigger are downloaded with concurrent range
+    # requests on the storages supporting them (0 disables it)
+    ranged_download_min_size: int = 64 * 1024 * 1024
+    ranged_download_part_size: int = 16 * 1024 * 1024
+    ranged_download_concurrency: int = 4
+
     driver_pg_url: Optional[str] = None  # match same env var for k/v storage
 
 
@@ -142,6 +148,9 @@ class IndexingSettings(BaseSettings):
     index_jetstream_servers: List[str] = []
     index_jetstream_auth: Optional[str] = None
     index_local: bool = False
+    # Index messages bigger than this many bytes are split in parts holding
+    # a subset of the paragraphs, stored and sent to the node one by one
+    index_message_part_size: int = 32 * 1024 * 1024
 
 
 indexing_settings = IndexingSettings()
@@ -22,6 +22,7 @@ from __future__ import annotations
 import asyncio
 import base64
 import json
+import re
 import socket
 from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
@@ -47,10 +48,21 @@ from nucliadb_utils.storages.exceptions import (
     InvalidOffset,
     ResumableUploadGone,
 )
-from nucliadb_utils.storages.storage import Storage, StorageField
+from nucliadb_utils.storages.storage import (
+    Storage,
+    StorageField,
+    content_range_size,
+)
 
 storage_ops_observer = metrics.Observer("gcs_ops", labels={"type": ""})
 
+# https://cloud.google.com/storage/docs/batch
+BATCH_MAX_REQUESTS = 100
+BATCH_BOUNDARY = "nucliadb_batch"
+BATCH_RESPONSE_RE = re.compile(
+    r"Content-ID: <response-(\d+)>.*?HTTP/1\.1 (\d{3})", re.DOTALL
+)
+
 
 def strip_query_params(url: yarl.URL) -> str:
     return str(url.with_query(None))
@@ -174,6 +186,10 @@ class GCSStorageField(StorageField):
                         content={f"Google cloud invalid credentials : \n {text}"}
                     )
                 raise GoogleCloudException(f"{api_resp.status}: {text}")
+            if api_resp.status == 206:
+                self.range_total_size = content_range_size(
+                    api_resp.headers.get("Content-Range")
+                )
             while True:
                 chunk = await api_resp.content.read(1024 * 1024)
                 if len(chunk) > 0:
@@ -460,6 +476,7 @@ class GCSStorage(Storage):
             url + "/upload/storage/v1/b/{bucket}/o?uploadType=resumable"
         )  # noqa
         self.object_base_url = url + "/storage/v1/b"
+        self.batch_url = url + "/batch/storage/v1"
         self._client = None
 
     def _get_access_token(self):
@@ -532,6 +549,49 @@ class GCSStorage(Storage):
         else:
             raise AttributeError("No valid uri")
 
+    @storage_ops_observer.wrap({"type": "delete_batch"})
+    async def delete_uploads(self, uris: List[str], bucket_name: str) -> None:
+        if self.session is None:
+            raise AttributeError()
+        failed: List[str] = []
+        for index in range(0, len(uris), BATCH_MAX_REQUESTS):
+            batch = uris[index : index + BATCH_MAX_REQUESTS]
+            failed.extend(await self._delete_batch(batch, bucket_name))
+        # what could not be deleted on a batch is retried one by one
+        await super().delete_uploads(failed, bucket_name)
+
+    async def _delete_batch(self, uris: List[str], bucket_name: str) -> List[str]:
+        """
+        Delete objects with a single batch request. Returns the uris that
+        could not be deleted.
+        """
+        body = ""
+        for index, uri in enumerate(uris):
+            path = f"/storage/v1/b/{bucket_name}/o/{quote_plus(uri)}"
+            body += (
+                f"--{BATCH_BOUNDARY}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <{index}>\r\n\r\n"
+                f"DELETE {path} HTTP/1.1\r\n\r\n"
+            )
+        body += f"--{BATCH_BOUNDARY}--\r\n"
+        headers = await self.get_access_headers()
+        headers["Content-Type"] = f"multipart/mixed; boundary={BATCH_BOUNDARY}"
+        async with self.session.post(
+            self.batch_url, headers=headers, data=body
+        ) as resp:
+            if resp.status != 200:
+                text = await resp.text()
+                logger.warning(f"Batch deletion failed: {resp.status}: {text}")
+                return uris
+            text = await resp.text()
+
+        deleted = set()
+        for match in BATCH_RESPONSE_RE.finditer(text):
+            if int(match.group(2)) in (200, 204, 404):
+                deleted.add(int(match.group(1)))
+        return [uri for index, uri in enumerate(uris) if index not in deleted]
+
     @storage_ops_observer.wrap({"type": "check_bucket_exists"})
     async def check_exists(self, bucket_name: str):
         if self.session is None:
@@ -19,6 +19,7 @@
 #
 from __future__ import annotations
 
+import asyncio
 import glob
 import json
 import os
@@ -84,9 +85,9 @@ class LocalStorageField(StorageField):
 
         path = self.storage.get_bucket_path(bucket)
 
-        async with aiofiles.open(self.get_file_path(path, key)) as resp:
+        async with aiofiles.open(self.get_file_path(path, key), "rb") as resp:
             data = await resp.read(CHUNK_SIZE)
-            while data is not None:
+            while data:
                 yield data
                 data = await resp.read(CHUNK_SIZE)
 
@@ -106,7 +107,7 @@ class LocalStorageField(StorageField):
             await resp.seek(start)
             count = 0
             data = await resp.read(CHUNK_SIZE)
-            while data is not None and count < end:
+            while data and count < end:
                 if count + len(data) > end:
                     new_end = end - count
                     data = data[:new_end]
@@ -148,7 +149,12 @@ class LocalStorageField(StorageField):
         init_url = f"{path}/{upload_uri}"
         metadata_init_url = self.metadata_key(init_url)
         metadata = json.dumps(
-            {"FILENAME": cf.filename, "SIZE": cf.size, "CONTENT_TYPE": cf.content_type}
+            {
+                "FILENAME": cf.filename,
+                "SIZE": cf.size,
+                "CONTENT_TYPE": cf.content_type,
+                "MD5": cf.md5,
+            }
         )
 
         path_to_create = os.path.dirname(metadata_init_url)
@@ -204,6 +210,13 @@ class LocalStorageField(StorageField):
                 return json.loads(await metadata.read())
         return None
 
+    def local_path(self) -> Optional[str]:
+        bucket_path = self.storage.get_bucket_path(self.bucket)
+        file_path = f"{bucket_path}/{self.key}"
+        if os.path.isfile(file_path):
+            return file_path
+        return None
+
     async def upload(self, iterator: AsyncIterator, origin: CloudFile) -> CloudFile:
         self.field = await self.start(origin)
         if self.field is None:
@@ -262,6 +275,19 @@ class LocalStorage(Storage):
         file_path = f"{path}/{uri}"
         os.remove(file_path)
 
+    async def delete_prefix(self, bucket: str, prefix: str) -> None:
+        path = f"{self.get_bucket_path(bucket)}/{prefix}"
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._delete_path_prefix, path)
+
+    def _delete_path_prefix(self, path: str) -> None:
+        # directories matching the prefix only hold keys with the prefix
+        for match in glob.glob(f"{glob.escape(path)}*"):
+            if os.path.isdir(match):
+                shutil.rmtree(match, ignore_errors=True)
+            else:
+                os.remove(match)
+
     async def schedule_delete_kb(self, kbid: str):
         bucket = self.get_bucket_name(kbid)
         path = self.get_bucket_path(bucket)
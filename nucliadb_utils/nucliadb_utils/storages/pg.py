@@ -52,6 +52,11 @@ CREATE TABLE IF NOT EXISTS kb_files_fileparts (
 );
 """
 
+# Parts fetched on each round trip when streaming a file
+FETCH_BATCH_PARTS = 10
+# Parts written with a single insert when uploading a file
+INSERT_BATCH_PARTS = 10
+
 
 class FileInfo(TypedDict):
     filename: str
@@ -69,6 +74,19 @@ class Chunk(ChunkInfo):
     data: bytes
 
 
+async def batch_chunks(
+    iterable: AsyncIterator[bytes], size: int
+) -> AsyncIterator[list[bytes]]:
+    batch: list[bytes] = []
+    async for chunk in iterable:
+        batch.append(chunk)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
+
+
 class PostgresFileDataLayer:
     """
     Responsible for interating with the database and
@@ -101,6 +119,28 @@ WHERE kb_id = $1
             )
         return True
 
+    async def delete_files_with_prefix(self, kb_id: str, prefix: str) -> None:
+        # escape LIKE wildcards, backslash being the default escape character
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        pattern = escaped + "%"
+        async with self.connection.transaction():
+            await self.connection.execute(
+                """
+DELETE FROM kb_files
+WHERE kb_id = $1 AND file_id LIKE $2
+""",
+                kb_id,
+                pattern,
+            )
+            await self.connection.execute(
+                """
+DELETE FROM kb_files_fileparts
+WHERE kb_id = $1 AND file_id LIKE $2
+""",
+                kb_id,
+                pattern,
+            )
+
     async def create_file(
         self, *, kb_id: str, file_id: str, filename: str, size: int, content_type: str
     ) -> None:
@@ -155,6 +195,24 @@ VALUES (
                 len(data),
             )
 
+    async def append_chunks(
+        self, *, kb_id: str, file_id: str, chunks: list[bytes]
+    ) -> None:
+        async with self.connection.transaction():
+            await self.connection.execute(
+                """
+INSERT INTO kb_files_fileparts (kb_id, file_id, part_id, data, size)
+SELECT $1, $2, last_part.id + chunk.position, chunk.data, octet_length(chunk.data)
+FROM (
+    SELECT COALESCE(MAX(part_id), 0) AS id
+    FROM kb_files_fileparts WHERE kb_id = $1 AND file_id = $2
+) AS last_part, unnest($3::bytea[]) WITH ORDINALITY AS chunk(data, position)
+""",
+                kb_id,
+                file_id,
+                chunks,
+            )
+
     async def get_file_info(self, kb_id: str, file_id: str) -> Optional[FileInfo]:
         record = await self.connection.fetchrow(
             """
@@ -307,25 +365,33 @@ WHERE kb_id = $1
     async def iterate_chunks(
         self, bucket: str, key: str, part_ids: Optional[list[int]] = None
     ) -> AsyncIterator[Chunk]:
-        chunks = await self.get_chunks_info(bucket, key, part_ids=part_ids)
-        for chunk in chunks:
-            # who knows how long a download for one of these chunks could be,
-            # so let's not try to keep a txn or cursor open.
-            data_chunk = await self.connection.fetchrow(
-                """
-select data
+        query = """
+select part_id, size, data
 from kb_files_fileparts
-where kb_id = $1 and file_id = $2 and part_id = $3
-""",
-                bucket,
-                key,
-                chunk["part_id"],
-            )
-            yield Chunk(
-                part_id=chunk["part_id"],
-                size=chunk["size"],
-                data=data_chunk["data"],
+where kb_id = $1 and file_id = $2 and part_id > $3
+"""
+        filters: list[Any] = []
+        if part_ids is not None:
+            query += " and part_id = ANY($5)"
+            filters.append(part_ids)
+        query += " order by part_id limit $4"
+        # Parts are read FETCH_BATCH_PARTS at a time, each batch starting after
+        # the last part of the previous one, so no transaction is held open
+        # while the caller consumes them.
+        last_part_id = -1
+        while True:
+            records = await self.connection.fetch(
+                query, bucket, key, last_part_id, FETCH_BATCH_PARTS, *filters
             )
+            for record in records:
+                yield Chunk(
+                    part_id=record["part_id"],
+                    size=record["size"],
+                    data=record["data"],
+                )
+            if len(records) < FETCH_BATCH_PARTS:
+                break
+            last_part_id = records[-1]["part_id"]
 
     async def iterate_range(
         self, *, kb_id: str, file_id: str, start: int, end: int
@@ -335,46 +401,28 @@ where kb_id = $1 and file_id = $2 and part_id = $3
             file_id,
         )
 
-        # First off, find start part and position
+        # First off, find the parts holding the range and the start position
+        # on the first one
         elapsed = 0
-        start_part_id = None
-        start_pos = -1
+        part_ids = []
+        start_pos = 0
         for chunk in chunks:
-            if elapsed + chunk["size"] > start:
-                start_part_id = chunk["part_id"]
-                start_pos = start - elapsed
-                break
-            else:
-                elapsed += chunk["size"]
+            if elapsed + chunk["size"] > start and elapsed < end:
+                if len(part_ids) == 0:
+                    start_pos = start - elapsed
+                part_ids.append(chunk["part_id"])
+            elapsed += chunk["size"]
 
-        if start_part_id is None:
+        if len(part_ids) == 0:
             return
 
-        # Now, iterate through the chunks and yield the data
-        read_bytes = 0
-        while read_bytes < end - start:
-            data_chunk = await self.connection.fetchrow(
-                """
-select data
-from kb_files_fileparts
-where kb_id = $1 and file_id = $2 and part_id = $3
-""",
-                kb_id,
-                file_id,
-                start_part_id,
-            )
-            if data_chunk is None:
-                return
-
-            data = data_chunk["data"][
-                start_pos : min(
-                    start_pos + ((end - start) - read_bytes), len(data_chunk["data"])
-                )
-            ]
-            read_bytes += len(data)
-            yield data
+        # Now, stream those parts and slice the first and the last ones
+        pending = end - start
+        async for chunk in self.iterate_chunks(kb_id, file_id, part_ids=part_ids):
+            data = chunk["data"][start_pos : start_pos + pending]
+            pending -= len(data)
             start_pos = 0
-            start_part_id += 1
+            yield data
 
 
 class PostgresStorageField(StorageField):
@@ -478,15 +526,14 @@ class PostgresStorageField(StorageField):
         count = 0
         async with self.storage.pool.acquire() as conn:
             dl = PostgresFileDataLayer(conn)
-            async for chunk in iterable:
-                await dl.append_chunk(
-                    kb_id=self.bucket,
-                    file_id=cf.upload_uri or self.field.upload_uri,
-                    data=chunk,
+            file_id = cf.upload_uri or self.field.upload_uri
+            async for chunks in batch_chunks(iterable, INSERT_BATCH_PARTS):
+                await dl.append_chunks(
+                    kb_id=self.bucket, file_id=file_id, chunks=chunks
                 )
-                size = len(chunk)
+                size = sum(len(chunk) for chunk in chunks)
                 count += size
-                self.field.offset += len(chunk)
+                self.field.offset += size
         return count
 
     async def finish(self):
@@ -568,6 +615,11 @@ class PostgresStorage(Storage):
             dl = PostgresFileDataLayer(conn)
             await dl.delete_file(bucket_name, uri)
 
+    async def delete_prefix(self, bucket: str, prefix: str) -> None:
+        async with self.pool.acquire() as conn:
+            dl = PostgresFileDataLayer(conn)
+            await dl.delete_files_with_prefix(bucket, prefix)
+
     async def schedule_delete_kb(self, kbid: str) -> bool:
         await self.delete_kb(kbid)
         return True
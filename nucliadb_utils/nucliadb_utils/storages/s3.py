@@ -19,9 +19,10 @@
 #
 from __future__ import annotations
 
+import asyncio
 from contextlib import AsyncExitStack
 from datetime import datetime
-from typing import Any, AsyncIterator, Optional
+from typing import Any, AsyncIterator, List, Optional
 
 import aiobotocore  # type: ignore
 import aiohttp
@@ -31,7 +32,12 @@ from aiobotocore.session import AioSession, get_session  # type: ignore
 from nucliadb_protos.resources_pb2 import CloudFile
 
 from nucliadb_utils import logger
-from nucliadb_utils.storages.storage import Storage, StorageField
+from nucliadb_utils.storages.storage import (
+    DELETE_CONCURRENCY,
+    Storage,
+    StorageField,
+    content_range_size,
+)
 
 MAX_SIZE = 1073741824
 
@@ -79,6 +85,8 @@ class S3StorageField(StorageField):
             bucket = self.field.bucket_name
 
         downloader = await self._download(uri, bucket, **kwargs)
+        if "ContentRange" in downloader:
+            self.range_total_size = content_range_size(downloader["ContentRange"])
 
         # we do not want to timeout ever from this...
         # downloader['Body'].set_socket_timeout(999999)
@@ -90,6 +98,9 @@ class S3StorageField(StorageField):
             yield data
             data = await stream.read(CHUNK_SIZE)
 
+    async def range_supported(self) -> bool:
+        return True
+
     async def read_range(self, start: int, end: int) -> AsyncIterator[bytes]:
         """
         Iterate through ranges of data
@@ -348,6 +359,43 @@ class S3Storage(Storage):
         else:
             raise AttributeError("No valid uri")
 
+    async def delete_uploads(self, uris: List[str], bucket_name: str) -> None:
+        failed: List[str] = []
+        # DeleteObjects takes up to 1000 keys per request
+        for index in range(0, len(uris), self.delete_batch_size):
+            batch = uris[index : index + self.delete_batch_size]
+            failed.extend(await self._delete_batch(batch, bucket_name))
+        # what could not be deleted on a batch is retried one by one, errors
+        # are raised so callers do not take the objects as deleted
+        semaphore = asyncio.Semaphore(DELETE_CONCURRENCY)
+
+        async def delete(uri: str):
+            async with semaphore:
+                await self._s3aioclient.delete_object(Bucket=bucket_name, Key=uri)
+
+        await asyncio.gather(*[delete(uri) for uri in failed])
+
+    async def _delete_batch(self, uris: List[str], bucket_name: str) -> List[str]:
+        """
+        Delete objects with a single DeleteObjects request. Returns the uris
+        that could not be deleted.
+        """
+        try:
+            response = await self._s3aioclient.delete_objects(
+                Bucket=bucket_name,
+                Delete={"Objects": [{"Key": uri} for uri in uris], "Quiet": True},
+            )
+        except botocore.exceptions.ClientError:
+            logger.warning("Error deleting objects", exc_info=True)
+            return uris
+        failed = []
+        for error in response.get("Errors", []):
+            logger.warning(
+                f"Error deleting object {error.get('Key')}: {error.get('Message')}"
+            )
+            failed.append(error["Key"])
+        return failed
+
     async def iterate_bucket(
         self, bucket: str, prefix: str = "/"
     ) -> AsyncIterator[Any]:
@@ -20,13 +20,16 @@
 from __future__ import annotations
 
 import abc
+import asyncio
 import hashlib
+import re
 from io import BytesIO
 from typing import (
     Any,
     AsyncGenerator,
     AsyncIterator,
     Dict,
+    Iterator,
     List,
     Optional,
     Tuple,
@@ -40,6 +43,7 @@ from nucliadb_protos.resources_pb2 import CloudFile
 from nucliadb_protos.writer_pb2 import BrokerMessage
 
 from nucliadb_utils import logger
+from nucliadb_utils.settings import indexing_settings, storage_settings
 from nucliadb_utils.storages import CHUNK_SIZE
 from nucliadb_utils.storages.exceptions import IndexDataNotFound, InvalidCloudFile
 from nucliadb_utils.utilities import get_local_storage, get_nuclia_storage
@@ -53,6 +57,84 @@ STORAGE_FILE_EXTRACTED = "kbs/{kbid}/r/{uuid}/e/{field_type}/{field}/{key}"
 DEADLETTER = "deadletter/{partition}/{seqid}/{seq}"
 OLD_INDEXING_KEY = "index/{node}/{shard}/{txid}"
 INDEXING_KEY = "index/{kb}/{shard}/{resource}/{txid}"
+INDEXING_PARTS_KEY = "{key}/parts/{parts}"
+INDEXING_PART_KEY = "{key}/{part}"
+INDEXING_PARTS_RE = re.compile(r"/parts/(\d+)$")
+
+# Objects deleted at once by storages without bulk deletion
+DELETE_CONCURRENCY = 20
+
+
+def content_range_size(content_range: Optional[str]) -> Optional[int]:
+    """
+    Total size of an object from the Content-Range of a range read, i.e.
+    `bytes 0-1023/4096`. None if the storage does not know it.
+    """
+    if not content_range or "/" not in content_range:
+        return None
+    total = content_range.rsplit("/", 1)[1]
+    return int(total) if total.isdigit() else None
+
+
+def plan_index_message_parts(
+    message: BrainResource, max_part_size: int
+) -> List[List[Tuple[str, str]]]:
+    """
+    Group the paragraphs of an index message, as (field, paragraph id) pairs,
+    in parts of about `max_part_size` bytes. Every part also holds the texts
+    and metadata of the resource, as the node needs them to index paragraphs.
+    """
+    head_size = _index_message_head(message).ByteSize()
+    parts: List[List[Tuple[str, str]]] = [[]]
+    size = head_size
+    for field, paragraphs in message.paragraphs.items():
+        for paragraph_id, paragraph in paragraphs.paragraphs.items():
+            paragraph_size = paragraph.ByteSize() + len(field) + len(paragraph_id)
+            if parts[-1] and size + paragraph_size > max_part_size:
+                parts.append([])
+                size = head_size
+            parts[-1].append((field, paragraph_id))
+            size += paragraph_size
+    return parts
+
+
+def build_index_message_parts(
+    message: BrainResource, plan: List[List[Tuple[str, str]]]
+) -> Iterator[BrainResource]:
+    """
+    Build the parts of an index message, one at a time. Deletions, relations
+    and user vectors only go with the first one.
+    """
+    for index, paragraph_ids in enumerate(plan):
+        part = _index_message_head(message)
+        if index == 0:
+            part.paragraphs_to_delete.extend(message.paragraphs_to_delete)
+            part.sentences_to_delete.extend(message.sentences_to_delete)
+            part.relations.extend(message.relations)
+            part.relations_to_delete.extend(message.relations_to_delete)
+            for vectorset, vectors in message.vectors.items():
+                part.vectors[vectorset].CopyFrom(vectors)
+            for vectorset, vectors_list in message.vectors_to_delete.items():
+                part.vectors_to_delete[vectorset].CopyFrom(vectors_list)
+        for field, paragraph_id in paragraph_ids:
+            part.paragraphs[field].paragraphs[paragraph_id].CopyFrom(
+                message.paragraphs[field].paragraphs[paragraph_id]
+            )
+        yield part
+
+
+def _index_message_head(message: BrainResource) -> BrainResource:
+    head = BrainResource()
+    if message.HasField("resource"):
+        head.resource.CopyFrom(message.resource)
+    if message.HasField("metadata"):
+        head.metadata.CopyFrom(message.metadata)
+    for field, text in message.texts.items():
+        head.texts[field].CopyFrom(text)
+    head.labels.extend(message.labels)
+    head.status = message.status
+    head.shard_id = message.shard_id
+    return head
 
 
 class StorageField:
@@ -79,6 +161,12 @@ class StorageField:
     async def iter_data(self, headers=None):
         raise NotImplementedError()
 
+    async def range_supported(self) -> bool:
+        return False
+
+    # Total size of the object, as told by the storage on the last range read
+    range_total_size: Optional[int] = None
+
     async def read_range(self, start: int, end: int) -> AsyncIterator[bytes]:
         """
         Iterate through ranges of data
@@ -86,6 +174,13 @@ class StorageField:
         raise NotImplementedError()
         yield b""  # pragma: no cover
 
+    def local_path(self) -> Optional[str]:
+        """
+        Path of the object on the local filesystem, for backends keeping their
+        objects there so they can be served straight from disk.
+        """
+        return None
+
     async def delete(self) -> bool:
         deleted = False
         if self.field is not None:
@@ -139,15 +234,40 @@ class Storage:
     indexing_bucket: Optional[str] = None
     cached_buckets: List[str] = []
     chunk_size = CHUNK_SIZE
+    delete_batch_size = 1000
 
     async def delete_resource(self, kbid: str, uuid: str):
         # Delete all keys inside a resource
         bucket = self.get_bucket_name(kbid)
         resource_storage_base_path = STORAGE_RESOURCE.format(kbid=kbid, uuid=uuid)
-        async for bucket_info in self.iterate_bucket(
-            bucket, resource_storage_base_path
-        ):
-            await self.delete_upload(bucket_info["name"], bucket)
+        await self.delete_prefix(bucket, resource_storage_base_path)
+
+    async def delete_prefix(self, bucket: str, prefix: str) -> None:
+        """
+        Delete all the objects of a bucket whose keys start with `prefix`.
+        Keys are listed and deleted in batches of `delete_batch_size`.
+        """
+        keys: List[str] = []
+        async for bucket_info in self.iterate_bucket(bucket, prefix):
+            keys.append(bucket_info["name"])
+            if len(keys) >= self.delete_batch_size:
+                await self.delete_uploads(keys, bucket)
+                keys = []
+        if len(keys) > 0:
+            await self.delete_uploads(keys, bucket)
+
+    async def delete_uploads(self, uris: List[str], bucket_name: str) -> None:
+        """
+        Delete a batch of objects. Storages with bulk deletion APIs override it,
+        by default objects are deleted one by one, `DELETE_CONCURRENCY` at a time.
+        """
+        semaphore = asyncio.Semaphore(DELETE_CONCURRENCY)
+
+        async def delete(uri: str):
+            async with semaphore:
+                await self.delete_upload(uri, bucket_name)
+
+        await asyncio.gather(*[delete(uri) for uri in uris])
 
     async def deadletter(
         self, message: BrokerMessage, seq: int, seqid: int, partition: str
@@ -184,9 +304,10 @@ class Storage:
             resource_uid=message.resource.uuid,
             txid=txid,
         )
-        await self.uploadbytes(self.indexing_bucket, key, message.SerializeToString())
+        key = await self.upload_indexing(key, message)
         response = IndexMessage()
         response.txid = txid
+        response.resource = message.resource.uuid
         response.typemessage = TypeMessage.CREATION
         response.storage_key = key
         response.kbid = kb
@@ -210,13 +331,12 @@ class Storage:
             resource_uid=message.resource.uuid,
             txid=reindex_id,
         )
-        logger.info("Starting to serialize message")
-        message_serialized = message.SerializeToString()
-        logger.info("Starting to upload bytes")
-        await self.uploadbytes(self.indexing_bucket, key, message_serialized)
-        logger.info("Finished to upload bytes")
+        logger.info("Starting to upload index message")
+        key = await self.upload_indexing(key, message)
+        logger.info("Finished to upload index message")
         response = IndexMessage()
         response.reindex_id = reindex_id
+        response.resource = message.resource.uuid
         response.typemessage = TypeMessage.CREATION
         response.storage_key = key
         response.kbid = kb
@@ -224,24 +344,48 @@ class Storage:
             response.partition = partition
         return response
 
-    async def get_indexing(self, payload: IndexMessage) -> BrainResource:
+    async def upload_indexing(self, key: str, message: BrainResource) -> str:
+        """
+        Store an index message and return the key the node has to read it
+        from. Big messages are stored in parts, so neither side needs to
+        serialize or parse the whole of them at once.
+        """
         if self.indexing_bucket is None:
             raise AttributeError()
+        max_part_size = indexing_settings.index_message_part_size
+        if message.ByteSize() <= max_part_size:
+            await self.uploadbytes(
+                self.indexing_bucket, key, message.SerializeToString()
+            )
+            return key
+
+        plan = plan_index_message_parts(message, max_part_size)
+        key = INDEXING_PARTS_KEY.format(key=key, parts=len(plan))
+        for index, part in enumerate(build_index_message_parts(message, plan)):
+            await self.uploadbytes(
+                self.indexing_bucket,
+                INDEXING_PART_KEY.format(key=key, part=index),
+                part.SerializeToString(),
+            )
+        return key
+
+    def get_indexing_key(self, payload: IndexMessage) -> str:
         if payload.storage_key:
-            key = payload.storage_key
-        else:
-            # b/w compatibility
-            if payload.txid == 0:
-                key = OLD_INDEXING_KEY.format(
-                    node=payload.node,
-                    shard=payload.shard,
-                    txid=payload.reindex_id,
-                )
-            else:
-                key = OLD_INDEXING_KEY.format(
-                    node=payload.node, shard=payload.shard, txid=payload.txid
-                )
+            return payload.storage_key
+        # b/w compatibility
+        if payload.txid == 0:
+            return OLD_INDEXING_KEY.format(
+                node=payload.node,
+                shard=payload.shard,
+                txid=payload.reindex_id,
+            )
+        return OLD_INDEXING_KEY.format(
+            node=payload.node, shard=payload.shard, txid=payload.txid
+        )
 
+    async def download_indexing(self, key: str) -> BrainResource:
+        if self.indexing_bucket is None:
+            raise AttributeError()
         bytes_buffer = await self.downloadbytes(self.indexing_bucket, key)
         if bytes_buffer.getbuffer().nbytes == 0:
             raise IndexDataNotFound(f'Indexing data not found for key "{key}"')
@@ -250,6 +394,38 @@ class Storage:
         bytes_buffer.flush()
         return pb
 
+    async def iter_indexing(
+        self, payload: IndexMessage
+    ) -> AsyncGenerator[BrainResource, None]:
+        """
+        Yield the parts of an index message one by one. Each of them can be
+        sent to the node writer as a resource on its own.
+        """
+        if self.indexing_bucket is None:
+            raise AttributeError()
+        key = self.get_indexing_key(payload)
+        match = INDEXING_PARTS_RE.search(key)
+        if match is None:
+            yield await self.download_indexing(key)
+            return
+        for index in range(int(match.group(1))):
+            yield await self.download_indexing(
+                INDEXING_PART_KEY.format(key=key, part=index)
+            )
+
+    async def get_indexing(self, payload: IndexMessage) -> BrainResource:
+        if self.indexing_bucket is None:
+            raise AttributeError()
+        pb: Optional[BrainResource] = None
+        async for part in self.iter_indexing(payload):
+            if pb is None:
+                pb = part
+                continue
+            for field, paragraphs in part.paragraphs.items():
+                pb.paragraphs[field].paragraphs.MergeFrom(paragraphs.paragraphs)
+        assert pb is not None
+        return pb
+
     async def delete_indexing(
         self,
         resource_uid: str,
@@ -439,6 +615,17 @@ class Storage:
             yield None
 
     async def downloadbytes(self, bucket: str, key: str) -> BytesIO:
+        destination: StorageField = self.field_klass(
+            storage=self, bucket=bucket, fullkey=key
+        )
+        if (
+            storage_settings.ranged_download_min_size > 0
+            and await destination.range_supported()
+        ):
+            ranged = await self._download_ranges(destination)
+            if ranged is not None:
+                return ranged
+
         result = BytesIO()
         async for data in self.download(bucket, key):
             if data is not None:
@@ -447,6 +634,68 @@ class Storage:
         result.seek(0)
         return result
 
+    async def _download_ranges(self, destination: StorageField) -> Optional[BytesIO]:
+        """
+        Download an object by ranges. The first range tells the size of the
+        object: if it is big enough, the rest is downloaded with concurrent
+        range requests, each one of them writing its data on its place of a
+        preallocated buffer. Otherwise it is downloaded with a single one.
+
+        None if the size is not known, so the object has to be downloaded
+        sequentially.
+        """
+        part_size = storage_settings.ranged_download_part_size
+        first = BytesIO()
+        try:
+            async for chunk in destination.read_range(0, part_size):
+                first.write(chunk)
+        except Exception:
+            # i.e. missing or empty objects, which have no range to read
+            logger.debug(f"Could not read first range of {destination.key}")
+            return None
+        size = destination.range_total_size
+        if first.tell() < part_size or (size is not None and size <= first.tell()):
+            # the object ended within the first range
+            first.seek(0)
+            return first
+        if size is None:
+            return None
+
+        ranges = [(first.tell(), size)]
+        if size >= storage_settings.ranged_download_min_size:
+            ranges = [
+                (start, min(start + part_size, size))
+                for start in range(first.tell(), size, part_size)
+            ]
+        semaphore = asyncio.Semaphore(storage_settings.ranged_download_concurrency)
+        result = BytesIO(bytes(size))
+        with result.getbuffer() as buffer:
+            buffer[: first.tell()] = first.getbuffer()
+            del first
+
+            async def download_range(start: int, end: int):
+                async with semaphore:
+                    offset = start
+                    async for chunk in destination.read_range(start, end):
+                        buffer[offset : offset + len(chunk)] = chunk
+                        offset += len(chunk)
+                if offset != end:
+                    raise IOError(
+                        f"Got {offset - start} bytes on range {start}-{end} "
+                        f"of {destination.key}"
+                    )
+
+            tasks = [
+                asyncio.create_task(download_range(start, end)) for start, end in ranges
+            ]
+            try:
+                await asyncio.gather(*tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        return result
+
     async def downloadbytescf(self, cf: CloudFile) -> BytesIO:  # pragma: no cover
         # this is covered by other tests
         result = BytesIO()
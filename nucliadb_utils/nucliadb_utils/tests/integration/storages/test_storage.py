@@ -48,6 +48,21 @@ async def test_local_driver(local_storage: LocalStorage):
     await storage_test(local_storage)
 
 
+@pytest.mark.asyncio
+async def test_local_driver_local_path(local_storage: LocalStorage):
+    kbid = uuid4().hex
+    assert await local_storage.create_kb(kbid)
+    bucket = local_storage.get_bucket_name(kbid)
+    field = local_storage.field_klass(storage=local_storage, bucket=bucket, fullkey="k")
+    assert field.local_path() is None
+
+    await local_storage.uploadbytes(bucket, "k", b"mytestinfo")
+
+    with open(field.local_path(), "rb") as f:
+        assert f.read() == b"mytestinfo"
+    assert [data async for data in field.iter_data()] == [b"mytestinfo"]
+
+
 async def storage_test(storage: Storage):
     example = b"mytestinfo"
     key1 = "mytest1"
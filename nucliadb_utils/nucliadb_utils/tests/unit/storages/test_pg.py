@@ -31,6 +31,22 @@ async def iter_result(data):
         yield item
 
 
+def parts_fetch(chunk_info, chunk_data):
+    def fetch(query, kb_id, file_id, *args):
+        if "part_id >" not in query:
+            return chunk_info
+        last_part_id, limit, *filters = args
+        part_ids = filters[0] if filters else None
+        return [
+            chunk
+            for chunk in chunk_data
+            if chunk["part_id"] > last_part_id
+            and (part_ids is None or chunk["part_id"] in part_ids)
+        ][:limit]
+
+    return AsyncMock(side_effect=fetch)
+
+
 @pytest.fixture
 def transaction():
     yield MagicMock(return_value=AsyncMock())
@@ -161,6 +177,17 @@ class TestPostgresFileDataLayer:
 
         connection.execute.assert_awaited_once_with(ANY, "kb_id", "file_id", b"data", 4)
 
+    async def test_append_chunks(
+        self, data_layer: pg.PostgresFileDataLayer, connection
+    ):
+        await data_layer.append_chunks(
+            kb_id="kb_id", file_id="file_id", chunks=[b"data1", b"data2"]
+        )
+
+        connection.execute.assert_awaited_once_with(
+            ANY, "kb_id", "file_id", [b"data1", b"data2"]
+        )
+
     async def test_get_file_info(
         self, data_layer: pg.PostgresFileDataLayer, connection
     ):
@@ -265,8 +292,7 @@ class TestPostgresFileDataLayer:
     async def test_iterate_range(
         self, data_layer: pg.PostgresFileDataLayer, connection, chunk_info, chunk_data
     ):
-        connection.fetch.return_value = chunk_info
-        connection.fetchrow.side_effect = chunk_data
+        connection.fetch = parts_fetch(chunk_info, chunk_data)
 
         chunks = []
         async for chunk in data_layer.iterate_range(
@@ -279,8 +305,7 @@ class TestPostgresFileDataLayer:
     async def test_iterate_range_start_part(
         self, data_layer: pg.PostgresFileDataLayer, connection, chunk_info, chunk_data
     ):
-        connection.fetch.return_value = chunk_info
-        connection.fetchrow.side_effect = chunk_data
+        connection.fetch = parts_fetch(chunk_info, chunk_data)
 
         chunks = []
         async for chunk in data_layer.iterate_range(
@@ -293,8 +318,7 @@ class TestPostgresFileDataLayer:
     async def test_iterate_range_middle_part(
         self, data_layer: pg.PostgresFileDataLayer, connection, chunk_info, chunk_data
     ):
-        connection.fetch.return_value = chunk_info
-        connection.fetchrow.side_effect = chunk_data[1:]
+        connection.fetch = parts_fetch(chunk_info, chunk_data)
 
         chunks = []
         async for chunk in data_layer.iterate_range(
@@ -307,8 +331,7 @@ class TestPostgresFileDataLayer:
     async def test_iterate_range_end_part(
         self, data_layer: pg.PostgresFileDataLayer, connection, chunk_info, chunk_data
     ):
-        connection.fetch.return_value = chunk_info
-        connection.fetchrow.side_effect = chunk_data[2:]
+        connection.fetch = parts_fetch(chunk_info, chunk_data)
 
         chunks = []
         async for chunk in data_layer.iterate_range(
@@ -321,8 +344,7 @@ class TestPostgresFileDataLayer:
     async def test_iterate_range_cross_all(
         self, data_layer: pg.PostgresFileDataLayer, connection, chunk_info, chunk_data
     ):
-        connection.fetch.return_value = chunk_info
-        connection.fetchrow.side_effect = chunk_data
+        connection.fetch = parts_fetch(chunk_info, chunk_data)
 
         chunks = []
         async for chunk in data_layer.iterate_range(
@@ -332,6 +354,24 @@ class TestPostgresFileDataLayer:
 
         assert chunks == [b"ta1", b"data2", b"dat"]
 
+    async def test_iterate_chunks_in_batches(
+        self, data_layer: pg.PostgresFileDataLayer, connection, chunk_info, chunk_data
+    ):
+        connection.fetch = parts_fetch(chunk_info, chunk_data)
+
+        with patch.object(pg, "FETCH_BATCH_PARTS", 2):
+            chunks = [
+                chunk["data"]
+                async for chunk in data_layer.iterate_chunks("kb_id", "file_id")
+            ]
+
+        assert chunks == [b"data1", b"data2", b"data3"]
+        assert [fetch.args[3:] for fetch in connection.fetch.call_args_list] == [
+            (-1, 2),
+            (1, 2),
+        ]
+        connection.transaction.assert_not_called()
+
 
 class TestPostgresStorageField:
     @pytest.fixture()
@@ -407,8 +447,7 @@ class TestPostgresStorageField:
         field,
     ):
         storage_field.field = field
-        connection.fetch.return_value = chunk_info
-        connection.fetchrow.side_effect = chunk_data
+        connection.fetch = parts_fetch(chunk_info, chunk_data)
 
         chunks = []
         async for chunk in storage_field.iter_data():
@@ -425,8 +464,7 @@ class TestPostgresStorageField:
         field,
     ):
         storage_field.field = field
-        connection.fetch.return_value = chunk_info
-        connection.fetchrow.side_effect = chunk_data
+        connection.fetch = parts_fetch(chunk_info, chunk_data)
 
         chunks = []
         async for chunk in storage_field.read_range(0, 15):
@@ -461,6 +499,22 @@ class TestPostgresStorageField:
 
         assert field.offset == 10
 
+        connection.execute.assert_awaited_once_with(
+            ANY, "bucket", ANY, [b"test1", b"test2"]
+        )
+
+    async def test_append_in_batches(
+        self,
+        storage_field: pg.PostgresStorageField,
+        connection,
+        field,
+    ):
+        field.upload_uri = "upload_uri"
+        storage_field.field = field
+        chunks = [b"test"] * (pg.INSERT_BATCH_PARTS + 1)
+
+        assert await storage_field.append(field, iter_result(chunks)) == len(chunks) * 4
+
         assert connection.execute.call_count == 2
 
     async def test_finish(
@@ -489,7 +543,7 @@ class TestPostgresStorageField:
 
         await storage_field.upload(iter_result([b"test1", b"test2"]), field)
 
-        assert connection.execute.call_count == 9
+        assert connection.execute.call_count == 8
 
 
 class TestPostgresStorage:
@@ -523,6 +577,15 @@ class TestPostgresStorage:
         await storage.delete_upload("file_id", "kb_id")
         connection.execute.assert_awaited_with(ANY, "kb_id", "file_id")
 
+    async def test_delete_prefix(self, storage: pg.PostgresStorage, connection):
+        await storage.delete_prefix("kb_id", "kbs/kb_id/r/uuid")
+        connection.execute.assert_has_awaits(
+            [
+                call(ANY, "kb_id", "kbs/kb\\_id/r/uuid%"),
+                call(ANY, "kb_id", "kbs/kb\\_id/r/uuid%"),
+            ]
+        )
+
     async def test_iterate_bucket(self, storage: pg.PostgresStorage, connection):
         connection.cursor = MagicMock(
             return_value=iter_result(
@@ -552,8 +615,7 @@ class TestPostgresStorage:
     async def test_download(
         self, storage: pg.PostgresStorage, connection, chunk_info, chunk_data
     ):
-        connection.fetch.return_value = chunk_info
-        connection.fetchrow.side_effect = chunk_data
+        connection.fetch = parts_fetch(chunk_info, chunk_data)
 
         chunks = []
         async for chunk in storage.download("kb_id", "file_id"):
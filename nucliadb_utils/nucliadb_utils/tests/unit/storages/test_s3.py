@@ -0,0 +1,59 @@
+# Copyright (C) 2021 Bosutech XXI S.L.
+#
+# nucliadb is offered under the AGPL v3.0 and as commercial software.
+# For commercial licensing, contact us at info@nuclia.com.
+#
+# AGPL:
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from unittest.mock import AsyncMock
+
+import botocore  # type: ignore
+import pytest
+
+from nucliadb_utils.storages.s3 import S3Storage
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def storage():
+    storage = S3Storage()
+    storage.delete_batch_size = 2
+    storage._s3aioclient = AsyncMock()
+    yield storage
+
+
+async def test_delete_uploads_retries_failed_keys(storage: S3Storage):
+    error = botocore.exceptions.ClientError({"Error": {}}, "DeleteObjects")
+    storage._s3aioclient.delete_objects.side_effect = [
+        {"Errors": [{"Key": "a", "Message": "InternalError"}]},
+        error,
+    ]
+
+    await storage.delete_uploads(["a", "b", "c"], "bucket")
+
+    assert storage._s3aioclient.delete_objects.call_count == 2
+    assert sorted(
+        call.kwargs["Key"] for call in storage._s3aioclient.delete_object.call_args_list
+    ) == ["a", "c"]
+
+
+async def test_delete_uploads_raises_if_retry_fails(storage: S3Storage):
+    error = botocore.exceptions.ClientError({"Error": {}}, "DeleteObject")
+    storage._s3aioclient.delete_objects.return_value = {"Errors": [{"Key": "a"}]}
+    storage._s3aioclient.delete_object.side_effect = error
+
+    with pytest.raises(botocore.exceptions.ClientError):
+        await storage.delete_uploads(["a"], "bucket")
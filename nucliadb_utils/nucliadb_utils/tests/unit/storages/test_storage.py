@@ -17,7 +17,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
-from unittest.mock import AsyncMock, MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 from nucliadb_protos.noderesources_pb2 import Resource as BrainResource
@@ -25,7 +25,14 @@ from nucliadb_protos.noderesources_pb2 import ResourceID
 from nucliadb_protos.nodewriter_pb2 import IndexMessage
 from nucliadb_protos.resources_pb2 import CloudFile
 
-from nucliadb_utils.storages.storage import Storage, StorageField
+from nucliadb_utils.settings import indexing_settings, storage_settings
+from nucliadb_utils.storages.storage import (
+    Storage,
+    StorageField,
+    build_index_message_parts,
+    content_range_size,
+    plan_index_message_parts,
+)
 
 
 class TestStorageField:
@@ -57,7 +64,9 @@ class TestStorageField:
 class StorageTest(Storage):
     def __init__(self):
         self.source = 0
-        self.field_klass = lambda: MagicMock()
+        self.field_klass = lambda **kwargs: MagicMock(
+            range_supported=AsyncMock(return_value=False)
+        )
         self.deadletter_bucket = "deadletter_bucket"
         self.indexing_bucket = "indexing_bucket"
         self.delete_upload = AsyncMock()
@@ -86,14 +95,33 @@ class TestStorage:
 
         storage.delete_upload.assert_called_once_with("uri", "bucket")
 
+    @pytest.mark.asyncio
+    async def test_delete_prefix_in_batches(self, storage: StorageTest):
+        async def iterate_bucket(bucket_name, prefix):
+            for index in range(5):
+                yield {"name": f"{prefix}/{index}"}
+
+        storage.iterate_bucket = iterate_bucket
+        storage.delete_batch_size = 2
+        storage.delete_uploads = AsyncMock()
+
+        await storage.delete_prefix("bucket", "prefix")
+
+        assert [call.args for call in storage.delete_uploads.call_args_list] == [
+            (["prefix/0", "prefix/1"], "bucket"),
+            (["prefix/2", "prefix/3"], "bucket"),
+            (["prefix/4"], "bucket"),
+        ]
+
     @pytest.mark.asyncio
     async def test_indexing(self, storage: StorageTest):
         msg = BrainResource(resource=ResourceID(uuid="uuid"))
-        await storage.indexing(msg, 1, "1", "kb", "shard")
+        index = await storage.indexing(msg, 1, "1", "kb", "shard")
 
         storage.uploadbytes.assert_called_once_with(
             "indexing_bucket", "index/kb/shard/uuid/1", msg.SerializeToString()
         )
+        assert index.resource == "uuid"
 
     @pytest.mark.asyncio
     async def test_reindexing(self, storage: StorageTest):
@@ -121,6 +149,25 @@ class TestStorage:
         im.storage_key = "index/kb/uuid/1"
         assert isinstance(await storage.get_indexing(im), BrainResource)
 
+    @pytest.mark.asyncio
+    async def test_indexing_in_parts(self, storage: StorageTest):
+        msg = index_message(paragraphs=10)
+        with patch.object(indexing_settings, "index_message_part_size", 200):
+            index = await storage.indexing(msg, 1, "1", "kb", "shard")
+
+        parts = storage.uploadbytes.call_count
+        assert parts > 1
+        assert index.storage_key == f"index/kb/shard/uuid/1/parts/{parts}"
+        assert [call.args[1] for call in storage.uploadbytes.call_args_list] == [
+            f"index/kb/shard/uuid/1/parts/{parts}/{part}" for part in range(parts)
+        ]
+
+    @pytest.mark.asyncio
+    async def test_iter_indexing_in_parts(self, storage: StorageTest):
+        im = IndexMessage(storage_key="index/kb/shard/uuid/1/parts/3")
+        parts = [part async for part in storage.iter_indexing(im)]
+        assert len(parts) == 3
+
     @pytest.mark.asyncio
     async def test_delete_indexing(self, storage: StorageTest):
         im = IndexMessage()
@@ -142,6 +189,56 @@ class TestStorage:
             BrainResource,
         )
 
+    @pytest.mark.asyncio
+    async def test_downloadbytes_by_ranges(self, storage: StorageTest):
+        data = bytes(range(256)) * 40
+        field = ranged_field(data)
+        storage.field_klass = lambda **kwargs: field
+        with patch.object(
+            storage_settings, "ranged_download_min_size", 1000
+        ), patch.object(storage_settings, "ranged_download_part_size", 1024):
+            result = await storage.downloadbytes("bucket", "key")
+
+        assert result.read() == data
+        # the size comes with the first range, no metadata request
+        assert sorted(field.ranges) == [
+            (start, min(start + 1024, len(data))) for start in range(0, len(data), 1024)
+        ]
+        field.exists.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_downloadbytes_small_object(self, storage: StorageTest):
+        field = ranged_field(b"small")
+        storage.field_klass = lambda **kwargs: field
+        with patch.object(storage_settings, "ranged_download_min_size", 1000):
+            result = await storage.downloadbytes("bucket", "key")
+
+        assert result.read() == b"small"
+        assert field.ranges == [(0, storage_settings.ranged_download_part_size)]
+
+    @pytest.mark.asyncio
+    async def test_downloadbytes_below_ranged_min_size(self, storage: StorageTest):
+        data = bytes(range(256)) * 10
+        field = ranged_field(data)
+        storage.field_klass = lambda **kwargs: field
+        with patch.object(
+            storage_settings, "ranged_download_min_size", 5000
+        ), patch.object(storage_settings, "ranged_download_part_size", 1024):
+            result = await storage.downloadbytes("bucket", "key")
+
+        assert result.read() == data
+        assert field.ranges == [(0, 1024), (1024, len(data))]
+
+    @pytest.mark.asyncio
+    async def test_downloadbytes_without_first_range(self, storage: StorageTest):
+        field = ranged_field(b"")
+        field.read_range = MagicMock(side_effect=ValueError())
+        storage.field_klass = lambda **kwargs: field
+        with patch.object(storage_settings, "ranged_download_min_size", 1000):
+            result = await storage.downloadbytes("bucket", "key")
+
+        assert result.read() == BrainResource(labels=["label"]).SerializeToString()
+
     @pytest.mark.asyncio
     async def test_indexing_bucket_none_attributeerrror(self, storage: StorageTest):
         storage.indexing_bucket = None
@@ -164,3 +261,66 @@ class TestStorage:
                 kb="kb",
                 logical_shard="logical_shard",
             )
+
+
+def index_message(paragraphs: int) -> BrainResource:
+    msg = BrainResource(resource=ResourceID(uuid="uuid"), labels=["/l/ls/l1"])
+    msg.texts["t/text"].text = "text"
+    msg.paragraphs_to_delete.append("uuid/t/text/0-1")
+    for index in range(paragraphs):
+        paragraph_id = f"uuid/t/text/{index}-{index + 1}"
+        msg.paragraphs["t/text"].paragraphs[paragraph_id].labels.append("x" * 50)
+    return msg
+
+
+def test_index_message_parts():
+    msg = index_message(paragraphs=10)
+
+    plan = plan_index_message_parts(msg, 200)
+    parts = list(build_index_message_parts(msg, plan))
+
+    assert len(parts) == len(plan) > 1
+    for part in parts:
+        assert part.resource.uuid == "uuid"
+        assert part.texts["t/text"].text == "text"
+        assert list(part.labels) == ["/l/ls/l1"]
+        assert len(part.paragraphs["t/text"].paragraphs) > 0
+    assert list(parts[0].paragraphs_to_delete) == ["uuid/t/text/0-1"]
+    assert all(len(part.paragraphs_to_delete) == 0 for part in parts[1:])
+
+    merged = BrainResource()
+    for part in parts:
+        merged.paragraphs["t/text"].paragraphs.MergeFrom(
+            part.paragraphs["t/text"].paragraphs
+        )
+    assert merged.paragraphs == msg.paragraphs
+
+
+def test_index_message_parts_small_message():
+    msg = index_message(paragraphs=2)
+
+    plan = plan_index_message_parts(msg, 10 * 1024)
+
+    assert len(plan) == 1
+    assert list(build_index_message_parts(msg, plan)) == [msg]
+
+
+def ranged_field(data: bytes) -> MagicMock:
+    field = MagicMock()
+    field.range_supported = AsyncMock(return_value=True)
+    field.ranges = []
+
+    async def read_range(start, end):
+        field.ranges.append((start, end))
+        field.range_total_size = len(data)
+        for offset in range(start, min(end, len(data)), 100):
+            yield data[offset : min(offset + 100, end)]
+
+    field.read_range = read_range
+    return field
+
+
+def test_content_range_size():
+    assert content_range_size("bytes 0-1023/4096") == 4096
+    assert content_range_size("bytes 0-1023/*") is None
+    assert content_range_size(None) is None
@@ -100,3 +100,23 @@ class TestNatsConnectionManager:
         manager._nc.is_connected = False
         assert manager.healthy()
         assert manager._last_unhealthy is not None
+
+
+def test_seqid_tracker():
+    tracker = nats.SeqidTracker(10)
+    for seqid in (11, 12, 13, 14):
+        tracker.start(seqid)
+    # old and redelivered messages are ignored
+    tracker.start(9)
+    tracker.start(12)
+
+    assert tracker.finish(12) == 10
+    assert tracker.finish(13) == 10
+    assert tracker.finish(11) == 13
+    assert tracker.finish(9) == 13
+
+    tracker.start(15)
+    assert tracker.finish(15) == 13
+    assert tracker.finish(14) == 15
+    assert tracker.pending == []
+    assert tracker.done == set()